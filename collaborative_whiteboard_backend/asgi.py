@@ -13,4 +13,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'collaborative_whiteboard_backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up (the relay touches models)
+from modules.session.relay import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # Whiteboard WebSocket relay lives at /ws/session/<id>/; everything else is Django
+    if scope["type"] == "websocket":
+        return await websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
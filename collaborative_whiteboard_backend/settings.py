@@ -91,6 +91,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'modules.notifications.notifcounts.notif_counts',  # was wrong module path
+                'modules.core.context_processors.live_updates',
             ],
         },
     },
@@ -107,6 +108,57 @@ DATABASES = {
     )
 }
 
+# -------------------------------------------------------------
+# CACHES
+# -------------------------------------------------------------
+# Local memory by default; point CACHE_BACKEND/CACHE_LOCATION at a shared
+# cache (e.g. Redis) when running several workers.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
+# Session membership/role cache (modules/session/membership.py)
+SESSION_MEMBERSHIP_TTL = int(os.getenv("SESSION_MEMBERSHIP_TTL", "10"))
+SESSION_MEMBERSHIP_CACHE = os.getenv("SESSION_MEMBERSHIP_CACHE") or None  # cache alias, e.g. "default"
+
+# Server-sent event streams (chat, notifications). Only turn on when serving
+# through asgi.py (e.g. uvicorn); under WSGI each open stream would hold a worker.
+SSE_ENABLED = os.getenv("SSE_ENABLED", "False") == "True"
+
+# Whiteboard pages use the WebSocket relay (modules/session/relay.py) instead of the
+# Supabase channel. Same ASGI requirement; with several workers see WHITEBOARD_BROKER there.
+WHITEBOARD_RELAY = os.getenv("WHITEBOARD_RELAY", "False") == "True"
+
+# Board checkpoints (modules/session/checkpoints.py) are built after the stroke batch that makes
+# one due. With STROKE_CHECKPOINT_ASYNC only `manage.py checkpoint_sessions` (cron) builds them.
+STROKE_CHECKPOINT_ASYNC = os.getenv("STROKE_CHECKPOINT_ASYNC", "False") == "True"
+
+# Change counters behind the ETags of polled JSON views (modules/core/versions.py).
+# Off unless set; must name a cache shared by all workers (e.g. Redis).
+VERSION_CACHE = os.getenv("VERSION_CACHE") or None  # cache alias, e.g. "default"
+
+# Participant heartbeats (modules/session/presence.py): cached, written to last_active in bulk.
+# Off unless set (each heartbeat then updates its row); must name a cache shared by all workers.
+PRESENCE_CACHE = os.getenv("PRESENCE_CACHE") or None  # cache alias, e.g. "default"
+PRESENCE_FLUSH_SECONDS = int(os.getenv("PRESENCE_FLUSH_SECONDS", "60"))
+
+# Dashboard charts/totals (modules/dashboard/cache.py): kept until a write invalidates them.
+# Off unless set; must name a cache shared by all workers.
+DASHBOARD_CACHE = os.getenv("DASHBOARD_CACHE") or None  # cache alias, e.g. "default"
+
+# Unread notification counters (modules/notifications/notifcounts.py).
+# Off unless set (badges then count from the table); must name a cache shared by all workers.
+NOTIF_COUNT_CACHE = os.getenv("NOTIF_COUNT_CACHE") or None  # cache alias, e.g. "default"
+
+# Supabase notification mirror (modules/notifications/outbox.py). Drained after each commit
+# unless NOTIF_OUTBOX_ASYNC is on; then `manage.py drain_notification_outbox` must be running.
+NOTIF_OUTBOX_ASYNC = os.getenv("NOTIF_OUTBOX_ASYNC", "False") == "True"
+NOTIF_MIRROR_CLIENT = os.getenv("NOTIF_MIRROR_CLIENT", "modules.notifications.outbox.supabase_client")
+NOTIF_MIRROR_KEY_COLUMN = os.getenv("NOTIF_MIRROR_KEY_COLUMN") or None  # unique column on the mirror table
+
 # -------------------------------------------------------------
 # AUTHENTICATION
 # -------------------------------------------------------------
@@ -144,6 +196,12 @@ SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY") or os.getenv("SUPABASE_KEY", "")
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
 SUPABASE_BUCKET = os.getenv("SUPABASE_BUCKET", "whiteboard_snapshots")
+# Snapshot saves are staged here and uploaded in the request. With SNAPSHOT_ASYNC
+# they wait for `manage.py snapshot_worker`, which must share this directory.
+# Previews are built by that worker; without it run `manage.py snapshot_thumbnails` from cron.
+SNAPSHOT_STAGING_DIR = os.getenv("SNAPSHOT_STAGING_DIR", str(BASE_DIR / "var" / "snapshot_staging"))
+SNAPSHOT_ASYNC = os.getenv("SNAPSHOT_ASYNC", "False") == "True"
+SNAPSHOT_STORAGE = os.getenv("SNAPSHOT_STORAGE", "modules.session.snapshot_queue.SupabaseSnapshotStorage")
 # Backward-compat alias (old code may still read SUPABASE_KEY)
 SUPABASE_KEY = SUPABASE_ANON_KEY
 
@@ -178,6 +236,16 @@ STORAGES = {
     },
 }
 
+# ✅ Uploads: anything over FILE_UPLOAD_MAX_MEMORY_SIZE spools to a temp file,
+# and the size-limit handler drops a file as soon as it passes UPLOAD_MAX_BYTES
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(250 * 1024 * 1024)))
+SNAPSHOT_MAX_BYTES = int(os.getenv("SNAPSHOT_MAX_BYTES", str(20 * 1024 * 1024)))
+FILE_UPLOAD_HANDLERS = [
+    "modules.session.uploads.UploadSizeLimitHandler",
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+
 # -------------------------------------------------------------
 # DEFAULT PRIMARY KEY
 # -------------------------------------------------------------
@@ -0,0 +1,62 @@
+import statistics
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.utils.crypto import get_random_string
+from modules.chat.models import ChatRoom, Message
+from modules.chat.views import fetch_messages
+from modules.session.models import Session
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway chat room with up to --messages rows and time history pages "
+        "at several sizes, to check that page latency stays flat as the room grows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=100_000)
+        parser.add_argument("--runs", type=int, default=20, help="Timed requests per measurement")
+        parser.add_argument("--keep", action="store_true", help="Keep the seeded room instead of deleting it")
+
+    def handle(self, *args, **opts):
+        User = get_user_model()
+        tag = get_random_string(6).upper()
+        user = User.objects.create_user(username=f"chatbench_{tag}", password=None, role="teacher")
+        session = Session.objects.create(title=f"Chat benchmark {tag}", created_by=user, code=tag)
+        room = ChatRoom.objects.create(name=f"Benchmark {tag}", session=session)
+        rf = RequestFactory()
+
+        def timed(query):
+            samples = []
+            for _ in range(opts["runs"]):
+                request = rf.get(f"/chat/{room.id}/messages/", query)
+                request.user = user
+                t0 = time.perf_counter()
+                fetch_messages(request, room.id)
+                samples.append((time.perf_counter() - t0) * 1000.0)
+            return statistics.median(samples)
+
+        try:
+            seeded = 0
+            targets = [n for n in (1_000, 10_000, 100_000, 1_000_000) if n < opts["messages"]] + [opts["messages"]]
+            self.stdout.write(f"{'rows':>10}  {'latest page':>12}  {'middle page':>12}  {'after_id':>10}   (median ms)")
+            for target in targets:
+                while seeded < target:
+                    n = min(5000, target - seeded)
+                    Message.objects.bulk_create(
+                        Message(room=room, sender=user, content=f"message {seeded + i}") for i in range(n)
+                    )
+                    seeded += n
+                ids = room.messages.order_by("id").values_list("id", flat=True)
+                middle = ids[seeded // 2]
+                newest = ids.last()
+                self.stdout.write(
+                    f"{seeded:>10}  {timed({}):>12.2f}  {timed({'before_id': middle}):>12.2f}  "
+                    f"{timed({'after_id': newest - 10}):>10.2f}"
+                )
+        finally:
+            if not opts["keep"]:
+                session.delete()
+                user.delete()
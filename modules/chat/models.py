@@ -23,6 +23,11 @@ class Message(models.Model):
 
     class Meta:
         ordering = ["timestamp"]
+        indexes = [
+            # keyset pagination (before_id / after_id) and latest-page lookups
+            models.Index(fields=["room", "id"], name="chat_msg_room_id_idx"),
+            models.Index(fields=["room", "timestamp"], name="chat_msg_room_ts_idx"),
+        ]
 
     def __str__(self):
         return f"[{self.room.name}] {self.sender.username}: {self.content[:30]}"
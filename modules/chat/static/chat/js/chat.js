@@ -26,6 +26,14 @@
   let fetchingRoom = false;
   let open = false;
   const seen = new Set();
+  let lastId = 0;          // newest message id rendered; polls ask only for newer ones
+  let olderBefore = null;  // oldest id rendered; "Load older" asks for ?before_id=<this>
+  let loadingOlder = false;
+  let lastPollOk = true;
+  let stream = null;
+  const POLL_MS = 5000;     // plain polling; unchanged polls are answered 304 from the ETag
+  // server-sent events only when the server says streams are on (SSE_ENABLED behind ASGI)
+  const streamOn = !!window.EventSource && win.dataset.sse === "1";
   let lastEnableAttemptTime = 0;
 
   function log(...a){ if (window.DEBUG) console.log("[chat]", ...a); }
@@ -110,50 +118,102 @@
         roomId = d.room_id;
         hideDisabled();                               // ensure UI clears once room ready
         log("Room ID set:", roomId);
-        loadMessages(true);
-        if (open) startPolling();
+        Promise.resolve(loadMessages(true)).then(()=>{ if (open) startPolling(); });
       })
       .catch(err=> log("ensureRoom error:", err))
       .finally(()=> fetchingRoom = false);
   }
 
+  // "Load older" sits above the first message while the history has more pages
+  const olderBtn = document.createElement("button");
+  olderBtn.type = "button";
+  olderBtn.className = "chat-load-older hidden";
+  olderBtn.textContent = "Load older messages";
+  olderBtn.addEventListener("click", loadOlder);
+
+  function setHistory(d){
+    olderBefore = d.before_id || null;
+    olderBtn.classList.toggle("hidden", !(d.has_more && olderBefore));
+  }
+
+  function messageEl(m){
+    const el = document.createElement("div");
+    el.className = "chat-message";
+
+    const meta = document.createElement('div');
+    meta.className = 'chat-meta';
+    const sender = document.createElement('span');
+    sender.className = 'sender';
+    sender.textContent = String(m.sender || '');
+    meta.appendChild(sender);
+    const time = document.createElement('span');
+    time.className = 'time';
+    time.textContent = ` (${m.timestamp || ''})`;
+    meta.appendChild(time);
+
+    const body = document.createElement('div');
+    body.className = 'chat-body';
+    body.textContent = m.content;
+
+    el.appendChild(meta);
+    el.appendChild(body);
+    return el;
+  }
+
   function render(list, initial){
-    if (initial){ while (messagesEl.firstChild) messagesEl.removeChild(messagesEl.firstChild); seen.clear(); }
+    if (initial){
+      while (messagesEl.firstChild) messagesEl.removeChild(messagesEl.firstChild);
+      messagesEl.appendChild(olderBtn);
+      seen.clear(); lastId = 0;
+    }
     list.forEach(m=>{
       if (seen.has(m.id)) return;
       seen.add(m.id);
-      const el = document.createElement("div");
-      el.className = "chat-message";
-
-      const meta = document.createElement('div');
-      meta.className = 'chat-meta';
-      const sender = document.createElement('span');
-      sender.className = 'sender';
-      sender.textContent = String(m.sender || '');
-      meta.appendChild(sender);
-      const time = document.createElement('span');
-      time.className = 'time';
-      time.textContent = ` (${m.timestamp || ''})`;
-      meta.appendChild(time);
-
-      const body = document.createElement('div');
-      body.className = 'chat-body';
-      body.textContent = m.content;
-
-      el.appendChild(meta);
-      el.appendChild(body);
-      messagesEl.appendChild(el);
+      if (m.id > lastId) lastId = m.id;
+      messagesEl.appendChild(messageEl(m));
     });
     messagesEl.scrollTop = messagesEl.scrollHeight;
   }
 
+  // Older pages go above the current first message, keeping the view where it was
+  function prepend(list){
+    const anchor = olderBtn.nextSibling;
+    const fromBottom = messagesEl.scrollHeight - messagesEl.scrollTop;
+    list.forEach(m=>{
+      if (seen.has(m.id)) return;
+      seen.add(m.id);
+      messagesEl.insertBefore(messageEl(m), anchor);
+    });
+    messagesEl.scrollTop = messagesEl.scrollHeight - fromBottom;
+  }
+
+  function loadOlder(){
+    if (!roomId || !olderBefore || loadingOlder || !enabled) return;
+    loadingOlder = true;
+    olderBtn.disabled = true;
+    const room = roomId;
+    fetch(`/chat/${room}/messages/?before_id=${olderBefore}`)
+      .then(safeJson)
+      .then(([r,d])=>{
+        if (r.status===403 || d.chat_enabled===false){ applyEnabled(false); return; }
+        if (!r.ok || !Array.isArray(d.messages) || room !== roomId) return;
+        prepend(d.messages);
+        setHistory(d);
+      })
+      .catch(err=> log("loadOlder error:", err))
+      .finally(()=> { loadingOlder = false; olderBtn.disabled = false; });
+  }
+
   function loadMessages(initial=false){
     if (!roomId || fetching || !enabled){
       log("loadMessages blocked:", {roomId, fetching, enabled});
       return;
     }
     fetching = true;
-    fetch(`/chat/${roomId}/messages/`)
+    const url = initial
+      ? `/chat/${roomId}/messages/`
+      : `/chat/${roomId}/messages/?after_id=${lastId}`;
+    return fetch(url)
       .then(safeJson)
       .then(([r,d])=>{
         if (r.status===403 || d.chat_enabled===false){
@@ -173,10 +233,12 @@
           applyEnabled(false);
           return;
         }
+        lastPollOk = r.ok;
         if (!r.ok || !Array.isArray(d.messages)) return;
         render(d.messages, initial);
+        if (initial) setHistory(d);
       })
-      .catch(err=> log("loadMessages error:", err))
+      .catch(err=> { lastPollOk = false; log("loadMessages error:", err); })
       .finally(()=> fetching = false);
   }
 
@@ -186,15 +248,39 @@
       log("startPolling blocked:", {enabled, roomId});
       return;
     }
+    if (streamOn){
+      startStream();
+      return;
+    }
     log("Starting polling");
-    polling = setInterval(()=> loadMessages(false), 5000);
+    const token = polling = {};
+    const loop = ()=>{
+      if (polling !== token) return;
+      Promise.resolve(loadMessages(false)).finally(()=>{
+        if (polling === token) setTimeout(loop, lastPollOk ? POLL_MS : 5000);
+      });
+    };
+    setTimeout(loop, POLL_MS);
+  }
+  function startStream(){
+    log("Starting stream");
+    // resumes after Last-Event-ID on reconnect; ?after_id only seeds the first connection
+    const es = stream = new EventSource(`/chat/${roomId}/stream/?after_id=${lastId}`);
+    es.addEventListener("message", e=>{
+      try { render([JSON.parse(e.data)], false); } catch {}
+    });
+    es.addEventListener("disabled", ()=> applyEnabled(false));
   }
   function stopPolling(){
     if (polling){
-      clearInterval(polling);
       polling = null;
       log("Stopped polling");
     }
+    if (stream){
+      stream.close();
+      stream = null;
+      log("Closed stream");
+    }
   }
 
   function openWindow(){
@@ -211,7 +297,8 @@
     win.classList.remove("hidden","minimized");
     hideDisabled();
     open = true;
-    if (!roomId && !fetchingRoom) ensureRoom(); else if (roomId) { loadMessages(true); startPolling(); }
+    if (!roomId && !fetchingRoom) ensureRoom();
+    else if (roomId) Promise.resolve(loadMessages(true)).then(startPolling);
     input && input.focus();
   }
 
@@ -1,3 +1,105 @@
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
+from modules.core import longpoll, versions
+from modules.core.tests import count_queries
+from modules.session.models import Participant, Session
+from . import views
+from .models import ChatRoom, Message
 
-# Create your tests here.
+User = get_user_model()
+
+
+class ChatTestCase(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(username="teacher", password="pw", role="teacher")
+        self.student = User.objects.create_user(username="student", password="pw")
+        self.session = Session.objects.create(title="Chat", created_by=self.teacher, code="CHT001")
+        Participant.objects.create(session=self.session, user=self.student)
+        self.room = ChatRoom.objects.create(session=self.session, name="Chat")
+        self.client.force_login(self.student)
+
+    def say(self, text, sender=None):
+        return Message.objects.create(room=self.room, sender=sender or self.teacher, content=text)
+
+
+class ChatStreamTests(ChatTestCase):
+    def test_incremental_fetch_answers_immediately(self):
+        first = self.say("one")
+        second = self.say("two")
+        r = self.client.get(reverse("chat_messages", args=[self.room.id]), {"after_id": first.id, "wait": 20})
+        self.assertEqual([m["id"] for m in r.json()["messages"]], [second.id])
+        r = self.client.get(reverse("chat_messages", args=[self.room.id]), {"after_id": second.id})
+        self.assertEqual(r.json()["messages"], [])
+
+    def test_stream_is_off_by_default(self):
+        r = self.client.get(reverse("chat_stream", args=[self.room.id]))
+        self.assertEqual(r.status_code, 404)
+
+    @mock.patch.object(longpoll, "SSE_ENABLED", True)
+    async def test_stream_sends_messages_after_id(self):
+        first = await sync_to_async(self.say)("one")
+        second = await sync_to_async(self.say)("two")
+        await self.async_client.aforce_login(self.student)
+        r = await self.async_client.get(reverse("chat_stream", args=[self.room.id]), {"after_id": first.id})
+        self.assertEqual(r.status_code, 200)
+        chunks = r.streaming_content
+        received = ""
+        async for chunk in chunks:
+            received += chunk.decode() if isinstance(chunk, bytes) else chunk
+            if "event: message" in received:
+                break
+        await chunks.aclose()
+        self.assertIn(f"id: {second.id}\nevent: message", received)
+        self.assertNotIn(f"id: {first.id}\n", received)
+
+    async def read_until(self, chunks, marker):
+        received = ""
+        async for chunk in chunks:
+            received += chunk.decode() if isinstance(chunk, bytes) else chunk
+            if marker in received:
+                return received
+        return received
+
+    @mock.patch.object(longpoll, "SSE_ENABLED", True)
+    @mock.patch.object(longpoll, "LONGPOLL_RECHECK", 0.01)
+    @mock.patch.object(versions, "VERSION_CACHE", "default")
+    @mock.patch.object(views, "CHAT_LONGPOLL_TIMEOUT", 0.3)
+    async def test_idle_stream_does_not_poll_the_database(self):
+        await self.async_client.aforce_login(self.student)
+        r = await self.async_client.get(reverse("chat_stream", args=[self.room.id]))
+        chunks = r.streaming_content
+        await self.read_until(chunks, "keep-alive")
+        # ~30 recheck intervals: one message query on entry, membership comes from its cache
+        with count_queries() as queries:
+            await self.read_until(chunks, "keep-alive")
+        await chunks.aclose()
+        self.assertEqual(len(queries), 1)
+
+    @mock.patch.object(longpoll, "SSE_ENABLED", True)
+    @mock.patch.object(views, "CHAT_LONGPOLL_TIMEOUT", 0.1)
+    async def test_stream_ends_when_participant_is_removed(self):
+        await self.async_client.aforce_login(self.student)
+        r = await self.async_client.get(reverse("chat_stream", args=[self.room.id]))
+        chunks = r.streaming_content
+        await self.read_until(chunks, "keep-alive")
+        await Participant.objects.filter(session=self.session, user=self.student).adelete()
+        received = await self.read_until(chunks, "event: disabled")
+        await chunks.aclose()
+        self.assertIn("event: disabled", received)
+
+
+class ChatHistoryTests(ChatTestCase):
+    def test_before_id_walks_back_through_history(self):
+        ids = [self.say(str(i)).id for i in range(5)]
+        url = reverse("chat_messages", args=[self.room.id])
+        r = self.client.get(url, {"limit": 2}).json()
+        self.assertEqual([m["id"] for m in r["messages"]], ids[3:])
+        self.assertTrue(r["has_more"])
+        r = self.client.get(url, {"limit": 2, "before_id": r["before_id"]}).json()
+        self.assertEqual([m["id"] for m in r["messages"]], ids[1:3])
+        r = self.client.get(url, {"limit": 2, "before_id": r["before_id"]}).json()
+        self.assertEqual([m["id"] for m in r["messages"]], ids[:1])
+        self.assertFalse(r["has_more"])
@@ -1,48 +1,157 @@
-from django.shortcuts import get_object_or_404
-from django.http import JsonResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from django.http import JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods
-from modules.session.models import Session, Participant
+from django.conf import settings
+from django.db import transaction
+from modules.core import longpoll
+from modules.core.versions import bump, conditional
+from modules.session.membership import get_membership, resolve_membership
 from .models import ChatRoom, Message
 import json
+import time
+from asgiref.sync import sync_to_async
 
-def _authorized(user, session: Session):
-    return user == session.created_by or Participant.objects.filter(session=session, user=user).exists()
+# SSE: send a keep-alive comment after this long without messages
+CHAT_LONGPOLL_TIMEOUT = getattr(settings, "CHAT_LONGPOLL_TIMEOUT", 20)
+# SSE: close the stream after this long; EventSource reconnects with Last-Event-ID
+CHAT_SSE_MAX_SECONDS = getattr(settings, "CHAT_SSE_MAX_SECONDS", 300)
+CHAT_BATCH_MAX = getattr(settings, "CHAT_BATCH_MAX", 200)
+CHAT_PAGE_SIZE = getattr(settings, "CHAT_PAGE_SIZE", 50)
+
+def _chat_open(request, session_id):
+    """Owner/participant of the session, with chat switched on (cached lookup)."""
+    m = get_membership(request, session_id)
+    return bool(m and m.is_member and m.chat_enabled)
+
+def _room_key(room_id):
+    return f"chat:{room_id}"
+
+def _serialize(m):
+    return {
+        "id": m.id,
+        "sender": m.sender.username,
+        "content": m.content,
+        "timestamp": m.timestamp.strftime("%H:%M"),
+    }
+
+def _messages_after(room, after_id):
+    return list(room.messages.filter(id__gt=after_id).select_related("sender").order_by("id")[:CHAT_BATCH_MAX])
+
+def _messages_scopes(request, room_id):
+    session_id = ChatRoom.objects.filter(id=room_id).values_list("session_id", flat=True).first()
+    if session_id and not _chat_open(request, session_id):
+        return None  # the view answers 403
+    return [_room_key(room_id)]
+
+def _int_param(value, default=0):
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return default
 
 @login_required
 @require_http_methods(["GET"])
 def get_or_create_session_chat(request, session_id):
-    session = get_object_or_404(Session, id=session_id)
-    if not _authorized(request.user, session):
+    m = get_membership(request, session_id)
+    if m is None:
+        return JsonResponse({"error": "Not found"}, status=404)
+    if not m.is_member:
         return JsonResponse({"error": "Forbidden"}, status=403)
-    session.refresh_from_db()
-    if not session.chat_enabled:
+    if not m.chat_enabled:
         return JsonResponse({"chat_enabled": False}, status=403)
-    room, _ = ChatRoom.objects.get_or_create(session=session, defaults={"name": f"Session {session_id} Chat"})
+    room, _ = ChatRoom.objects.get_or_create(session_id=session_id, defaults={"name": f"Session {session_id} Chat"})
     return JsonResponse({"room_id": room.id, "chat_enabled": True})
 
 @login_required
 @require_http_methods(["GET"])
+@conditional(_messages_scopes)
 def fetch_messages(request, room_id):
     room = get_object_or_404(ChatRoom, id=room_id)
-    session = room.session
-    if session and (not _authorized(request.user, session) or not session.chat_enabled):
+    if room.session_id and not _chat_open(request, room.session_id):
         return JsonResponse({"chat_enabled": False}, status=403)
-    msgs = room.messages.select_related("sender")
-    data = [{
-        "id": m.id,
-        "sender": m.sender.username,
-        "content": m.content,
-        "timestamp": m.timestamp.strftime("%H:%M"),
-    } for m in msgs]
-    return JsonResponse({"chat_enabled": True, "messages": data})
+
+    # Incremental fetch: ?after_id=<last seen id> returns only newer messages.
+    # Answered right away; clients that want pushes use the SSE stream.
+    if "after_id" in request.GET:
+        after_id = _int_param(request.GET.get("after_id"))
+        msgs = _messages_after(room, after_id)
+        data = [_serialize(m) for m in msgs]
+        return JsonResponse({
+            "chat_enabled": True,
+            "messages": data,
+            "last_id": data[-1]["id"] if data else after_id,
+        })
+
+    # History page: newest CHAT_PAGE_SIZE messages, or the page before ?before_id.
+    # Keyset pagination on (room, id) keeps every page an index range scan.
+    limit = min(_int_param(request.GET.get("limit"), CHAT_PAGE_SIZE) or CHAT_PAGE_SIZE, CHAT_BATCH_MAX)
+    qs = room.messages.select_related("sender").order_by("-id")
+    before_id = _int_param(request.GET.get("before_id"))
+    if before_id:
+        qs = qs.filter(id__lt=before_id)
+    page = list(qs[:limit + 1])
+    has_more = len(page) > limit
+    msgs = page[:limit][::-1]
+    data = [_serialize(m) for m in msgs]
+    return JsonResponse({
+        "chat_enabled": True,
+        "messages": data,
+        "last_id": data[-1]["id"] if data else 0,
+        "has_more": has_more,
+        "before_id": data[0]["id"] if data else None,
+    })
+
+@login_required
+@require_http_methods(["GET"])
+async def stream_messages(request, room_id):
+    """
+    Server-sent events: one ``message`` event per new chat message, resuming
+    after Last-Event-ID (or ?after_id). Comment lines keep idle streams alive.
+    Async, so an open stream holds no worker; 404 unless SSE is enabled and
+    served over ASGI (chat.js then polls ?after_id= instead).
+    """
+    if not longpoll.streams_available(request):
+        return JsonResponse({"ok": False, "error": "stream_disabled"}, status=404)
+    room = await aget_object_or_404(ChatRoom, id=room_id)
+    user = await request.auser()
+    if room.session_id and not await sync_to_async(_chat_open)(request, room.session_id):
+        return JsonResponse({"chat_enabled": False}, status=403)
+
+    after_id = _int_param(request.headers.get("Last-Event-ID") or request.GET.get("after_id"))
+    messages_after = sync_to_async(_messages_after)
+    stamp = longpoll.version_stamp(_room_key(room.id))
+
+    async def events(after_id):
+        started = time.monotonic()
+        yield "retry: 3000\n\n"
+        while time.monotonic() - started < CHAT_SSE_MAX_SECONDS:
+            msgs = await longpoll.await_for(
+                _room_key(room.id), lambda: messages_after(room, after_id), CHAT_LONGPOLL_TIMEOUT, stamp=stamp,
+            )
+            # membership can be revoked or chat switched off while the stream is open
+            if room.session_id:
+                m = await sync_to_async(resolve_membership)(user.pk, room.session_id)
+                if not (m and m.is_member and m.chat_enabled):
+                    yield "event: disabled\ndata: {}\n\n"
+                    return
+            if not msgs:
+                yield ": keep-alive\n\n"
+                continue
+            for m in msgs:
+                yield f"id: {m.id}\nevent: message\ndata: {json.dumps(_serialize(m))}\n\n"
+            after_id = msgs[-1].id
+
+    response = StreamingHttpResponse(events(after_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 @login_required
 @require_http_methods(["POST"])
 def send_message(request, room_id):
     room = get_object_or_404(ChatRoom, id=room_id)
-    session = room.session
-    if session and (not _authorized(request.user, session) or not session.chat_enabled):
+    if room.session_id and not _chat_open(request, room.session_id):
         return JsonResponse({"chat_enabled": False}, status=403)
     try:
         payload = json.loads(request.body)
@@ -54,12 +163,9 @@ def send_message(request, room_id):
     if len(content) > 1000:
         return JsonResponse({"error": "Too long"}, status=400)
     msg = Message.objects.create(room=room, sender=request.user, content=content)
+    transaction.on_commit(lambda: longpoll.signal(_room_key(room.id)))
+    bump(_room_key(room.id))
     return JsonResponse({
         "chat_enabled": True,
-        "message": {
-            "id": msg.id,
-            "sender": msg.sender.username,
-            "content": msg.content,
-            "timestamp": msg.timestamp.strftime("%H:%M"),
-        }
+        "message": _serialize(msg),
     })
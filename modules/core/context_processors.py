@@ -0,0 +1,6 @@
+from .longpoll import streams_available
+
+
+def live_updates(request):
+    """``SSE_STREAMS``: whether pages may open EventSource streams instead of polling."""
+    return {"SSE_STREAMS": streams_available(request)}
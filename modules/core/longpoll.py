@@ -0,0 +1,118 @@
+"""
+In-process wake-ups for long-poll and server-sent-event views.
+
+Writers call ``signal(key)`` after committing; readers block in
+``wait_for(key, check, timeout)`` until ``check()`` returns something truthy.
+Wake-ups only reach threads of the same process, so readers also re-run
+``check()`` every LONGPOLL_RECHECK seconds to pick up writes made by other
+workers.
+
+Long-lived streams (the chat and notification SSE views) wait with
+``await_for`` instead, inside async views, so an open stream holds no
+worker thread. An idle stream does not poll the database: ``check()`` only
+re-runs on an in-process wake-up or when ``stamp()`` moves, where the
+stamp is the scope's counter in the shared VERSION_CACHE (see versions.py).
+Without VERSION_CACHE, writes made by other workers reach a stream when
+its wait times out (its keep-alive interval). They are only served when SSE_ENABLED is set and the
+request came through the ASGI application (asgi.py); under WSGI an async
+streaming response still pins a worker for its whole life, and clients
+fall back to plain polling (``streams_available``).
+"""
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from . import versions
+
+LONGPOLL_RECHECK = getattr(settings, "LONGPOLL_RECHECK", 1.0)
+SSE_ENABLED = getattr(settings, "SSE_ENABLED", False)
+
+_cond = threading.Condition()
+_versions = defaultdict(int)
+# key -> {(event loop, asyncio.Event)} of ``await_for`` readers
+_async_waiters = defaultdict(set)
+
+
+def streams_available(request):
+    """True when SSE views may hold this request open (enabled, and served over ASGI)."""
+    return bool(SSE_ENABLED) and isinstance(request, ASGIRequest)
+
+
+def version_stamp(*scopes):
+    """A ``stamp`` for ``await_for`` reading the scopes' shared counters, or None without VERSION_CACHE."""
+    if not versions.enabled():
+        return None
+    return sync_to_async(lambda: versions.current(*scopes))
+
+
+def signal(key):
+    """Wake every reader waiting on ``key`` in this process."""
+    with _cond:
+        _versions[key] += 1
+        _cond.notify_all()
+        waiters = list(_async_waiters.get(key, ()))
+    for loop, event in waiters:
+        loop.call_soon_threadsafe(event.set)
+
+
+def wait_for(key, check, timeout, interval=None):
+    """
+    Return ``check()`` as soon as it is truthy, or its last (falsy) value
+    once ``timeout`` seconds have passed.
+    """
+    interval = interval or LONGPOLL_RECHECK
+    deadline = time.monotonic() + max(timeout, 0)
+    while True:
+        with _cond:
+            seen = _versions[key]
+        result = check()
+        remaining = deadline - time.monotonic()
+        if result or remaining <= 0:
+            return result
+        with _cond:
+            _cond.wait_for(lambda: _versions[key] != seen, timeout=min(interval, remaining))
+
+
+async def await_for(key, check, timeout, interval=None, stamp=None):
+    """
+    ``wait_for`` for async views: ``check`` is a coroutine function, and
+    waiting suspends the coroutine instead of blocking a thread.
+
+    ``check`` runs on entry and after each in-process ``signal(key)``. With
+    ``stamp`` (a coroutine function returning a cheap version token), the
+    stamp is read every ``interval`` seconds and ``check`` re-runs only when
+    it has moved; without one, nothing is polled until ``timeout``.
+    """
+    interval = interval or LONGPOLL_RECHECK
+    loop = asyncio.get_running_loop()
+    deadline = time.monotonic() + max(timeout, 0)
+    due, seen = True, None
+    result = None
+    while True:
+        # register before checking, so a signal between the two isn't missed
+        entry = (loop, asyncio.Event())
+        with _cond:
+            _async_waiters[key].add(entry)
+        try:
+            if due:
+                if stamp is not None:
+                    seen = await stamp()  # read first: a write after this moves it again
+                result = await check()
+            remaining = deadline - time.monotonic()
+            if result or remaining <= 0:
+                return result
+            try:
+                await asyncio.wait_for(entry[1].wait(), timeout=min(interval, remaining) if stamp else remaining)
+                due = True
+            except asyncio.TimeoutError:
+                due = stamp is not None and await stamp() != seen
+        finally:
+            with _cond:
+                waiters = _async_waiters.get(key)
+                if waiters is not None:
+                    waiters.discard(entry)
+                    if not waiters:
+                        del _async_waiters[key]
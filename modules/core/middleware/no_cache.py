@@ -3,6 +3,10 @@ from django.utils.deprecation import MiddlewareMixin
 class NoCacheForAuthMiddleware(MiddlewareMixin):
     def process_response(self, request, response):
         if getattr(request, "user", None) and request.user.is_authenticated:
+            if getattr(response, "allow_revalidate", False):
+                # ETagged by modules.core.versions.conditional: let the browser keep it and revalidate
+                response["Cache-Control"] = "private, no-cache"
+                return response
             response["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
             response["Pragma"] = "no-cache"
             response["Expires"] = "0"
@@ -1,3 +1,88 @@
-from django.test import TestCase
+import asyncio
+from contextlib import contextmanager
+from unittest import mock
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db.backends.utils import CursorWrapper
+from django.http import JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from . import longpoll, versions
 
-# Create your tests here.
+
+@contextmanager
+def count_queries():
+    """SQL run on any thread (streams query through sync_to_async)."""
+    sql, execute = [], CursorWrapper.execute
+
+    def counting(cursor, query, *args, **kwargs):
+        sql.append(query)
+        return execute(cursor, query, *args, **kwargs)
+
+    with mock.patch.object(CursorWrapper, "execute", counting):
+        yield sql
+
+
+@versions.conditional(lambda request: ["room:1"])
+def polled(request):
+    return JsonResponse({"ok": True})
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def get(self, etag=None):
+        request = self.factory.get("/poll/", **({"HTTP_IF_NONE_MATCH": etag} if etag else {}))
+        request.user = AnonymousUser()
+        return polled(request)
+
+    def test_off_without_version_cache(self):
+        r = self.get()
+        self.assertEqual(r.status_code, 200)
+        self.assertFalse(r.has_header("ETag"))
+        self.assertFalse(getattr(r, "allow_revalidate", False))
+
+    @mock.patch.object(versions, "VERSION_CACHE", "default")
+    def test_not_modified_until_bumped(self):
+        etag = self.get()["ETag"]
+        self.assertEqual(self.get(etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            versions.bump("room:1")
+        r = self.get(etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r["ETag"], etag)
+
+
+class AwaitForTests(SimpleTestCase):
+    def run_wait(self, stamps, timeout=0.2, during=None):
+        calls = []
+
+        async def check():
+            calls.append(1)
+            return None
+
+        async def stamp():
+            return stamps[min(len(calls), len(stamps) - 1)]
+
+        async def main():
+            waiting = asyncio.ensure_future(
+                longpoll.await_for("test:key", check, timeout, interval=0.01, stamp=stamp if stamps else None)
+            )
+            if during:
+                await asyncio.sleep(0.05)
+                during()
+            await waiting
+
+        asyncio.run(main())
+        return len(calls)
+
+    def test_idle_wait_checks_once(self):
+        self.assertEqual(self.run_wait([1]), 1)
+        self.assertEqual(self.run_wait(None), 1)
+
+    def test_moved_stamp_rechecks(self):
+        self.assertEqual(self.run_wait([1, 2]), 2)
+
+    def test_signal_wakes_the_check(self):
+        self.assertEqual(self.run_wait(None, during=lambda: longpoll.signal("test:key")), 2)
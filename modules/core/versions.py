@@ -0,0 +1,131 @@
+"""
+Change counters and conditional GET for polled JSON endpoints.
+
+A scope is a short string naming something a payload is built from
+(``session:<id>:attendance``, ``user:<id>:notifications``, ...). Writers
+call ``bump(scope)``, which increments the scope's counter in VERSION_CACHE
+after the current transaction commits. ``conditional`` hashes the
+counters a view depends on, the user and the full path into an ETag and
+answers ``304 Not Modified`` while the client's If-None-Match still
+matches, without calling the view. Counters start from the clock, so an
+evicted counter never comes back with an old value.
+
+Responses from ``conditional`` views are marked ``allow_revalidate``;
+NoCacheForAuthMiddleware then sends ``private, no-cache`` instead of
+``no-store``, so browsers keep the body and revalidate it with the ETag.
+
+Off unless VERSION_CACHE names a cache alias, and that cache must be
+shared by every worker (see CACHE_BACKEND in settings): a counter bumped
+in one process's local memory is invisible to the others, which would
+keep answering 304 forever. Unset, ``bump`` does nothing and views run
+unconditionally.
+"""
+import hashlib
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags
+
+VERSION_CACHE = getattr(settings, "VERSION_CACHE", None)
+
+
+def _cache():
+    return caches[VERSION_CACHE] if VERSION_CACHE else None
+
+
+def enabled():
+    """True when VERSION_CACHE is set, i.e. counters are shared and worth reading."""
+    return _cache() is not None
+
+
+def _key(scope):
+    return f"version:{scope}"
+
+
+def current(*scopes):
+    """{scope: counter}, seeding missing counters from the clock."""
+    cache = _cache()
+    keys = {_key(s): s for s in scopes}
+    found = cache.get_many(list(keys))
+    for key, scope in keys.items():
+        if key not in found:
+            cache.add(key, time.time_ns() // 1000, None)
+            found[key] = cache.get(key)
+    return {scope: found[key] for key, scope in keys.items()}
+
+
+def _incr(scopes):
+    cache = _cache()
+    for scope in scopes:
+        try:
+            cache.incr(_key(scope))
+        except ValueError:
+            pass  # never read; the next reader seeds it
+
+
+def bump(*scopes):
+    """Move these counters once the current transaction commits."""
+    scopes = {s for s in scopes if s}
+    if scopes and _cache() is not None:
+        transaction.on_commit(lambda: _incr(scopes))
+
+
+def etag_for(request, scopes, refresh=None):
+    versions = current(*scopes)
+    parts = [request.get_full_path(), str(getattr(request.user, "pk", ""))]
+    parts += [f"{s}={versions[s]}" for s in sorted(versions)]
+    if refresh:
+        parts.append(str(int(time.time() // refresh)))
+    return 'W/"%s"' % hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def _matches(request, etag):
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # weak comparison, as RFC 9110 requires for If-None-Match
+    strip = lambda tag: tag[2:] if tag.startswith("W/") else tag
+    return strip(etag) in {strip(t) for t in parse_etags(header)}
+
+
+def conditional(scopes, refresh=None):
+    """
+    ETag a GET view from the counters of ``scopes(request, *args, **kwargs)``.
+    ``scopes`` returns a list of scope names, or None to run the view
+    unconditionally (e.g. the caller may not see it).
+    ``refresh`` also rolls the ETag every that many seconds, for payloads
+    that partly depend on the clock or on writes that don't bump a scope.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if _cache() is None or request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+            names = scopes(request, *args, **kwargs)
+            if names is None:
+                return view(request, *args, **kwargs)
+            etag = etag_for(request, names, refresh)
+            if _matches(request, etag):
+                response = HttpResponseNotModified()
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200 or response.has_header("ETag"):
+                    return response
+            response["ETag"] = etag
+            response.allow_revalidate = True
+            return response
+        return wrapper
+    return decorator
+
+
+def session_scope(session_id, part):
+    return f"session:{session_id}:{part}"
+
+
+def user_scope(user_id, part):
+    return f"user:{user_id}:{part}"
@@ -4,3 +4,8 @@ class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'modules.dashboard'
     label = 'dashboard'
+
+    def ready(self):
+        from .cache import caching_enabled
+        if caching_enabled():
+            from . import signals  # noqa: F401
@@ -0,0 +1,74 @@
+"""
+Cached dashboard payloads (charts, totals, per-student rows).
+
+Payloads are stored per user under a version number and kept until that
+version moves, or for DASHBOARD_CACHE_TIMEOUT seconds at most. ``invalidate_users`` bumps the versions
+after the current transaction commits, so a page computed from
+pre-commit data is written under the old version and never read again.
+The receivers in signals.py call it for Participant, UploadedFile,
+chat message and stroke-counter writes.
+
+Off unless DASHBOARD_CACHE names a cache alias shared by every worker
+(see CACHE_BACKEND in settings): local memory would only be invalidated
+in the process that saw the write. Unset, payloads are computed on every
+request and the receivers are not connected.
+"""
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+DASHBOARD_CACHE = getattr(settings, "DASHBOARD_CACHE", None)
+# upper bound on staleness if an invalidation is ever missed
+DASHBOARD_CACHE_TIMEOUT = getattr(settings, "DASHBOARD_CACHE_TIMEOUT", 10 * 60)
+
+
+def caching_enabled():
+    return bool(DASHBOARD_CACHE)
+
+
+def _cache():
+    return caches[DASHBOARD_CACHE]
+
+
+def _version_key(user_id):
+    return f"dashboard:v:{user_id}"
+
+
+def _version(cache, user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # start from the clock, so an evicted counter never reuses an old version
+        cache.add(key, time.time_ns() // 1000, DASHBOARD_CACHE_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def cached_payload(kind, user_id, compute):
+    """``compute()`` for ``user_id``'s ``kind`` payload, served from cache until invalidated."""
+    if not caching_enabled():
+        return compute()
+    cache = _cache()
+    key = f"dashboard:{kind}:{user_id}:{_version(cache, user_id)}"
+    payload = cache.get(key)
+    if payload is None:
+        payload = compute()
+        cache.set(key, payload, DASHBOARD_CACHE_TIMEOUT)
+    return payload
+
+
+def _bump(user_ids):
+    cache = _cache()
+    for user_id in user_ids:
+        try:
+            cache.incr(_version_key(user_id))
+        except ValueError:
+            pass  # nothing cached under a version yet
+
+
+def invalidate_users(*user_ids):
+    """Drop the cached dashboards of these users once the current transaction commits."""
+    ids = {uid for uid in user_ids if uid is not None}
+    if ids and caching_enabled():
+        transaction.on_commit(lambda: _bump(ids))
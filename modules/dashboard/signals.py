@@ -0,0 +1,51 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from modules.session.membership import resolve_membership
+from modules.session.models import Participant, Session, UploadedFile
+from modules.session.presence import presence_flushed
+from modules.session.stats import strokes_counted
+from .cache import invalidate_users
+
+
+def _owner_id(session_id):
+    return Session.objects.filter(pk=session_id).values_list("created_by_id", flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=Participant)
+def participant_changed(sender, instance, **kwargs):
+    invalidate_users(instance.user_id, _owner_id(instance.session_id))
+
+
+@receiver(post_save, sender=Session)
+def session_changed(sender, instance, created, **kwargs):
+    # titles show up as chart labels
+    if not created:
+        students = Participant.objects.filter(session=instance).values_list("user_id", flat=True)
+        invalidate_users(instance.created_by_id, *students)
+
+
+@receiver(strokes_counted)
+def strokes_changed(sender, session_id, user_id, **kwargs):
+    # hot path: the owner comes from the membership cache instead of a query
+    m = resolve_membership(user_id, session_id)
+    invalidate_users(user_id, m.owner_id if m else None)
+
+
+@receiver(presence_flushed)
+def presence_changed(sender, session_id, user_ids, **kwargs):
+    # last_active is a dashboard column; the flush's bulk UPDATE bypasses post_save
+    invalidate_users(_owner_id(session_id), *user_ids)
+
+
+@receiver([post_save, post_delete], sender=UploadedFile)
+def upload_changed(sender, instance, **kwargs):
+    # student charts count every upload in their sessions, not just their own
+    students = Participant.objects.filter(session_id=instance.session_id).values_list("user_id", flat=True)
+    invalidate_users(instance.uploaded_by_id, _owner_id(instance.session_id), *students)
+
+
+@receiver(post_save, sender="chat.Message")
+def message_sent(sender, instance, created, **kwargs):
+    if created:
+        owner_id = Session.objects.filter(chat_room__id=instance.room_id).values_list("created_by_id", flat=True).first()
+        invalidate_users(instance.sender_id, owner_id)
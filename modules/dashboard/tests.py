@@ -1,3 +1,55 @@
+from unittest import mock
+from django.core.cache import cache
 from django.test import TestCase
+from . import cache as dashboard_cache
 
-# Create your tests here.
+
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return {"n": self.calls}
+
+    def test_computes_every_time_without_dashboard_cache(self):
+        dashboard_cache.cached_payload("student", 1, self.compute)
+        dashboard_cache.cached_payload("student", 1, self.compute)
+        self.assertEqual(self.calls, 2)
+
+    @mock.patch.object(dashboard_cache, "DASHBOARD_CACHE", "default")
+    def test_cached_until_invalidated(self):
+        self.assertEqual(dashboard_cache.cached_payload("student", 1, self.compute), {"n": 1})
+        self.assertEqual(dashboard_cache.cached_payload("student", 1, self.compute), {"n": 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            dashboard_cache.invalidate_users(1)
+        self.assertEqual(dashboard_cache.cached_payload("student", 1, self.compute), {"n": 2})
+
+
+class PresenceInvalidationTests(TestCase):
+    @mock.patch.object(dashboard_cache, "DASHBOARD_CACHE", "default")
+    @mock.patch("modules.session.presence.PRESENCE_CACHE", "default")
+    def test_presence_flush_invalidates_dashboards(self):
+        from django.contrib.auth import get_user_model
+        from modules.session import presence
+        from modules.session.models import Participant, Session
+        from . import signals  # noqa: F401  (connected only when DASHBOARD_CACHE is set)
+
+        User = get_user_model()
+        teacher = User.objects.create_user(username="teacher", password="pw", role="teacher")
+        student = User.objects.create_user(username="student", password="pw")
+        session = Session.objects.create(title="Presence", created_by=teacher, code="PRS001")
+        Participant.objects.create(session=session, user=student)
+        cache.clear()
+        calls = []
+        compute = lambda: calls.append(1) or len(calls)
+        dashboard_cache.cached_payload("student", student.pk, compute)
+        dashboard_cache.cached_payload("teacher", teacher.pk, compute)
+
+        presence.touch(session.id, student.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(presence.flush_session(session.id), 1)
+        dashboard_cache.cached_payload("student", student.pk, compute)
+        dashboard_cache.cached_payload("teacher", teacher.pk, compute)
+        self.assertEqual(len(calls), 4)
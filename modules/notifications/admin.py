@@ -1,3 +1,9 @@
 from django.contrib import admin
+from .models import NotificationOutbox
 
-# Register your models here.
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ("idempotency_key", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status",)
+    readonly_fields = ("notification", "idempotency_key", "payload", "created_at", "sent_at", "last_error")
@@ -0,0 +1,44 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+from modules.notifications.models import NotificationOutbox
+from modules.notifications.outbox import NOTIF_OUTBOX_BATCH, drain, get_mirror_client
+
+
+class Command(BaseCommand):
+    help = "Copy queued notifications to the Supabase mirror in batches (runs until stopped)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Exit when nothing is due instead of waiting")
+        parser.add_argument("--sleep", type=float, default=1.0, help="Seconds to wait when the outbox is empty")
+        parser.add_argument("--batch", type=int, default=NOTIF_OUTBOX_BATCH, help="Rows per mirror insert")
+        parser.add_argument("--retry-failed", action="store_true", help="Requeue rows that ran out of attempts, then run")
+
+    def handle(self, *args, **opts):
+        client = get_mirror_client()
+        if client is None:
+            self.stderr.write("No mirror client configured (SUPABASE_SERVICE_ROLE_KEY / NOTIF_MIRROR_CLIENT).")
+            return
+
+        if opts["retry_failed"]:
+            n = NotificationOutbox.objects.filter(status=NotificationOutbox.FAILED).update(
+                status=NotificationOutbox.PENDING, attempts=0, next_attempt_at=timezone.now(),
+            )
+            self.stdout.write(f"Requeued {n} failed row(s).")
+
+        total = 0
+        try:
+            while True:
+                close_old_connections()
+                sent, failed = drain(client, batch_size=opts["batch"])
+                total += sent
+                if sent:
+                    self.stdout.write(f"Mirrored {sent} notification(s).")
+                if opts["once"] and not sent:
+                    break
+                if not sent or failed:
+                    time.sleep(opts["sleep"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Mirrored {total} notification(s)."))
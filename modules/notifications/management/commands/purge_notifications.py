@@ -0,0 +1,54 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from modules.notifications.retention import (
+    NOTIF_ARCHIVE_KEEP_MONTHS, NOTIF_OUTBOX_KEEP_DAYS, NOTIF_PURGE_BATCH, NOTIF_RETENTION_DAYS,
+    drop_archive_before, expired, prune_sent_outbox, purge_batch, sent_outbox,
+)
+
+
+class Command(BaseCommand):
+    help = "Archive or delete read notifications older than --days, in bounded batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=NOTIF_RETENTION_DAYS, help="Keep read notifications this many days")
+        parser.add_argument("--batch", type=int, default=NOTIF_PURGE_BATCH, help="Rows per transaction")
+        parser.add_argument("--archive", action="store_true", help="Copy rows to the archive table instead of only deleting them")
+        parser.add_argument("--sleep", type=float, default=0.0, help="Seconds to pause between batches")
+        parser.add_argument("--archive-keep-months", type=int, default=None,
+                            help=f"Also drop archived history older than this (e.g. {NOTIF_ARCHIVE_KEEP_MONTHS})")
+        parser.add_argument("--outbox-days", type=int, default=NOTIF_OUTBOX_KEEP_DAYS,
+                            help="Keep mirror outbox rows this many days after they were sent")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        cutoff = timezone.now() - timedelta(days=opts["days"])
+        outbox_cutoff = timezone.now() - timedelta(days=opts["outbox_days"])
+        if opts["dry_run"]:
+            self.stdout.write(f"Would remove {expired(cutoff).count()} read notification(s) created before {cutoff:%Y-%m-%d}.")
+            self.stdout.write(f"Would remove {sent_outbox(outbox_cutoff).count()} sent outbox row(s).")
+            return
+
+        total = 0
+        while True:
+            n = purge_batch(cutoff, batch=opts["batch"], archive=opts["archive"])
+            if not n:
+                break
+            total += n
+            self.stdout.write(f"{'Archived' if opts['archive'] else 'Deleted'} {n} notification(s).")
+            if opts["sleep"]:
+                time.sleep(opts["sleep"])
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Archived' if opts['archive'] else 'Deleted'} {total} notification(s) created before {cutoff:%Y-%m-%d}."
+        ))
+
+        pruned = prune_sent_outbox(outbox_cutoff, batch=opts["batch"])
+        self.stdout.write(f"Deleted {pruned} sent outbox row(s) sent before {outbox_cutoff:%Y-%m-%d}.")
+
+        if opts["archive_keep_months"] is not None:
+            dropped = drop_archive_before(opts["archive_keep_months"], batch=opts["batch"])
+            if isinstance(dropped, list):
+                self.stdout.write(f"Dropped {len(dropped)} archive partition(s): {', '.join(dropped) or '-'}")
+            else:
+                self.stdout.write(f"Deleted {dropped} archived notification(s).")
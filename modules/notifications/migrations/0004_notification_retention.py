@@ -0,0 +1,102 @@
+# Generated by Django 5.2.6 on 2026-10-17 23:02
+
+import hashlib
+from django.conf import settings
+from django.db import migrations, models
+
+ARCHIVE_TABLE = "notifications_notificationarchive"
+
+
+def backfill_hashes(apps, schema_editor):
+    Notification = apps.get_model("notifications", "Notification")
+    batch = []
+    for n in Notification.objects.filter(content_hash="").only("id", "content").iterator(chunk_size=2000):
+        n.content_hash = hashlib.sha256(n.content.encode("utf-8")).hexdigest()
+        batch.append(n)
+        if len(batch) >= 2000:
+            Notification.objects.bulk_update(batch, ["content_hash"])
+            batch = []
+    if batch:
+        Notification.objects.bulk_update(batch, ["content_hash"])
+
+
+def create_archive(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        schema_editor.create_model(apps.get_model("notifications", "NotificationArchive"))
+        return
+    # range-partitioned by month of created_at; the partition key has to be part of the primary key
+    schema_editor.execute(f"""
+        CREATE TABLE {ARCHIVE_TABLE} (
+            id bigint NOT NULL,
+            recipient_id bigint NOT NULL,
+            session_id uuid NULL,
+            content text NOT NULL,
+            is_urgent boolean NOT NULL,
+            created_at timestamp with time zone NOT NULL,
+            read_at timestamp with time zone NULL,
+            archived_at timestamp with time zone NOT NULL,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    schema_editor.execute(f"CREATE TABLE {ARCHIVE_TABLE}_default PARTITION OF {ARCHIVE_TABLE} DEFAULT")
+    schema_editor.execute(f"CREATE INDEX notif_archive_recipient_idx ON {ARCHIVE_TABLE} (recipient_id, created_at)")
+
+
+def drop_archive(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        schema_editor.delete_model(apps.get_model("notifications", "NotificationArchive"))
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {ARCHIVE_TABLE} CASCADE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_notification_outbox'),
+        ('session', '0012_participant_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='content_hash',
+            field=models.CharField(default='', editable=False, max_length=64),
+        ),
+        migrations.RunPython(backfill_hashes, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='notification',
+            unique_together={('recipient', 'session', 'content_hash', 'is_urgent')},
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('read_at__isnull', True)), fields=['recipient', 'id'], name='notif_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('read_at__isnull', False)), fields=['created_at'], name='notif_read_age_idx'),
+        ),
+        # The archive table is created by hand so it can be partitioned on PostgreSQL
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='NotificationArchive',
+                    fields=[
+                        ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                        ('recipient_id', models.BigIntegerField()),
+                        ('session_id', models.UUIDField(blank=True, null=True)),
+                        ('content', models.TextField()),
+                        ('is_urgent', models.BooleanField(default=False)),
+                        ('created_at', models.DateTimeField()),
+                        ('read_at', models.DateTimeField(blank=True, null=True)),
+                        ('archived_at', models.DateTimeField(auto_now_add=True)),
+                    ],
+                    options={
+                        'ordering': ['-created_at'],
+                        'indexes': [models.Index(fields=['recipient_id', 'created_at'], name='notif_archive_recipient_idx')],
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(create_archive, drop_archive),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-17 23:52
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def drop_duplicates(apps, schema_editor):
+    # rows without a session were never deduplicated; keep the oldest of each group
+    Notification = apps.get_model("notifications", "Notification")
+    groups = (
+        Notification.objects.filter(session__isnull=True)
+        .values("recipient_id", "content_hash", "is_urgent")
+        .annotate(keep=Min("id"), n=Count("id"))
+        .filter(n__gt=1)
+    )
+    for g in groups.iterator():
+        Notification.objects.filter(
+            session__isnull=True,
+            recipient_id=g["recipient_id"],
+            content_hash=g["content_hash"],
+            is_urgent=g["is_urgent"],
+        ).exclude(id=g["keep"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_notification_retention'),
+        ('session', '0015_session_checkpoint_seq'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('session__isnull', True)), fields=('recipient', 'content_hash', 'is_urgent'), name='notif_unique_no_session'),
+        ),
+    ]
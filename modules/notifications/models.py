@@ -1,11 +1,20 @@
+import hashlib
 from django.db import models
 from django.conf import settings
+from django.db.models import Q
 from modules.session.models import Session
 
+
+def content_digest(text):
+    """SHA-256 hex of notification text; deduplication indexes this, not the text."""
+    return hashlib.sha256(str(text).encode("utf-8")).hexdigest()
+
+
 class Notification(models.Model):
     recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="notifications")
     session = models.ForeignKey(Session, on_delete=models.SET_NULL, null=True, blank=True, related_name="notifications")
     content = models.TextField()
+    content_hash = models.CharField(max_length=64, editable=False, default="")
     is_urgent = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     read_at = models.DateTimeField(null=True, blank=True)
@@ -14,7 +23,90 @@ class Notification(models.Model):
     def is_read(self):
         return self.read_at is not None
 
+    def save(self, *args, **kwargs):
+        self.content_hash = content_digest(self.content)
+        super().save(*args, **kwargs)
+
+    class Meta:
+        ordering = ["-created_at"]
+        # Prevent exact duplicates (fixed-width hash instead of an index over the text)
+        unique_together = ("recipient", "session", "content_hash", "is_urgent")
+        constraints = [
+            # NULLs never collide in the constraint above, so notifications without a session need their own
+            models.UniqueConstraint(
+                fields=["recipient", "content_hash", "is_urgent"],
+                condition=Q(session__isnull=True),
+                name="notif_unique_no_session",
+            ),
+        ]
+        indexes = [
+            # unread badge / mark-all-read: only unread rows are indexed, so it stays small
+            models.Index(fields=["recipient", "id"], condition=Q(read_at__isnull=True), name="notif_unread_idx"),
+            # retention sweep: read rows by age
+            models.Index(fields=["created_at"], condition=Q(read_at__isnull=False), name="notif_read_age_idx"),
+        ]
+
+
+class NotificationOutbox(models.Model):
+    """
+    A notification waiting to be copied to the Supabase mirror table. Written
+    in the same transaction as the Notification and sent in batches after
+    the commit or by ``manage.py drain_notification_outbox`` (see outbox.py).
+    """
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    ]
+
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name="outbox")
+    # one row per notification; also sent to the mirror so a replayed batch is ignored there
+    idempotency_key = models.CharField(max_length=64, unique=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(auto_now_add=True)
+    claim = models.UUIDField(null=True, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="notif_outbox_due_idx"),
+            models.Index(fields=["claim"], name="notif_outbox_claim_idx"),
+        ]
+
+    def __str__(self):
+        return f"Outbox {self.idempotency_key} ({self.status})"
+
+
+class NotificationArchive(models.Model):
+    """
+    Read notifications moved out of Notification by ``manage.py
+    purge_notifications --archive``. Keeps the original id. On PostgreSQL
+    the table is partitioned by month of ``created_at`` (see retention.py),
+    so old history is dropped a partition at a time.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    recipient_id = models.BigIntegerField()
+    session_id = models.UUIDField(null=True, blank=True)
+    content = models.TextField()
+    is_urgent = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    read_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
     class Meta:
         ordering = ["-created_at"]
-        # Prevent exact duplicates
-        unique_together = ("recipient", "session", "content", "is_urgent")
+        indexes = [
+            models.Index(fields=["recipient_id", "created_at"], name="notif_archive_recipient_idx"),
+        ]
+
+    def __str__(self):
+        return f"Archived notification {self.id}"
@@ -1,13 +1,127 @@
+"""
+Per-user unread notification counters (and newest notification ids).
+
+The count lives in the NOTIF_COUNT_CACHE cache and is adjusted with
+incr/decr by ``notify``, ``mark_read`` and ``mark_all_read`` after their
+transaction commits (``notify_many`` drops the keys instead), so page renders and badge polls read one cache key
+instead of running COUNT(*). A missing key is recounted once on the next
+read. NOTIF_COUNT_TTL bounds drift from writes that bypass those paths
+(admin deletes, a recount racing a new notification).
+
+Every change also wakes the user's notification stream (``stream_key``),
+and the newest notification id per user is cached next to the count, so an
+idle stream polls two cache keys instead of the table.
+
+Off unless NOTIF_COUNT_CACHE names a cache alias shared by every worker
+(see CACHE_BACKEND in settings); per-process memory would show different
+badges per worker. Unset, counts and newest ids come straight from the
+table (both are index lookups on the recipient).
+"""
 from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from modules.core import longpoll
+from modules.core.versions import bump, user_scope
 from .models import Notification
 
+NOTIF_COUNT_CACHE = getattr(settings, "NOTIF_COUNT_CACHE", None)
+NOTIF_COUNT_TTL = getattr(settings, "NOTIF_COUNT_TTL", 15 * 60)
+
+
+def _cache():
+    return caches[NOTIF_COUNT_CACHE] if NOTIF_COUNT_CACHE else None
+
+
+def _key(user_id):
+    return f"notif:unread:{user_id}"
+
+
+def _latest_key(user_id):
+    return f"notif:latest:{user_id}"
+
+
+def stream_key(user_id):
+    """longpoll key of a user's notification stream."""
+    return f"notif:{user_id}"
+
+
+def unread_count_for(user_id):
+    cache = _cache()
+    count = cache.get(_key(user_id)) if cache is not None else None
+    if count is None:
+        count = Notification.objects.filter(recipient_id=user_id, read_at__isnull=True).count()
+        if cache is not None:
+            cache.add(_key(user_id), count, NOTIF_COUNT_TTL)
+    return max(0, count)
+
+
+def latest_id_for(user_id):
+    """Id of the user's newest notification (0 when none)."""
+    cache = _cache()
+    latest = cache.get(_latest_key(user_id)) if cache is not None else None
+    if latest is None:
+        latest = Notification.objects.filter(recipient_id=user_id).order_by("-id").values_list("id", flat=True).first() or 0
+        if cache is not None:
+            cache.add(_latest_key(user_id), latest, NOTIF_COUNT_TTL)
+    return latest
+
+
+def note_created(latest_by_user):
+    """After commit: record {user_id: newest notification id} and wake those users' streams."""
+    if not latest_by_user:
+        return
+
+    def publish():
+        cache = _cache()
+        if cache is not None:
+            cache.set_many({_latest_key(uid): nid for uid, nid in latest_by_user.items()}, NOTIF_COUNT_TTL)
+        for uid in latest_by_user:
+            longpoll.signal(stream_key(uid))
+        bump(*(user_scope(uid, "notifications") for uid in latest_by_user))
+    transaction.on_commit(publish)
+
+
+def _adjust(user_id, delta):
+    cache = _cache()
+    if cache is not None:
+        try:
+            if cache.incr(_key(user_id), delta) < 0:
+                cache.delete(_key(user_id))  # drifted; recount on next read
+        except ValueError:
+            pass  # not cached: the next read counts from the table
+    longpoll.signal(stream_key(user_id))
+    bump(user_scope(user_id, "notifications"))
+
+
+def adjust_unread(user_id, delta):
+    """Move ``user_id``'s unread count by ``delta`` once the current transaction commits."""
+    if delta:
+        transaction.on_commit(lambda: _adjust(user_id, delta))
+
+
+def forget_unread(user_ids):
+    """Drop the counters of many users at once (bulk fan-out); each recounts on its next read."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+
+    def forget():
+        cache = _cache()
+        if cache is not None:
+            cache.delete_many([_key(uid) for uid in user_ids])
+        for uid in user_ids:
+            longpoll.signal(stream_key(uid))
+        bump(*(user_scope(uid, "notifications") for uid in user_ids))
+    transaction.on_commit(forget)
+
+
 def notif_counts(request):
     user = getattr(request, "user", None)
     unread = 0
     if user and user.is_authenticated:
-        unread = Notification.objects.filter(recipient=user, read_at__isnull=True).count()
+        unread = unread_count_for(user.pk)
     return {
         "notif_unread_count": unread,
         "SUPABASE_URL": getattr(settings, "SUPABASE_URL", ""),
         "SUPABASE_ANON_KEY": getattr(settings, "SUPABASE_ANON_KEY", ""),
-    }
\ No newline at end of file
+    }
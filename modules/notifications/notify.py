@@ -1,20 +1,12 @@
 import logging
-from django.conf import settings
 from django.db import IntegrityError, transaction
-from .models import Notification
+from .models import Notification, content_digest
+from .notifcounts import adjust_unread, forget_unread, note_created
+from .outbox import enqueue
+from modules.core.versions import bump, session_scope
 
 logger = logging.getLogger(__name__)
 
-try:
-    from supabase import create_client
-    _sb = None
-    SB_URL = getattr(settings, "SUPABASE_URL", None)
-    SB_SERVICE_KEY = getattr(settings, "SUPABASE_SERVICE_ROLE_KEY", None)
-    if SB_URL and SB_SERVICE_KEY:
-        _sb = create_client(SB_URL, SB_SERVICE_KEY)
-except Exception:
-    _sb = None
-
 def notify(user, content, *, session=None, urgent=False):
     if not user or not content:
         return None
@@ -24,31 +16,60 @@ def notify(user, content, *, session=None, urgent=False):
             notif, created = Notification.objects.get_or_create(
                 recipient=user,
                 session=session,
-                content=content,
+                content_hash=content_digest(content),
                 is_urgent=urgent,
+                defaults={"content": content},
             )
             if not created:
                 logger.debug("notify(): duplicate suppressed (id=%s)", notif.id)
                 return notif
+            adjust_unread(user.pk, 1)
+            # mirrored to Supabase through the outbox once this commits
+            enqueue([notif])
+            note_created({user.pk: notif.pk})
+            if session is not None:
+                bump(session_scope(session.pk, "announcements"))
     except IntegrityError:
         # Another thread created it; fetch existing
         notif = Notification.objects.filter(
-            recipient=user, session=session, content=content, is_urgent=urgent
+            recipient=user, session=session, content_hash=content_digest(content), is_urgent=urgent
         ).order_by("-created_at").first()
         return notif
 
     logger.debug("notify(): created id=%s", notif.id)
+    return notif
+
+
+def notify_many(recipient_ids, content, *, session=None, urgent=False):
+    """
+    Fan one notification out to many users: one query for existing rows,
+    one bulk INSERT (conflicts skipped, so concurrent sends stay deduped)
+    and one bulk INSERT into the mirror outbox, however many recipients
+    there are.
+    Returns the number of notifications created.
+    """
+    ids = {int(uid) for uid in recipient_ids if uid}
+    if not ids or not content:
+        return 0
+    digest = content_digest(content)
+    same = Notification.objects.filter(session=session, content_hash=digest, is_urgent=urgent)
+    already = set(same.filter(recipient_id__in=ids).values_list("recipient_id", flat=True))
+    fresh = [
+        # bulk_create skips save(), so the digest is filled in here
+        Notification(recipient_id=uid, session=session, content=content, content_hash=digest, is_urgent=urgent)
+        for uid in sorted(ids - already)
+    ]
+    if not fresh:
+        return 0
+    with transaction.atomic():
+        Notification.objects.bulk_create(fresh, ignore_conflicts=True, batch_size=500)
+        # bulk_create(ignore_conflicts) leaves pks unset; read the rows back for the outbox
+        created = list(same.filter(recipient_id__in=[n.recipient_id for n in fresh]))
+        enqueue(created)
+        forget_unread([n.recipient_id for n in fresh])
+        note_created({n.recipient_id: n.pk for n in created})
+        if session is not None:
+            bump(session_scope(session.pk, "announcements"))
+    logger.debug("notify_many(): %s recipients, %s new", len(ids), len(fresh))
+    return len(fresh)
 
-    if _sb:
-        try:
-            payload = {
-                "recipient_id": int(user.id),
-                "content": str(content),
-                "is_urgent": bool(urgent),
-                "session_id": str(getattr(session, "id")) if session else None,
-                "created_at": notif.created_at.isoformat(),
-            }
-            _sb.table("notifications_notification").insert(payload).execute()
-        except Exception as e:
-            logger.warning("Supabase mirror failed: %s", e)
-    return notif
\ No newline at end of file
@@ -0,0 +1,239 @@
+"""
+Transactional outbox for the Supabase notification mirror.
+
+``enqueue`` adds one NotificationOutbox row per Notification inside the
+caller's transaction, so a notification and its pending mirror copy commit
+or roll back together. By default one batch is drained right after that
+commit, in the request. With NOTIF_OUTBOX_ASYNC on, requests never wait on
+Supabase and ``manage.py drain_notification_outbox`` must be running.
+``drain`` claims due rows in batches, sends each batch in one insert and
+retries failures with exponential backoff. A claim is a lease token: only
+the drainer holding the current token can mark its rows sent or reschedule
+them, so a drainer whose lease expired cannot overwrite the next one's work.
+
+Every row carries an idempotency key. When NOTIF_MIRROR_KEY_COLUMN names a
+unique column on the mirror table, batches are sent as upserts that ignore
+duplicates, so a batch replayed after a timeout is not mirrored twice.
+Without it the mirror is at-least-once.
+
+NOTIF_MIRROR_CLIENT is a dotted path to a factory returning a
+supabase-style client (``.table(name).insert(rows).execute()``) or None;
+``MemoryMirrorClient`` is a local fake for development and tests.
+"""
+import logging
+import random
+import uuid
+from datetime import timedelta
+from itertools import groupby
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+NOTIF_MIRROR_CLIENT = getattr(settings, "NOTIF_MIRROR_CLIENT", "modules.notifications.outbox.supabase_client")
+NOTIF_MIRROR_TABLE = getattr(settings, "NOTIF_MIRROR_TABLE", "notifications_notification")
+NOTIF_MIRROR_KEY_COLUMN = getattr(settings, "NOTIF_MIRROR_KEY_COLUMN", None)
+NOTIF_OUTBOX_BATCH = getattr(settings, "NOTIF_OUTBOX_BATCH", 200)
+NOTIF_OUTBOX_MAX_ATTEMPTS = getattr(settings, "NOTIF_OUTBOX_MAX_ATTEMPTS", 8)
+NOTIF_OUTBOX_BACKOFF = getattr(settings, "NOTIF_OUTBOX_BACKOFF", 5)  # seconds, doubled per attempt
+NOTIF_OUTBOX_BACKOFF_MAX = getattr(settings, "NOTIF_OUTBOX_BACKOFF_MAX", 900)
+# A batch claimed longer than this (drainer died mid-send) is picked up again
+NOTIF_OUTBOX_LEASE = getattr(settings, "NOTIF_OUTBOX_LEASE", 120)
+# On: rows wait for `manage.py drain_notification_outbox` instead of the request draining them
+NOTIF_OUTBOX_ASYNC = getattr(settings, "NOTIF_OUTBOX_ASYNC", False)
+
+
+# ==========================
+# 🔌 MIRROR CLIENTS
+# ==========================
+def supabase_client():
+    """The service-role Supabase client, or None when it is not configured."""
+    url = getattr(settings, "SUPABASE_URL", None)
+    key = getattr(settings, "SUPABASE_SERVICE_ROLE_KEY", None)
+    if not (url and key):
+        return None
+    from supabase import create_client
+    return create_client(url, key)
+
+
+class MemoryMirrorClient:
+    """
+    In-process stand-in for the Supabase client: ``rows[table]`` collects
+    what was sent. Set ``fail`` to an exception to simulate an outage.
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.calls = 0
+        self.fail = None
+
+    def table(self, name):
+        return _MemoryTable(self, name)
+
+
+class _MemoryTable:
+    def __init__(self, client, name):
+        self.client, self.name, self._op = client, name, None
+
+    def insert(self, rows):
+        self._op = (rows, None)
+        return self
+
+    def upsert(self, rows, on_conflict="", ignore_duplicates=False):
+        self._op = (rows, on_conflict)
+        return self
+
+    def execute(self):
+        self.client.calls += 1
+        if self.client.fail is not None:
+            raise self.client.fail
+        rows, key = self._op
+        stored = self.client.rows.setdefault(self.name, [])
+        seen = {r.get(key) for r in stored} if key else set()
+        stored.extend(r for r in rows if not key or r.get(key) not in seen)
+        return rows
+
+
+_client = None
+
+
+def get_mirror_client():
+    global _client
+    if _client is None:
+        _client = import_string(NOTIF_MIRROR_CLIENT)() or False
+    return _client or None
+
+
+# ==========================
+# 📥 ENQUEUE
+# ==========================
+def mirror_payload(notif):
+    return {
+        "recipient_id": int(notif.recipient_id),
+        "content": str(notif.content),
+        "is_urgent": bool(notif.is_urgent),
+        "session_id": str(notif.session_id) if notif.session_id else None,
+        "created_at": notif.created_at.isoformat(),
+    }
+
+
+def enqueue(notifs):
+    """Queue mirror copies of saved notifications (call inside their transaction)."""
+    NotificationOutbox.objects.bulk_create(
+        [
+            NotificationOutbox(notification_id=n.pk, idempotency_key=f"notification:{n.pk}", payload=mirror_payload(n))
+            for n in notifs
+        ],
+        ignore_conflicts=True,  # already queued by a concurrent sender
+        batch_size=500,
+    )
+    if not NOTIF_OUTBOX_ASYNC:
+        transaction.on_commit(_drain_after_commit)
+
+
+def _drain_after_commit():
+    """No drainer running: send one batch now, failures wait for the next one."""
+    try:
+        drain(max_batches=1)
+    except Exception:
+        logger.exception("Notification mirror drain failed")
+
+
+# ==========================
+# 📤 DRAIN
+# ==========================
+def claim_batch(limit=NOTIF_OUTBOX_BATCH):
+    """Claim up to ``limit`` due rows for this drainer; returns them (empty when idle)."""
+    now = timezone.now()
+    NotificationOutbox.objects.filter(
+        status=NotificationOutbox.PENDING, claim__isnull=False,
+        locked_at__lt=now - timedelta(seconds=NOTIF_OUTBOX_LEASE),
+    ).update(claim=None, locked_at=None)
+
+    due = list(
+        NotificationOutbox.objects.filter(
+            status=NotificationOutbox.PENDING, claim__isnull=True, next_attempt_at__lte=now,
+        ).order_by("id").values_list("pk", flat=True)[:limit]
+    )
+    if not due:
+        return []
+    token = uuid.uuid4()
+    # conditional update: rows another drainer took in the meantime are skipped
+    NotificationOutbox.objects.filter(pk__in=due, claim__isnull=True).update(
+        claim=token, locked_at=now, attempts=F("attempts") + 1,
+    )
+    return list(NotificationOutbox.objects.filter(claim=token).order_by("id"))
+
+
+def send_batch(rows, client):
+    """Send claimed rows in one insert and record the outcome. Returns True on success."""
+    payload = []
+    for row in rows:
+        item = dict(row.payload)
+        if NOTIF_MIRROR_KEY_COLUMN:
+            item[NOTIF_MIRROR_KEY_COLUMN] = row.idempotency_key
+        payload.append(item)
+    try:
+        table = client.table(NOTIF_MIRROR_TABLE)
+        if NOTIF_MIRROR_KEY_COLUMN:
+            table.upsert(payload, on_conflict=NOTIF_MIRROR_KEY_COLUMN, ignore_duplicates=True).execute()
+        else:
+            table.insert(payload).execute()
+    except Exception as exc:
+        _retry_or_fail(rows, exc)
+        return False
+    marked = _owned(rows).update(
+        status=NotificationOutbox.SENT, sent_at=timezone.now(), claim=None, locked_at=None, last_error="",
+    )
+    if marked < len(rows):
+        logger.warning("Outbox lease lost on %s of %s sent row(s)", len(rows) - marked, len(rows))
+    return True
+
+
+def _owned(rows):
+    """The claimed rows whose lease (one token per batch) this drainer still holds."""
+    return NotificationOutbox.objects.filter(
+        pk__in=[r.pk for r in rows], status=NotificationOutbox.PENDING, claim=rows[0].claim,
+    )
+
+
+def _retry_or_fail(rows, exc):
+    error = f"{type(exc).__name__}: {exc}"[:2000]
+    now = timezone.now()
+    # one conditional UPDATE per distinct attempt count, not one per row
+    for attempts, group in groupby(sorted(rows, key=lambda r: r.attempts), key=lambda r: r.attempts):
+        group = list(group)
+        fields = {"last_error": error, "claim": None, "locked_at": None}
+        if attempts >= NOTIF_OUTBOX_MAX_ATTEMPTS:
+            fields["status"] = NotificationOutbox.FAILED
+        else:
+            delay = min(NOTIF_OUTBOX_BACKOFF * 2 ** (attempts - 1), NOTIF_OUTBOX_BACKOFF_MAX)
+            fields["next_attempt_at"] = now + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+        _owned(group).update(**fields)
+    logger.warning("Notification mirror batch of %s failed: %s", len(rows), error)
+
+
+def drain(client=None, batch_size=NOTIF_OUTBOX_BATCH, max_batches=None):
+    """
+    Send due outbox rows until none are left (or ``max_batches`` ran).
+    Returns (sent, failed_batches). Without a mirror client nothing is claimed.
+    """
+    client = client or get_mirror_client()
+    if client is None:
+        return 0, 0
+    sent = failed = batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = claim_batch(batch_size)
+        if not rows:
+            break
+        batches += 1
+        if send_batch(rows, client):
+            sent += len(rows)
+        else:
+            failed += 1
+            break  # the mirror is failing; back off instead of hammering it
+    return sent, failed
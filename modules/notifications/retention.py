@@ -0,0 +1,168 @@
+"""
+Retention for notifications.
+
+Read notifications older than NOTIF_RETENTION_DAYS are moved to
+NotificationArchive (or deleted) in batches of NOTIF_PURGE_BATCH rows, each
+batch in its own short transaction, so the live table only holds recent
+and unread rows and its indexes stay small. Unread rows are never touched.
+
+On PostgreSQL the archive is range-partitioned by month of ``created_at``
+(migration 0004 creates the parent and a DEFAULT partition). Monthly
+partitions are created on demand before a batch is copied, and history
+older than NOTIF_ARCHIVE_KEEP_MONTHS is removed by dropping whole
+partitions instead of deleting rows. Elsewhere the archive is a plain
+table and old history is deleted in batches.
+
+Outbox rows the mirror has confirmed (SENT) are only bookkeeping; they are
+deleted in batches once older than NOTIF_OUTBOX_KEEP_DAYS so the outbox
+does not grow with every notification ever sent.
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from modules.core.versions import bump, session_scope, user_scope
+from .models import Notification, NotificationArchive, NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+NOTIF_RETENTION_DAYS = getattr(settings, "NOTIF_RETENTION_DAYS", 90)
+NOTIF_PURGE_BATCH = getattr(settings, "NOTIF_PURGE_BATCH", 1000)
+NOTIF_ARCHIVE_KEEP_MONTHS = getattr(settings, "NOTIF_ARCHIVE_KEEP_MONTHS", 24)
+NOTIF_OUTBOX_KEEP_DAYS = getattr(settings, "NOTIF_OUTBOX_KEEP_DAYS", 7)
+
+ARCHIVE_TABLE = NotificationArchive._meta.db_table
+
+
+def _partitioned():
+    return connection.vendor == "postgresql"
+
+
+def _month_start(dt):
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(dt):
+    return dt.replace(year=dt.year + 1, month=1) if dt.month == 12 else dt.replace(month=dt.month + 1)
+
+
+def partition_name(month):
+    return f"{ARCHIVE_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def ensure_partition(when):
+    """Create the monthly archive partition holding ``when`` (PostgreSQL only, idempotent)."""
+    if not _partitioned():
+        return None
+    start = _month_start(when.astimezone(dt_timezone.utc))
+    name = partition_name(start)
+    with connection.cursor() as cur:
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {ARCHIVE_TABLE} "
+            f"FOR VALUES FROM (%s) TO (%s)",
+            [start, _next_month(start)],
+        )
+    return name
+
+
+def expired(cutoff):
+    """Read notifications created before ``cutoff`` that are safe to remove."""
+    return (
+        Notification.objects.filter(read_at__isnull=False, created_at__lt=cutoff)
+        # still waiting for the mirror; the drainer needs the row
+        .exclude(outbox__status=NotificationOutbox.PENDING)
+    )
+
+
+def purge_batch(cutoff, batch=NOTIF_PURGE_BATCH, archive=True):
+    """
+    Archive (or just delete) up to ``batch`` expired notifications in one
+    transaction. Returns the number of rows removed from Notification;
+    0 means there is nothing left before ``cutoff``.
+    """
+    ids = list(expired(cutoff).order_by("created_at").values_list("id", flat=True)[:batch])
+    if not ids:
+        return 0
+    with transaction.atomic():
+        # lock and re-read: a row may have changed since the id scan
+        rows = list(
+            Notification.objects.select_for_update()
+            .filter(pk__in=ids, read_at__isnull=False, created_at__lt=cutoff)
+            .values("id", "recipient_id", "session_id", "content", "is_urgent", "created_at", "read_at")
+        )
+        if not rows:
+            return 0
+        if archive:
+            for month in {_month_start(r["created_at"].astimezone(dt_timezone.utc)) for r in rows}:
+                ensure_partition(month)
+            NotificationArchive.objects.bulk_create(
+                [NotificationArchive(**r) for r in rows], ignore_conflicts=True, batch_size=500,
+            )
+        # cascades to the rows' (already sent) outbox entries
+        Notification.objects.filter(pk__in=[r["id"] for r in rows]).delete()
+        bump(*{user_scope(r["recipient_id"], "notifications") for r in rows},
+             *{session_scope(r["session_id"], "announcements") for r in rows if r["session_id"]})
+    return len(rows)
+
+
+def sent_outbox(cutoff):
+    """Outbox rows delivered to the mirror before ``cutoff``."""
+    return NotificationOutbox.objects.filter(status=NotificationOutbox.SENT, sent_at__lt=cutoff)
+
+
+def prune_sent_outbox(cutoff, batch=NOTIF_PURGE_BATCH):
+    """Delete delivered outbox rows sent before ``cutoff`` in batches. Returns the number deleted."""
+    deleted = 0
+    while True:
+        ids = list(sent_outbox(cutoff).order_by("id").values_list("id", flat=True)[:batch])
+        if not ids:
+            return deleted
+        deleted += NotificationOutbox.objects.filter(pk__in=ids, status=NotificationOutbox.SENT).delete()[0]
+
+
+def drop_archive_before(months=NOTIF_ARCHIVE_KEEP_MONTHS, batch=NOTIF_PURGE_BATCH):
+    """
+    Remove archived history older than ``months`` months. PostgreSQL drops
+    whole monthly partitions; other databases delete in batches. Returns
+    the dropped partition names, or the number of rows deleted.
+    """
+    now = timezone.now().astimezone(dt_timezone.utc)
+    cutoff = _month_start(now)
+    for _ in range(max(0, months)):
+        cutoff = _month_start(cutoff - timedelta(days=1))
+
+    if not _partitioned():
+        deleted = 0
+        while True:
+            ids = list(
+                NotificationArchive.objects.filter(created_at__lt=cutoff)
+                .values_list("id", flat=True)[:batch]
+            )
+            if not ids:
+                return deleted
+            deleted += NotificationArchive.objects.filter(pk__in=ids).delete()[0]
+
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s",
+            [ARCHIVE_TABLE],
+        )
+        names = [r[0] for r in cur.fetchall()]
+    dropped = []
+    for name in sorted(names):
+        try:
+            year, month = int(name[-7:-3]), int(name[-2:])
+            start = datetime(year, month, 1, tzinfo=dt_timezone.utc)
+        except ValueError:
+            continue  # the DEFAULT partition
+        if _next_month(start) > cutoff:
+            continue
+        with connection.cursor() as cur:
+            cur.execute(f"ALTER TABLE {ARCHIVE_TABLE} DETACH PARTITION {name}")
+            cur.execute(f"DROP TABLE {name}")
+        dropped.append(name)
+        logger.info("Dropped notification archive partition %s", name)
+    return dropped
@@ -221,9 +221,32 @@ document.addEventListener("DOMContentLoaded", () => {
         startPollingLoop();
       }
     }
+    // Server-sent events: pushes new notifications and unread-count changes,
+    // resuming after the last notification id on reconnect. No polling.
+    // Only when the server says streams are on (SSE_ENABLED behind ASGI).
+    function startStream() {
+      bootstrapList();
+      const es = new EventSource("/notifications/stream/");
+      es.addEventListener("notification", (e) => {
+        const n = JSON.parse(e.data);
+        prependItem(n);
+        // let page widgets (e.g. session announcements) reuse this stream
+        document.dispatchEvent(new CustomEvent("notifications:new", { detail: n }));
+      });
+      es.addEventListener("unread", (e) => {
+        const d = JSON.parse(e.data);
+        showUnread(d.count || 0);
+      });
+      window.notificationStream = es;
+    }
+
     // init
-    refreshCount();
-    startRealtime();
+    if (window.EventSource && meta("sse-enabled") === "1") {
+      startStream();
+    } else {
+      refreshCount();
+      startRealtime();
+    }
     if (window.DEBUG) console.debug("Notifications: Bell initialized");
   } catch (err) {
     console.error("Notifications: initialization error", err);
@@ -81,5 +81,11 @@ document.addEventListener("DOMContentLoaded", () => {
     setInterval(poll, 15000);
   }
 
-  startRealtime();
+  // The bell (base template) holds the notification stream and re-broadcasts each item
+  const streamOn = window.EventSource && document.querySelector('meta[name="sse-enabled"]')?.content === "1";
+  if (streamOn) {
+    document.addEventListener("notifications:new", e => renderOne(e.detail));
+  } else {
+    startRealtime();
+  }
 });
\ No newline at end of file
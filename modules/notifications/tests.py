@@ -1,3 +1,284 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from modules.core import longpoll, versions
+from modules.core.tests import count_queries
+from . import notifcounts, outbox, retention, views
+from .models import Notification, NotificationArchive, NotificationOutbox, content_digest
+from .notify import notify, notify_many
+from modules.session.models import Session
 
-# Create your tests here.
+User = get_user_model()
+
+
+class NotificationStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="student", password="pw")
+
+    def test_stream_is_off_by_default(self):
+        self.client.force_login(self.user)
+        r = self.client.get(reverse("notifications:stream"))
+        self.assertEqual(r.status_code, 404)
+        self.assertEqual(r.json()["error"], "stream_disabled")
+
+    @mock.patch.object(longpoll, "SSE_ENABLED", True)
+    async def test_stream_sends_new_notifications(self):
+        n = await sync_to_async(notify)(self.user, "Hello")
+        await self.async_client.aforce_login(self.user)
+        r = await self.async_client.get(reverse("notifications:stream"), {"after_id": 0})
+        self.assertEqual(r.status_code, 200)
+        chunks = r.streaming_content
+        received = ""
+        async for chunk in chunks:
+            received += chunk.decode() if isinstance(chunk, bytes) else chunk
+            if "event: unread" in received:
+                break
+        await chunks.aclose()
+        self.assertIn(f"id: {n.pk}\nevent: notification", received)
+        self.assertIn('"count": 1', received)
+
+    @mock.patch.object(longpoll, "SSE_ENABLED", True)
+    @mock.patch.object(longpoll, "LONGPOLL_RECHECK", 0.01)
+    @mock.patch.object(versions, "VERSION_CACHE", "default")
+    @mock.patch.object(views, "NOTIF_SSE_KEEPALIVE", 0.3)
+    async def test_idle_stream_does_not_poll_the_database(self):
+        await self.async_client.aforce_login(self.user)
+        r = await self.async_client.get(reverse("notifications:stream"), {"after_id": 0})
+        chunks = r.streaming_content
+        received = ""
+        async for chunk in chunks:
+            received += chunk.decode() if isinstance(chunk, bytes) else chunk
+            if "event: unread" in received:
+                break
+        # ~30 recheck intervals until the keep-alive: one check on entry, then version reads only
+        with count_queries() as queries:
+            async for chunk in chunks:
+                if "keep-alive" in (chunk.decode() if isinstance(chunk, bytes) else chunk):
+                    break
+        await chunks.aclose()
+        self.assertEqual(len(queries), 2)
+
+
+class UnreadCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="student", password="pw")
+
+    def test_counts_from_the_table_without_a_shared_cache(self):
+        notify(self.user, "one")
+        n = notify(self.user, "two")
+        self.assertEqual(notifcounts.unread_count_for(self.user.pk), 2)
+        self.assertEqual(notifcounts.latest_id_for(self.user.pk), n.pk)
+        self.assertIsNone(cache.get(f"notif:unread:{self.user.pk}"))
+
+    @mock.patch.object(notifcounts, "NOTIF_COUNT_CACHE", "default")
+    def test_cached_count_follows_reads(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            n = notify(self.user, "one")
+        self.assertEqual(notifcounts.unread_count_for(self.user.pk), 1)
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("notifications:mark_read", args=[n.pk]))
+        self.assertEqual(notifcounts.unread_count_for(self.user.pk), 0)
+
+
+class NotifyManyTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(username="teacher", password="pw")
+        self.students = [User.objects.create_user(username=f"s{i}", password="pw") for i in range(3)]
+        self.ids = [u.pk for u in self.students]
+
+    def test_fan_out_creates_one_row_per_recipient(self):
+        session = Session.objects.create(title="Fan-out", created_by=self.teacher, code="FAN001")
+        with count_queries() as queries:
+            self.assertEqual(notify_many(self.ids, "Class starts", session=session), 3)
+        few = len(queries)
+        self.assertEqual(
+            sorted(Notification.objects.filter(session=session).values_list("recipient_id", flat=True)), sorted(self.ids)
+        )
+        self.assertEqual(NotificationOutbox.objects.count(), 3)
+        # the query count doesn't grow with the number of recipients
+        more = [User.objects.create_user(username=f"m{i}", password="pw").pk for i in range(10)]
+        with count_queries() as queries:
+            self.assertEqual(notify_many(more, "Class starts", session=session), 10)
+        self.assertEqual(len(queries), few)
+
+    def test_repeat_fan_out_is_deduplicated(self):
+        session = Session.objects.create(title="Fan-out", created_by=self.teacher, code="FAN002")
+        notify(self.students[0], "Quiz", session=session)
+        self.assertEqual(notify_many(self.ids, "Quiz", session=session), 2)
+        self.assertEqual(notify_many(self.ids, "Quiz", session=session), 0)
+        self.assertEqual(Notification.objects.filter(session=session).count(), 3)
+
+    def test_notifications_without_a_session_are_deduplicated(self):
+        self.assertEqual(notify_many(self.ids, "Maintenance tonight"), 3)
+        self.assertEqual(notify_many(self.ids, "Maintenance tonight"), 0)
+        first = notify(self.students[0], "Maintenance tonight")
+        self.assertEqual(Notification.objects.filter(session=None).count(), 3)
+        self.assertEqual(NotificationOutbox.objects.count(), 3)
+        # urgent copies are a separate notification
+        self.assertEqual(notify(self.students[0], "Maintenance tonight", urgent=True).is_urgent, True)
+        self.assertEqual(first, Notification.objects.get(recipient=self.students[0], is_urgent=False))
+
+    def test_database_rejects_duplicates_without_a_session(self):
+        notify(self.students[0], "Hello")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Notification.objects.create(recipient=self.students[0], content="Hello")
+        # a send racing past the existence check is skipped by the insert itself
+        Notification.objects.bulk_create(
+            [Notification(recipient=self.students[0], content="Hello", content_hash=content_digest("Hello"))],
+            ignore_conflicts=True,
+        )
+        self.assertEqual(Notification.objects.filter(recipient=self.students[0]).count(), 1)
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="student", password="pw")
+        self.now = timezone.now()
+
+    def make(self, text, days_old, read=True, sent=True):
+        n = notify(self.user, text)
+        created = self.now - timedelta(days=days_old)
+        Notification.objects.filter(pk=n.pk).update(created_at=created, read_at=created if read else None)
+        if sent:
+            NotificationOutbox.objects.filter(notification=n).update(status=NotificationOutbox.SENT, sent_at=created)
+        return n
+
+    def remaining(self):
+        return set(Notification.objects.values_list("content", flat=True))
+
+    def test_only_read_rows_before_the_cutoff_are_removed(self):
+        self.make("old read", 100)
+        self.make("recent read", 10)
+        self.make("old unread", 100, read=False)
+        cutoff = self.now - timedelta(days=90)
+        self.assertEqual(retention.purge_batch(cutoff, archive=False), 1)
+        self.assertEqual(self.remaining(), {"recent read", "old unread"})
+        self.assertEqual(retention.purge_batch(cutoff, archive=False), 0)
+
+    def test_rows_still_waiting_for_the_mirror_are_kept(self):
+        pending = self.make("pending", 100, sent=False)
+        cutoff = self.now - timedelta(days=90)
+        self.assertEqual(retention.purge_batch(cutoff, archive=False), 0)
+        self.assertEqual(self.remaining(), {"pending"})
+        NotificationOutbox.objects.filter(notification=pending).update(status=NotificationOutbox.SENT)
+        self.assertEqual(retention.purge_batch(cutoff, archive=False), 1)
+
+    def test_command_purges_in_batches_and_archives(self):
+        old = [self.make(f"old {i}", 100 + i) for i in range(5)]
+        self.make("recent", 1)
+        out = StringIO()
+        call_command("purge_notifications", "--days", "90", "--batch", "2", "--archive", stdout=out)
+        self.assertEqual(out.getvalue().count("Archived 2 notification(s)."), 2)
+        self.assertIn("Archived 1 notification(s).", out.getvalue())
+        self.assertIn("Archived 5 notification(s) created before", out.getvalue())
+        self.assertEqual(self.remaining(), {"recent"})
+        # archived under their original ids; their sent outbox rows went with them
+        self.assertEqual(set(NotificationArchive.objects.values_list("id", flat=True)), {n.pk for n in old})
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+
+    def test_dry_run_removes_nothing(self):
+        self.make("old", 100)
+        out = StringIO()
+        call_command("purge_notifications", "--days", "90", "--dry-run", stdout=out)
+        self.assertIn("Would remove 1 read notification(s)", out.getvalue())
+        self.assertEqual(self.remaining(), {"old"})
+
+    def test_old_archive_history_is_dropped(self):
+        for pk, days_old in ((1, 800), (2, 10)):
+            created = self.now - timedelta(days=days_old)
+            NotificationArchive.objects.create(
+                id=pk, recipient_id=self.user.pk, content="x", created_at=created, read_at=created
+            )
+        self.assertEqual(retention.drop_archive_before(months=24, batch=1), 1)
+        self.assertEqual(list(NotificationArchive.objects.values_list("id", flat=True)), [2])
+
+
+class OutboxPruneTests(TestCase):
+    def test_purge_deletes_old_sent_outbox_rows(self):
+        user = User.objects.create_user(username="student", password="pw")
+        old, recent, pending = (notify(user, text) for text in ("old", "recent", "pending"))
+        now = timezone.now()
+        NotificationOutbox.objects.filter(notification=old).update(status=NotificationOutbox.SENT, sent_at=now - timedelta(days=30))
+        NotificationOutbox.objects.filter(notification=recent).update(status=NotificationOutbox.SENT, sent_at=now)
+        call_command("purge_notifications", "--outbox-days", "7", stdout=StringIO())
+        self.assertEqual(
+            set(NotificationOutbox.objects.values_list("notification_id", flat=True)),
+            {recent.pk, pending.pk},
+        )
+
+
+class OutboxDrainTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="student", password="pw")
+        self.client_ = outbox.MemoryMirrorClient()
+
+    def queue(self, *texts):
+        with mock.patch.object(outbox, "NOTIF_OUTBOX_ASYNC", True):
+            return [notify(self.user, text) for text in texts]
+
+    def mirrored(self):
+        return [r["content"] for r in self.client_.rows.get(outbox.NOTIF_MIRROR_TABLE, [])]
+
+    def test_drain_sends_due_rows_in_one_insert(self):
+        self.queue("a", "b", "c")
+        self.assertEqual(outbox.drain(self.client_), (3, 0))
+        self.assertEqual((self.mirrored(), self.client_.calls), (["a", "b", "c"], 1))
+        self.assertFalse(NotificationOutbox.objects.exclude(status=NotificationOutbox.SENT).exists())
+        # a second drain finds nothing left to send
+        self.assertEqual(outbox.drain(self.client_), (0, 0))
+        self.assertEqual(self.client_.calls, 1)
+
+    def test_claimed_rows_are_not_claimed_again(self):
+        self.queue("a", "b")
+        first = outbox.claim_batch()
+        self.assertEqual(len(first), 2)
+        self.assertEqual(outbox.claim_batch(), [])
+
+    def test_failure_backs_off_then_gives_up(self):
+        self.queue("a")
+        self.client_.fail = ConnectionError("down")
+        self.assertEqual(outbox.drain(self.client_), (0, 1))
+        row = NotificationOutbox.objects.get()
+        self.assertEqual((row.status, row.attempts, row.claim), (NotificationOutbox.PENDING, 1, None))
+        self.assertIn("down", row.last_error)
+        self.assertGreater(row.next_attempt_at, timezone.now())
+        # not due yet: nothing is claimed
+        self.assertEqual(outbox.drain(self.client_), (0, 0))
+
+        NotificationOutbox.objects.update(attempts=outbox.NOTIF_OUTBOX_MAX_ATTEMPTS - 1, next_attempt_at=timezone.now())
+        outbox.drain(self.client_)
+        self.assertEqual(NotificationOutbox.objects.get().status, NotificationOutbox.FAILED)
+
+    def test_drainer_that_lost_its_lease_does_not_touch_the_rows(self):
+        self.queue("a")
+        stale = outbox.claim_batch()
+        # the lease expired and another drainer reclaimed the row
+        NotificationOutbox.objects.update(locked_at=timezone.now() - timedelta(seconds=outbox.NOTIF_OUTBOX_LEASE + 1))
+        fresh = outbox.claim_batch()
+        self.assertNotEqual(fresh[0].claim, stale[0].claim)
+
+        self.client_.fail = ConnectionError("down")
+        outbox.send_batch(stale, self.client_)
+        self.assertEqual(NotificationOutbox.objects.get().claim, fresh[0].claim)
+        self.client_.fail = None
+        outbox.send_batch(stale, self.client_)
+        self.assertEqual(NotificationOutbox.objects.get().status, NotificationOutbox.PENDING)
+        self.assertTrue(outbox.send_batch(fresh, self.client_))
+        self.assertEqual(NotificationOutbox.objects.get().status, NotificationOutbox.SENT)
+
+    def test_rows_are_drained_after_commit_without_a_worker(self):
+        with mock.patch.object(outbox, "get_mirror_client", return_value=self.client_):
+            with self.captureOnCommitCallbacks(execute=True):
+                notify(self.user, "now")
+        self.assertEqual(self.mirrored(), ["now"])
+        self.assertEqual(NotificationOutbox.objects.get().status, NotificationOutbox.SENT)
@@ -1,32 +1,104 @@
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from modules.core import longpoll
+from modules.core.versions import conditional, session_scope, user_scope
 from .models import Notification
 from django.views.decorators.http import require_GET, require_POST
 from django.contrib import messages
 from modules.session.models import Session, Participant
-from .notify import notify
+from modules.session.membership import get_membership
+from .notify import notify_many
+from .notifcounts import adjust_unread, latest_id_for, stream_key, unread_count_for
 from django.db.models import Min, Count
 from django.db import transaction
+import json
+import time
+from asgiref.sync import sync_to_async
+
+# SSE: close the stream after this long; EventSource reconnects with Last-Event-ID
+NOTIF_SSE_MAX_SECONDS = getattr(settings, "NOTIF_SSE_MAX_SECONDS", 300)
+NOTIF_SSE_KEEPALIVE = getattr(settings, "NOTIF_SSE_KEEPALIVE", 20)
+NOTIF_SSE_BATCH = 50
+
+def _serialize(n):
+    return {
+        "id": n.id,
+        "content": n.content,
+        "is_urgent": n.is_urgent,
+        "created_at": n.created_at.isoformat(),
+        "read_at": n.read_at.isoformat() if n.read_at else None,
+        "session_id": n.session_id,  # added for announcement tagging
+    }
 
 @require_GET
 @login_required
+@conditional(lambda request: [user_scope(request.user.pk, "notifications")])
 def latest_json(request):
     qs = Notification.objects.filter(recipient=request.user).order_by("-created_at")[:20]
-    data = [
-        {
-            "id": n.id,
-            "content": n.content,
-            "is_urgent": n.is_urgent,
-            "created_at": n.created_at.isoformat(),
-            "read_at": n.read_at.isoformat() if n.read_at else None,
-            "session_id": n.session_id,  # added for announcement tagging
-        }
-        for n in qs
-    ]
+    data = [_serialize(n) for n in qs]
     return JsonResponse({"items": data})
 
+@require_GET
+@login_required
+async def stream(request):
+    """
+    Server-sent events for the current user: a ``notification`` event per new
+    Notification (id = notification id, so EventSource resumes after
+    Last-Event-ID) and an ``unread`` event whenever the unread count moves.
+    Async, so an open stream holds no worker; 404 unless SSE is enabled and
+    served over ASGI (pages then poll latest/ and unread-count/ instead).
+    """
+    if not longpoll.streams_available(request):
+        return JsonResponse({"ok": False, "error": "stream_disabled"}, status=404)
+    user = await request.auser()
+    user_id = user.pk
+    try:
+        after_id = int(request.headers.get("Last-Event-ID") or request.GET.get("after_id") or -1)
+    except ValueError:
+        after_id = -1
+    if after_id < 0:
+        after_id = await sync_to_async(latest_id_for)(user_id)  # fresh connection: only what arrives from now on
+
+    @sync_to_async
+    def changes(after_id, last_count):
+        items = []
+        if latest_id_for(user_id) > after_id:
+            items = list(
+                Notification.objects.filter(recipient_id=user_id, id__gt=after_id).order_by("id")[:NOTIF_SSE_BATCH]
+            )
+        count = unread_count_for(user_id)
+        return (items, count) if items or count != last_count else None
+
+    stamp = longpoll.version_stamp(user_scope(user_id, "notifications"))
+
+    async def events(after_id):
+        started = time.monotonic()
+        last_count = None
+        yield "retry: 3000\n\n"
+        while time.monotonic() - started < NOTIF_SSE_MAX_SECONDS:
+            found = await longpoll.await_for(
+                stream_key(user_id), lambda: changes(after_id, last_count), NOTIF_SSE_KEEPALIVE, stamp=stamp,
+            )
+            if not found:
+                yield ": keep-alive\n\n"
+                continue
+            items, count = found
+            for n in items:
+                yield f"id: {n.id}\nevent: notification\ndata: {json.dumps(_serialize(n))}\n\n"
+            if items:
+                after_id = items[-1].id
+            if count != last_count:
+                yield f"event: unread\ndata: {json.dumps({'count': count})}\n\n"
+                last_count = count
+
+    response = StreamingHttpResponse(events(after_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
 @login_required
 def notifications_view(request):
     items = Notification.objects.filter(recipient=request.user).order_by("-created_at")[:100]
@@ -34,19 +106,21 @@ def notifications_view(request):
 
 @login_required
 def unread_count(request):
-    cnt = Notification.objects.filter(recipient=request.user, read_at__isnull=True).count()
-    return JsonResponse({"count": cnt})
+    return JsonResponse({"count": unread_count_for(request.user.pk)})
 
 @login_required
 def mark_all_read(request):
-    Notification.objects.filter(recipient=request.user, read_at__isnull=True).update(read_at=timezone.now())
+    marked = Notification.objects.filter(recipient=request.user, read_at__isnull=True).update(read_at=timezone.now())
+    adjust_unread(request.user.pk, -marked)
     return JsonResponse({"ok": True})
 
 @login_required
 def mark_read(request, pk: int):
-    n = get_object_or_404(Notification, pk=pk, recipient=request.user, read_at__isnull=True)
-    n.read_at = timezone.now()
-    n.save(update_fields=["read_at"])
+    # conditional UPDATE: two concurrent clicks only count once
+    marked = Notification.objects.filter(pk=pk, recipient=request.user, read_at__isnull=True).update(read_at=timezone.now())
+    if not marked:
+        raise Http404("Notification not found")
+    adjust_unread(request.user.pk, -1)
     return JsonResponse({"ok": True})
 
 @login_required
@@ -61,36 +135,34 @@ def send_announcement(request, session_id):
     if not text:
         return JsonResponse({"ok": False, "error": "empty"}, status=400)
 
-    participant_qs = (
+    recipient_ids = (
         Participant.objects
         .filter(session=session)
-        .exclude(user=session.created_by)
-        .select_related("user")
+        .exclude(user_id=session.created_by_id)
+        .values_list("user_id", flat=True)
+        .distinct()
     )
-
-    # Dedup user IDs
-    seen = set()
-    targets = []
-    for p in participant_qs:
-        if p.user_id not in seen:
-            seen.add(p.user_id)
-            targets.append(p.user)
-
-    sent = 0
-    for u in targets:
-        if notify(u, text, session=session, urgent=urgent):
-            sent += 1
+    sent = notify_many(recipient_ids, text, session=session, urgent=urgent)
     return JsonResponse({"ok": True, "sent": sent})
 
+def _announcement_scopes(request, session_id):
+    m = get_membership(request, session_id)
+    if m is None or not (m.is_owner or request.user.is_staff):
+        return None
+    return [session_scope(session_id, "announcements")]
+
 @login_required
+@conditional(_announcement_scopes)
 def session_announcements_json(request, session_id):
-    session = get_object_or_404(Session, id=session_id)
-    if request.user != session.created_by and not request.user.is_staff:
+    m = get_membership(request, session_id)
+    if m is None:
+        return JsonResponse({"items": []}, status=404)
+    if not m.is_owner and not request.user.is_staff:
         return JsonResponse({"items": []})
     # Aggregate per unique announcement; distinct recipient count
     agg = (
         Notification.objects
-        .filter(session=session)
+        .filter(session_id=session_id)
         .values("content", "is_urgent")
         .annotate(
             created_at=Min("created_at"),
@@ -117,16 +189,13 @@ def session_student_announcements_json(request, session_id):
     Return announcements for the current user in a session (students + teacher).
     Used by the student whiteboard to bootstrap and by realtime to filter.
     """
-    session = get_object_or_404(Session, id=session_id)
+    m = get_membership(request, session_id)
+    if m is None:
+        return JsonResponse({"items": []}, status=404)
     # Ensure user is participant, teacher, or staff
-    is_allowed = (
-        request.user == session.created_by
-        or request.user.is_staff
-        or Participant.objects.filter(session=session, user=request.user).exists()
-    )
-    if not is_allowed:
+    if not m.is_member and not request.user.is_staff:
         return JsonResponse({"items": []})
-    qs = Notification.objects.filter(session=session, recipient=request.user).order_by("-created_at")[:50]
+    qs = Notification.objects.filter(session_id=session_id, recipient=request.user).order_by("-created_at")[:50]
     data = [
         {
             "id": n.id,
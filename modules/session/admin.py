@@ -1,3 +1,36 @@
 from django.contrib import admin
+from .models import StrokeEvent, BoardCheckpoint, SessionSnapshot, Blob, SnapshotJob
 
 # Register your models here.
+
+@admin.register(StrokeEvent)
+class StrokeEventAdmin(admin.ModelAdmin):
+    list_display = ("session", "seq", "author", "tool", "is_final", "created_at")
+    list_filter = ("tool",)
+    search_fields = ("session__title", "author__username")
+
+
+@admin.register(BoardCheckpoint)
+class BoardCheckpointAdmin(admin.ModelAdmin):
+    list_display = ("session", "seq", "stroke_count", "created_at")
+    exclude = ("data",)
+
+
+@admin.register(SessionSnapshot)
+class SessionSnapshotAdmin(admin.ModelAdmin):
+    list_display = ("session", "version", "path", "size", "created_at")
+    search_fields = ("session__title", "path")
+
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ("sha256", "location", "size", "refcount", "created_at")
+    list_filter = ("location",)
+    search_fields = ("sha256", "path")
+
+
+@admin.register(SnapshotJob)
+class SnapshotJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "session", "status", "attempts", "next_attempt_at", "created_at", "finished_at")
+    list_filter = ("status",)
+    readonly_fields = ("last_error",)
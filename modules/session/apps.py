@@ -4,3 +4,6 @@ class SessionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'modules.session'
     label = 'session'
+
+    def ready(self):
+        from . import signals  # noqa: F401
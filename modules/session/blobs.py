@@ -0,0 +1,80 @@
+"""
+Content-addressed storage for attachments and snapshots.
+
+Bytes are stored once per location under ``blobs/<aa>/<sha256><ext>`` and
+shared through ``Blob`` rows. An upload whose hash is already known costs
+one local hashing pass and no storage writes; copying an attachment or a
+snapshot to another session is just a new row pointing at the same blob.
+Reference counts follow those rows (signals.py).
+
+A blob found by hash is locked (SELECT ... FOR UPDATE) until the caller's
+transaction commits, and ``prune_blobs`` deletes under the same lock after
+re-checking the count, so a blob being reused cannot be pruned in between.
+Callers of ``store_media_blob`` save their pointer row in that transaction.
+"""
+import os
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from .models import Blob
+from .uploads import UPLOAD_MAX_BYTES, hash_upload, stream_to_bucket, stream_to_storage
+
+BLOB_PREFIX = "blobs"
+
+
+def blob_path(sha256, name=""):
+    ext = os.path.splitext(name or "")[1].lower()[:10]
+    return f"{BLOB_PREFIX}/{sha256[:2]}/{sha256}{ext}"
+
+
+def find_blob(location, sha256):
+    """The stored blob with these bytes, locked against pruning (None when new)."""
+    return Blob.objects.select_for_update().filter(location=location, sha256=sha256).first()
+
+
+def register_blob(location, sha256, size, content_type, path, url=""):
+    try:
+        with transaction.atomic():
+            return Blob.objects.create(
+                location=location, sha256=sha256, size=size,
+                content_type=content_type or "", path=path, url=url,
+            )
+    except IntegrityError:
+        # stored concurrently by another request
+        return Blob.objects.select_for_update().get(location=location, sha256=sha256)
+
+
+def store_media_blob(fileobj, max_bytes=UPLOAD_MAX_BYTES, storage=None):
+    """
+    Blob in media storage holding ``fileobj``'s bytes; writes them only if new.
+    Call inside ``transaction.atomic()`` and save the pointer row before it ends.
+    """
+    storage = storage or default_storage
+    sha256, size = hash_upload(fileobj, max_bytes)
+    blob = find_blob(Blob.MEDIA, sha256)
+    if blob:
+        return blob
+    path = blob_path(sha256, fileobj.name)
+    if not storage.exists(path):
+        path, _, _ = stream_to_storage(fileobj, path, storage=storage, max_bytes=max_bytes)
+    return register_blob(Blob.MEDIA, sha256, size, getattr(fileobj, "content_type", ""), path)
+
+
+def store_bucket_blob(bucket, fileobj, content_type, max_bytes=UPLOAD_MAX_BYTES):
+    """Blob in the Supabase bucket holding ``fileobj``'s bytes; uploads only if new."""
+    sha256, size = hash_upload(fileobj, max_bytes)
+    blob = Blob.objects.filter(location=Blob.BUCKET, sha256=sha256).first()
+    if blob:
+        return blob
+    path = blob_path(sha256, fileobj.name)
+    # same path means same bytes, so overwriting a concurrent upload is harmless
+    stream_to_bucket(bucket, fileobj, path, content_type, max_bytes=max_bytes, upsert=True)
+    return register_blob(Blob.BUCKET, sha256, size, content_type, path, url=bucket.get_public_url(path))
+
+
+def acquire(blob_id):
+    Blob.objects.filter(pk=blob_id).update(refcount=F("refcount") + 1)
+
+
+def release(blob_id):
+    Blob.objects.filter(pk=blob_id, refcount__gt=0).update(refcount=F("refcount") - 1)
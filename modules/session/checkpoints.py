@@ -0,0 +1,158 @@
+"""
+Board checkpoints: the stroke log folded into one compacted record per stroke.
+
+``append_strokes`` reads Session.checkpoint_seq in the same query that
+reserves its sequence numbers, so deciding whether a checkpoint is due
+costs nothing. By default the batch that crosses CHECKPOINT_EVERY_STROKES
+builds it right after its commit. With STROKE_CHECKPOINT_ASYNC on, requests
+never build; ``manage.py checkpoint_sessions`` (cron, about every
+STROKE_CHECKPOINT_SECONDS) folds every board whose log moved, which also
+covers boards that went idle below the threshold.
+"""
+import logging
+import threading
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from .models import Session, StrokeEvent, BoardCheckpoint
+from .stroke_codec import decode_stroke_log, encode_stroke_dicts, encode_stroke_log
+
+logger = logging.getLogger(__name__)
+
+# Fold the log into a new checkpoint after this many strokes.
+CHECKPOINT_EVERY_STROKES = getattr(settings, "STROKE_CHECKPOINT_EVERY", 500)
+# Older checkpoints beyond this many are pruned after a successful build.
+CHECKPOINT_KEEP = getattr(settings, "STROKE_CHECKPOINT_KEEP", 2)
+# On: checkpoints are only built by `manage.py checkpoint_sessions`
+CHECKPOINT_ASYNC = getattr(settings, "STROKE_CHECKPOINT_ASYNC", False)
+
+_inflight = set()
+_inflight_lock = threading.Lock()
+
+
+def latest_checkpoint(session):
+    """``session`` may be a Session or its id."""
+    return BoardCheckpoint.objects.filter(session=session).order_by("-seq").first()
+
+
+def fold_strokes(records, events):
+    """
+    Fold stroke records into a compacted list: deltas of the same stroke are
+    merged into one record (in order of first appearance) and a "clear"
+    drops everything before it.
+
+    "undo" flags the author's stroke with the same stroke_id as ``undone``
+    and "redo" clears the flag. Undone strokes stay in the list so a redo
+    folded later still finds them, until the author starts a new stroke:
+    as on the whiteboard, that ends their chance of being redone.
+    """
+    strokes = {}
+    undone = {}  # author_id -> keys of their undone strokes
+    for rec in records:
+        key = (rec["author_id"], rec["stroke_id"] or f"#{rec['seq']}")
+        strokes[key] = rec
+        if rec.get("undone"):
+            undone.setdefault(rec["author_id"], set()).add(key)
+
+    for ev in events:
+        if ev["tool"] == "clear":
+            strokes.clear()
+            undone.clear()
+            continue
+        if ev["tool"] in StrokeEvent.HISTORY_OPS:
+            key = (ev["author_id"], ev["stroke_id"])
+            cur = strokes.get(key)
+            if cur is None:
+                continue
+            cur["undone"] = ev["tool"] == "undo"
+            keys = undone.setdefault(ev["author_id"], set())
+            if cur["undone"]:
+                keys.add(key)
+            else:
+                keys.discard(key)
+            continue
+        key = (ev["author_id"], ev["stroke_id"] or f"#{ev['seq']}")
+        cur = strokes.get(key)
+        if cur is None:
+            for old in undone.pop(ev["author_id"], ()):
+                del strokes[old]
+            strokes[key] = dict(ev, undone=False)
+            continue
+        pts = ev["points"]
+        # the client repeats the joining point at the start of each delta
+        if pts and cur["points"] and pts[0] == cur["points"][-1]:
+            pts = pts[1:]
+        cur["points"] = cur["points"] + pts
+        cur["is_final"] = cur["is_final"] or ev["is_final"]
+    return list(strokes.values())
+
+
+def build_checkpoint(session):
+    """
+    Fold the strokes after the latest checkpoint into a new one.
+    Returns the new BoardCheckpoint, or None when there is nothing new.
+    """
+    prev = latest_checkpoint(session)
+    prev_seq = prev.seq if prev else 0
+
+    events = list(
+        StrokeEvent.objects.filter(session=session, seq__gt=prev_seq).order_by("seq")
+    )
+    if not events:
+        return None
+
+    records = list(decode_stroke_log(bytes(prev.data))) if prev else []
+    folded = fold_strokes(records, decode_stroke_log(encode_stroke_log(events)))
+
+    try:
+        with transaction.atomic():
+            cp = BoardCheckpoint.objects.create(
+                session=session,
+                seq=events[-1].seq,
+                data=encode_stroke_dicts(folded),
+                stroke_count=len(folded),
+            )
+    except IntegrityError:
+        # Another worker folded the same range first
+        logger.debug("build_checkpoint(): %s@%s already exists", session.pk, events[-1].seq)
+        return None
+    Session.objects.filter(pk=cp.session_id, checkpoint_seq__lt=cp.seq).update(checkpoint_seq=cp.seq)
+
+    stale = BoardCheckpoint.objects.filter(session=session).order_by("-seq").values_list("id", flat=True)[CHECKPOINT_KEEP:]
+    BoardCheckpoint.objects.filter(id__in=list(stale)).delete()
+    logger.info("Checkpoint for session %s at seq %s (%s strokes)", session.pk, cp.seq, cp.stroke_count)
+    return cp
+
+
+def checkpoint_due(last_seq, checkpoint_seq):
+    return last_seq - checkpoint_seq >= CHECKPOINT_EVERY_STROKES
+
+
+def maybe_checkpoint(session_id, last_seq, checkpoint_seq):
+    """
+    Called after a stroke batch commits, with the session's seqs as the batch
+    saw them (no query). Builds a checkpoint when one is due, unless that is
+    left to the cron command (STROKE_CHECKPOINT_ASYNC).
+    """
+    if CHECKPOINT_ASYNC or not checkpoint_due(last_seq, checkpoint_seq):
+        return
+    with _inflight_lock:
+        if session_id in _inflight:
+            return  # this process is already building it
+        _inflight.add(session_id)
+    try:
+        session = Session.objects.filter(pk=session_id).first()
+        if session:
+            build_checkpoint(session)
+    except Exception:
+        logger.exception("Checkpoint build failed for session %s", session_id)
+    finally:
+        with _inflight_lock:
+            _inflight.discard(session_id)
+
+
+def board_state(session):
+    """Return (checkpoint or None, tail events after it) for the join path.
+    ``session`` may be a Session or its id."""
+    cp = latest_checkpoint(session)
+    tail = StrokeEvent.objects.filter(session=session, seq__gt=cp.seq if cp else 0).order_by("seq")
+    return cp, list(tail)
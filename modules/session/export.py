@@ -0,0 +1,462 @@
+"""
+Streaming session exports: NDJSON, SVG, multi-page PDF and a ZIP archive
+of many sessions.
+
+Every format is a generator of byte chunks for StreamingHttpResponse. Rows
+are read with ``.iterator()`` and written as they arrive, so memory stays
+bounded by EXPORT_CHUNK_SIZE plus one decoded stroke, however long the
+board's history is.
+
+Strokes are the latest checkpoint followed by the raw log tail (deltas of
+one stroke are separate records that join end to end). A "clear" record is
+kept in NDJSON and painted over with white in SVG/PDF. Strokes that end up
+undone are left out, and so are the undo/redo entries themselves.
+"""
+import csv
+import io
+import json
+import logging
+import zipfile
+import zlib
+from xml.sax.saxutils import escape, quoteattr
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils.text import slugify
+from .checkpoints import latest_checkpoint
+from .models import Participant, StrokeEvent, UploadedFile
+from .snapshots import latest_snapshot
+from .stroke_codec import decode_stroke_log, encode_stroke_log
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = getattr(settings, "EXPORT_CHUNK_SIZE", 64 * 1024)
+EXPORT_ROW_BATCH = 500
+# Board canvas for SVG/PDF; stroke widths scale from the client reference width
+EXPORT_BOARD_WIDTH = 1600
+EXPORT_BOARD_HEIGHT = 900
+EXPORT_REFERENCE_WIDTH = getattr(settings, "RENDER_REFERENCE_WIDTH", 1280)
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "svg": ("image/svg+xml", "svg"),
+    "pdf": ("application/pdf", "pdf"),
+}
+
+
+# ==========================
+# 📚 SOURCES
+# ==========================
+def iter_strokes(session):
+    """Stroke dicts: the latest checkpoint's records, then every event after it."""
+    cp = latest_checkpoint(session)
+    tail = StrokeEvent.objects.filter(session=session, seq__gt=cp.seq if cp else 0).order_by("seq")
+    # the last undo/redo in the tail decides whether a stroke is shown
+    history = tail.filter(tool__in=StrokeEvent.HISTORY_OPS).values_list("author_id", "stroke_id", "tool")
+    last_op = {(author, stroke): tool for author, stroke, tool in history.iterator(chunk_size=EXPORT_ROW_BATCH)}
+
+    def visible(s):
+        return last_op.get((s["author_id"], s["stroke_id"]), "undo" if s["undone"] else "redo") != "undo"
+
+    if cp:
+        yield from filter(visible, decode_stroke_log(bytes(cp.data)))
+    for ev in tail.exclude(tool__in=StrokeEvent.HISTORY_OPS).iterator(chunk_size=EXPORT_ROW_BATCH):
+        yield from filter(visible, decode_stroke_log(encode_stroke_log((ev,))))
+
+
+def iter_uploads(session):
+    rows = (
+        UploadedFile.objects.filter(session=session)
+        .order_by("id")
+        .values_list("id", "name", "file", "uploaded_by__username", "uploaded_at", "blob__size", "blob__sha256")
+    )
+    for pk, name, path, username, uploaded_at, size, sha256 in rows.iterator(chunk_size=EXPORT_ROW_BATCH):
+        yield {
+            "id": pk,
+            "name": name or path.rsplit("/", 1)[-1],
+            "url": default_storage.url(path) if path else "",
+            "uploaded_by": username,
+            "uploaded_at": uploaded_at.isoformat(),
+            "size": size,
+            "sha256": sha256,
+        }
+
+
+def iter_chat(session):
+    from modules.chat.models import Message
+
+    rows = (
+        Message.objects.filter(room__session=session)
+        .order_by("id")
+        .values_list("id", "sender__username", "content", "timestamp")
+    )
+    for pk, username, content, ts in rows.iterator(chunk_size=EXPORT_ROW_BATCH):
+        yield {"id": pk, "sender": username, "content": content, "timestamp": ts.isoformat()}
+
+
+ATTENDANCE_HEADER = ["Student", "Email", "Joined", "Last Active"]
+
+
+def iter_attendance(session):
+    """Attendance rows in ATTENDANCE_HEADER order, earliest join first."""
+    rows = (
+        Participant.objects.filter(session=session)
+        .order_by("joined_at")
+        .values_list("user__username", "user__email", "joined_at", "last_active")
+    )
+    for username, email, joined, last_active in rows.iterator(chunk_size=EXPORT_ROW_BATCH):
+        yield [
+            username or "",
+            email or "",
+            joined.isoformat() if joined else "",
+            last_active.isoformat() if last_active else "",
+        ]
+
+
+def _chunked(pieces):
+    """Coalesce small byte strings into EXPORT_CHUNK_SIZE chunks."""
+    buf, size = [], 0
+    for piece in pieces:
+        buf.append(piece)
+        size += len(piece)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield b"".join(buf)
+            buf, size = [], 0
+    if buf:
+        yield b"".join(buf)
+
+
+def _session_header(session):
+    return {
+        "id": str(session.id),
+        "title": session.title,
+        "code": session.code,
+        "created_at": session.created_at.isoformat(),
+        "stroke_seq": session.stroke_seq,
+    }
+
+
+# ==========================
+# 🧾 NDJSON
+# ==========================
+def ndjson_export(session):
+    def lines():
+        def line(kind, obj):
+            return json.dumps({"type": kind, **obj}, separators=(",", ":"), ensure_ascii=False).encode("utf-8") + b"\n"
+
+        yield line("session", _session_header(session))
+        for s in iter_strokes(session):
+            yield line("stroke", s)
+        for u in iter_uploads(session):
+            yield line("upload", u)
+        for m in iter_chat(session):
+            yield line("chat", m)
+    return _chunked(lines())
+
+
+# ==========================
+# 🖼️ SVG
+# ==========================
+def _stroke_width(stroke):
+    return max(0.5, (stroke.get("width") or 1) * EXPORT_BOARD_WIDTH / EXPORT_REFERENCE_WIDTH)
+
+
+def svg_export(session):
+    W, H = EXPORT_BOARD_WIDTH, EXPORT_BOARD_HEIGHT
+
+    def parts():
+        yield (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:cw="urn:collaboard:export" '
+            f'width="{W}" height="{H}" viewBox="0 0 {W} {H}">\n'
+            f"<title>{escape(session.title)}</title>\n"
+            f'<rect width="{W}" height="{H}" fill="#fff"/>\n'
+            '<g fill="none" stroke-linecap="round" stroke-linejoin="round">\n'
+        ).encode("utf-8")
+        for s in iter_strokes(session):
+            if s["tool"] == "clear":
+                yield f'<rect width="{W}" height="{H}" fill="#fff"/>\n'.encode("utf-8")
+                continue
+            pts = s["points"]
+            if not pts:
+                continue
+            color = "#fff" if s["tool"] == "eraser" else (s["color"] or "#000")
+            d = "M" + " L".join(f"{x * W:.1f} {y * H:.1f}" for x, y in pts)
+            if len(pts) == 1:
+                d += " l0 0"  # zero-length segment renders as a round dot
+            yield (
+                f'<path d="{d}" stroke={quoteattr(color)} stroke-width="{_stroke_width(s):.1f}"/>\n'
+            ).encode("utf-8")
+        yield b"</g>\n<metadata>\n"
+        for u in iter_uploads(session):
+            yield (
+                f'<cw:upload name={quoteattr(u["name"])} href={quoteattr(u["url"])} '
+                f'by={quoteattr(u["uploaded_by"] or "")} at="{u["uploaded_at"]}"/>\n'
+            ).encode("utf-8")
+        for m in iter_chat(session):
+            yield (
+                f'<cw:message from={quoteattr(m["sender"] or "")} at="{m["timestamp"]}">'
+                f'{escape(m["content"])}</cw:message>\n'
+            ).encode("utf-8")
+        yield b"</metadata>\n</svg>\n"
+    return _chunked(parts())
+
+
+# ==========================
+# 📄 PDF
+# ==========================
+PDF_PAGE_W, PDF_PAGE_H = 842, 595           # A4 landscape, points
+PDF_BOARD_H = round(PDF_PAGE_W * EXPORT_BOARD_HEIGHT / EXPORT_BOARD_WIDTH)
+PDF_TEXT_LINES = 48
+PDF_TEXT_COLS = 130
+
+
+class _PdfWriter:
+    """
+    Minimal sequential PDF writer: objects are emitted as they are produced
+    and only their byte offsets are kept for the xref table. Stream lengths
+    are written as indirect objects after each stream.
+    """
+
+    def __init__(self):
+        self.offset = 0
+        self.offsets = {}
+        self.next_id = 1
+
+    def reserve(self):
+        oid = self.next_id
+        self.next_id += 1
+        return oid
+
+    def emit(self, data):
+        self.offset += len(data)
+        return data
+
+    def obj(self, oid, body):
+        self.offsets[oid] = self.offset
+        return self.emit(f"{oid} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+
+    def stream(self, oid, chunks, extra=""):
+        """Yield a Flate-compressed stream object built from ``chunks`` (bytes)."""
+        length_id = self.reserve()
+        self.offsets[oid] = self.offset
+        yield self.emit(f"{oid} 0 obj\n<< /Length {length_id} 0 R /Filter /FlateDecode {extra}>>\nstream\n".encode("latin-1"))
+        z = zlib.compressobj(6)
+        size = 0
+        for chunk in chunks:
+            out = z.compress(chunk)
+            if out:
+                size += len(out)
+                yield self.emit(out)
+        out = z.flush()
+        size += len(out)
+        yield self.emit(out)
+        yield self.emit(b"\nendstream\nendobj\n")
+        yield self.obj(length_id, str(size))
+
+    def trailer(self, root_id):
+        xref = self.offset
+        lines = [f"xref\n0 {self.next_id}\n", "0000000000 65535 f \n"]
+        lines += [f"{self.offsets[i]:010d} 00000 n \n" for i in range(1, self.next_id)]
+        lines.append(f"trailer\n<< /Size {self.next_id} /Root {root_id} 0 R >>\nstartxref\n{xref}\n%%EOF\n")
+        return self.emit("".join(lines).encode("latin-1"))
+
+
+def _pdf_text(text):
+    text = text.encode("latin-1", "replace").decode("latin-1")
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _pdf_rgb(color):
+    from .render import _rgb  # Pillow's CSS colour parser
+    try:
+        r, g, b = _rgb(color)
+    except Exception:
+        r = g = b = 0
+    return f"{r / 255:.3f} {g / 255:.3f} {b / 255:.3f}"
+
+
+def _board_ops(session):
+    W, H = PDF_PAGE_W, PDF_BOARD_H
+    top = PDF_PAGE_H - H  # board sits at the top of the page
+    scale = W / EXPORT_BOARD_WIDTH
+    yield b"1 J 1 j\n"
+    yield f"0.85 G 0.5 w {0} {top} {W} {H} re S\n".encode("latin-1")
+    for s in iter_strokes(session):
+        if s["tool"] == "clear":
+            yield f"1 g 0 {top} {W} {H} re f\n".encode("latin-1")
+            continue
+        pts = s["points"]
+        if not pts:
+            continue
+        color = "1 1 1" if s["tool"] == "eraser" else _pdf_rgb(s["color"] or "#000")
+        ops = [f"{color} RG {_stroke_width(s) * scale:.2f} w"]
+        x0, y0 = pts[0]
+        ops.append(f"{x0 * W:.2f} {top + (1 - y0) * H:.2f} m")
+        for x, y in pts[1:] or pts[:1]:
+            ops.append(f"{x * W:.2f} {top + (1 - y) * H:.2f} l")
+        ops.append("S\n")
+        yield " ".join(ops).encode("latin-1")
+
+
+def _text_lines(session):
+    import textwrap
+
+    yield ("h", f"{session.title} ({session.code})")
+    yield ("t", "")
+    yield ("h", "Attachments")
+    any_upload = False
+    for u in iter_uploads(session):
+        any_upload = True
+        yield ("t", f"{u['uploaded_at'][:16].replace('T', ' ')}  {u['uploaded_by'] or ''}: {u['name']}  {u['url']}")
+    if not any_upload:
+        yield ("t", "(none)")
+    yield ("t", "")
+    yield ("h", "Chat")
+    any_chat = False
+    for m in iter_chat(session):
+        any_chat = True
+        head = f"{m['timestamp'][:16].replace('T', ' ')}  {m['sender'] or ''}: "
+        for i, part in enumerate(textwrap.wrap(head + (m["content"] or ""), PDF_TEXT_COLS) or [head]):
+            yield ("t", part if i == 0 else "    " + part)
+    if not any_chat:
+        yield ("t", "(none)")
+
+
+def _text_pages(session):
+    """Group text lines into pages of PDF_TEXT_LINES; yields lists of (style, text)."""
+    page = []
+    for item in _text_lines(session):
+        page.append(item)
+        if len(page) >= PDF_TEXT_LINES:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def _text_ops(lines):
+    yield b"BT\n"
+    y = PDF_PAGE_H - 40
+    for style, text in lines:
+        font = "/F2 11" if style == "h" else "/F1 8.5"
+        yield f"{font} Tf 1 0 0 1 36 {y} Tm ({_pdf_text(text)}) Tj\n".encode("latin-1")
+        y -= 11
+    yield b"ET\n"
+
+
+def pdf_export(session):
+    pdf = _PdfWriter()
+    catalog_id, pages_id, font_id, bold_id = (pdf.reserve() for _ in range(4))
+    page_ids = []
+
+    def page(content_chunks):
+        page_id, content_id = pdf.reserve(), pdf.reserve()
+        page_ids.append(page_id)
+        yield pdf.obj(page_id, (
+            f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 {PDF_PAGE_W} {PDF_PAGE_H}] "
+            f"/Resources << /Font << /F1 {font_id} 0 R /F2 {bold_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        ))
+        yield from pdf.stream(content_id, content_chunks)
+
+    def parts():
+        yield pdf.emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        yield pdf.obj(font_id, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        yield pdf.obj(bold_id, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>")
+        yield from page(_board_ops(session))
+        for lines in _text_pages(session):
+            yield from page(_text_ops(lines))
+        kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+        yield pdf.obj(pages_id, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>")
+        yield pdf.obj(catalog_id, f"<< /Type /Catalog /Pages {pages_id} 0 R >>")
+        yield pdf.trailer(catalog_id)
+    return _chunked(parts())
+
+
+EXPORTERS = {"ndjson": ndjson_export, "svg": svg_export, "pdf": pdf_export}
+
+
+# ==========================
+# 🗜️ ZIP ARCHIVE
+# ==========================
+class _ZipSink:
+    """
+    Write-only file for ZipFile. It has no tell()/seek(), so zipfile writes
+    data descriptors after each member instead of seeking back to patch
+    headers, and everything written can be handed out and forgotten.
+    """
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        out = b"".join(self.parts)
+        self.parts.clear()
+        return out
+
+
+def _attendance_csv(session):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(ATTENDANCE_HEADER)
+    yield buf.getvalue().encode("utf-8")
+    for row in iter_attendance(session):
+        buf.seek(0)
+        buf.truncate()
+        writer.writerow(row)
+        yield buf.getvalue().encode("utf-8")
+
+
+def _chat_transcript(session):
+    for m in iter_chat(session):
+        yield f"[{m['timestamp'][:19].replace('T', ' ')}] {m['sender'] or ''}: {m['content']}\n".encode("utf-8")
+
+
+def _archive_members(session, storage):
+    """(name, compress, chunks) for one session's folder in the archive."""
+    folder = f"{slugify(session.title)[:50] or 'session'}-{session.code}"
+    snap = latest_snapshot(session.pk)
+    if snap is not None:
+        # PNG is already compressed; store it as is
+        yield f"{folder}/snapshot.png", zipfile.ZIP_STORED, storage.stream(snap.path)
+    elif session.stroke_seq:
+        yield f"{folder}/board.svg", zipfile.ZIP_DEFLATED, svg_export(session)
+    yield f"{folder}/attendance.csv", zipfile.ZIP_DEFLATED, _attendance_csv(session)
+    yield f"{folder}/chat.txt", zipfile.ZIP_DEFLATED, _chat_transcript(session)
+
+
+def archive_export(sessions):
+    """
+    Stream a ZIP with one folder per session (latest snapshot or vector
+    board, attendance CSV, chat transcript). Members are compressed and
+    written as their chunks arrive; nothing is staged on disk or kept in
+    memory beyond the chunk being written.
+    """
+    from .snapshot_queue import get_snapshot_storage
+
+    storage = get_snapshot_storage()
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for session in sessions:
+            stamp = session.created_at.timetuple()[:6]
+            for name, compress, chunks in _archive_members(session, storage):
+                info = zipfile.ZipInfo(name, date_time=max(stamp, (1980, 1, 1, 0, 0, 0)))
+                info.compress_type = compress
+                try:
+                    with zf.open(info, mode="w") as member:
+                        for chunk in chunks:
+                            member.write(chunk)
+                            if sum(map(len, sink.parts)) >= EXPORT_CHUNK_SIZE:
+                                yield sink.drain()
+                except Exception:
+                    # the member already started; a missing object is left empty rather than aborting the archive
+                    logger.exception("Archive: could not add %s", name)
+            if sink.parts:
+                yield sink.drain()
+    yield sink.drain()  # central directory
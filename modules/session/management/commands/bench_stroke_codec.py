@@ -0,0 +1,56 @@
+import json
+import random
+import time
+from django.core.management.base import BaseCommand
+from modules.session.stroke_codec import encode_points, decode_points, decode_points_array, np
+
+
+def _random_stroke(rng, n):
+    """Random-walk pen stroke with realistic small steps between pointer events."""
+    x, y = rng.random(), rng.random()
+    pts = []
+    for _ in range(n):
+        x = min(max(x + rng.uniform(-0.004, 0.004), 0.0), 1.0)
+        y = min(max(y + rng.uniform(-0.004, 0.004), 0.0), 1.0)
+        pts.append([x, y])
+    return pts
+
+
+class Command(BaseCommand):
+    help = "Compare size and speed of the binary stroke codec against plain JSON point lists."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--strokes", type=int, default=2000)
+        parser.add_argument("--points", type=int, default=120, help="Points per stroke")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **opts):
+        rng = random.Random(opts["seed"])
+        strokes = [_random_stroke(rng, opts["points"]) for _ in range(opts["strokes"])]
+        total_points = sum(len(s) for s in strokes)
+
+        t0 = time.perf_counter()
+        as_json = [json.dumps(s).encode("utf-8") for s in strokes]
+        t1 = time.perf_counter()
+        [json.loads(b) for b in as_json]
+        t2 = time.perf_counter()
+        as_bin = [encode_points(s) for s in strokes]
+        t3 = time.perf_counter()
+        [decode_points(b) for b in as_bin]
+        t4 = time.perf_counter()
+
+        json_bytes = sum(len(b) for b in as_json)
+        bin_bytes = sum(len(b) for b in as_bin)
+        mpts = total_points / 1e6
+
+        self.stdout.write(f"{opts['strokes']} strokes, {total_points} points")
+        self.stdout.write(f"json:   {json_bytes:>10} bytes  {json_bytes / total_points:5.2f} B/pt  "
+                          f"enc {mpts / (t1 - t0):6.2f} Mpt/s  dec {mpts / (t2 - t1):6.2f} Mpt/s")
+        self.stdout.write(f"binary: {bin_bytes:>10} bytes  {bin_bytes / total_points:5.2f} B/pt  "
+                          f"enc {mpts / (t3 - t2):6.2f} Mpt/s  dec {mpts / (t4 - t3):6.2f} Mpt/s")
+        if np is not None:
+            t5 = time.perf_counter()
+            [decode_points_array(b) for b in as_bin]
+            t6 = time.perf_counter()
+            self.stdout.write(f"binary -> numpy:                         dec {mpts / (t6 - t5):6.2f} Mpt/s")
+        self.stdout.write(self.style.SUCCESS(f"size ratio json/binary: {json_bytes / bin_bytes:.1f}x"))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from modules.session.models import Session
+from modules.session.checkpoints import build_checkpoint
+
+
+class Command(BaseCommand):
+    help = "Fold the stroke log of sessions into board checkpoints (run from cron; see checkpoints.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--session", dest="session_id", help="Only checkpoint this session id")
+
+    def handle(self, *args, **opts):
+        qs = Session.objects.filter(stroke_seq__gt=0)
+        if opts.get("session_id"):
+            qs = qs.filter(id=opts["session_id"])
+        else:
+            # only sessions whose log has moved past their latest checkpoint
+            qs = qs.filter(checkpoint_seq__lt=F("stroke_seq"))
+
+        built = 0
+        for session in qs.iterator():
+            cp = build_checkpoint(session)
+            if cp:
+                built += 1
+                self.stdout.write(f"{session.id}: seq {cp.seq}, {cp.stroke_count} strokes")
+        self.stdout.write(self.style.SUCCESS(f"Built {built} checkpoint(s)."))
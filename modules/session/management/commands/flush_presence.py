@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from modules.session.models import Session
+from modules.session.presence import flush_session, pending_sessions
+
+
+class Command(BaseCommand):
+    help = "Write cached presence heartbeats to Participant.last_active (run from cron, e.g. every minute)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--session", dest="session_id", help="Only flush this session id")
+
+    def handle(self, *args, **opts):
+        if opts.get("session_id"):
+            todo = [opts["session_id"]]
+        else:
+            todo = pending_sessions(Session.objects.values_list("id", flat=True).iterator())
+
+        rows = 0
+        for session_id in todo:
+            n = flush_session(session_id)
+            rows += n
+            if n:
+                self.stdout.write(f"{session_id}: {n} participant(s)")
+        self.stdout.write(self.style.SUCCESS(f"Flushed {len(todo)} session(s), {rows} participant row(s)."))
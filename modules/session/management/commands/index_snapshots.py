@@ -0,0 +1,77 @@
+import re
+from datetime import datetime, timezone
+from collections import defaultdict
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from supabase import create_client
+from modules.session.models import Session, SessionSnapshot
+
+# "<session uuid>_<unix time>.png" as written by save_snapshot
+SNAPSHOT_NAME = re.compile(r"^(?P<sid>[0-9a-fA-F]{8}-(?:[0-9a-fA-F]{4}-){3}[0-9a-fA-F]{12})_(?P<ts>\d+)\.png$")
+
+
+class Command(BaseCommand):
+    help = "Index snapshot PNGs already in the Supabase bucket into SessionSnapshot (one pass over the bucket)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prefix", default="", help="Bucket folder to scan (default: bucket root)")
+        parser.add_argument("--page-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        key = settings.SUPABASE_SERVICE_ROLE_KEY or settings.SUPABASE_ANON_KEY
+        storage = create_client(settings.SUPABASE_URL, key).storage.from_(settings.SUPABASE_BUCKET)
+        prefix = opts["prefix"].strip("/")
+
+        found = defaultdict(list)  # session id -> [(ts, path, size, created_at)]
+        offset, listed = 0, 0
+        while True:
+            page = storage.list(prefix, {"limit": opts["page_size"], "offset": offset, "sortBy": {"column": "name", "order": "asc"}}) or []
+            for obj in page:
+                m = SNAPSHOT_NAME.match(obj.get("name") or "")
+                if not m:
+                    continue
+                path = f"{prefix}/{obj['name']}" if prefix else obj["name"]
+                size = (obj.get("metadata") or {}).get("size") or 0
+                found[m.group("sid").lower()].append((int(m.group("ts")), path, size))
+            listed += len(page)
+            if len(page) < opts["page_size"]:
+                break
+            offset += len(page)
+        self.stdout.write(f"Listed {listed} object(s), {sum(map(len, found.values()))} snapshot(s) for {len(found)} session(s).")
+
+        existing = set(Session.objects.filter(id__in=list(found)).values_list("id", flat=True))
+        existing = {str(s) for s in existing}
+        indexed = set(SessionSnapshot.objects.filter(session_id__in=existing).values_list("path", flat=True))
+        versions = dict(
+            SessionSnapshot.objects.filter(session_id__in=existing)
+            .values_list("session_id").annotate(v=Max("version"))
+        )
+        versions = {str(k): v for k, v in versions.items()}
+
+        rows, stamps = [], []
+        for sid, snaps in found.items():
+            if sid not in existing:
+                continue
+            version = versions.get(sid) or 0
+            for ts, path, size in sorted(snaps):
+                if path in indexed:
+                    continue
+                version += 1
+                rows.append(SessionSnapshot(
+                    session_id=sid, version=version, path=path, size=size,
+                    url=storage.get_public_url(path),
+                ))
+                stamps.append(datetime.fromtimestamp(ts, tz=timezone.utc))
+
+        if opts["dry_run"]:
+            self.stdout.write(f"Would index {len(rows)} snapshot(s).")
+            return
+
+        created = SessionSnapshot.objects.bulk_create(rows, batch_size=500)
+        # auto_now_add stamped "now"; use the save time encoded in the file name
+        for snap, created_at in zip(created, stamps):
+            snap.created_at = created_at
+        SessionSnapshot.objects.bulk_update(created, ["created_at"], batch_size=500)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {len(created)} snapshot(s)."))
@@ -0,0 +1,63 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import ProtectedError
+from django.utils import timezone
+from supabase import create_client
+from modules.session.models import Blob
+from modules.session.thumbnails import thumbnail_path
+
+
+class Command(BaseCommand):
+    help = "Delete content-addressed blobs nothing points at any more (refcount 0)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grace-minutes", type=int, default=60,
+                            help="Keep unreferenced blobs younger than this (an upload may be about to point at them)")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        cutoff = timezone.now() - timedelta(minutes=opts["grace_minutes"])
+        orphans = list(Blob.objects.filter(refcount=0, created_at__lt=cutoff))
+        if opts["dry_run"]:
+            self.stdout.write(f"Would delete {len(orphans)} blob(s), {sum(b.size for b in orphans)} bytes.")
+            return
+
+        self.bucket = None
+        removed = freed = 0
+        for blob in orphans:
+            try:
+                with transaction.atomic():
+                    # re-check refcount under the row lock uploads take when reusing a blob
+                    # (blobs.find_blob); PROTECT stops us if a row still points here
+                    if not Blob.objects.select_for_update().filter(pk=blob.pk, refcount=0).exists():
+                        continue
+                    Blob.objects.filter(pk=blob.pk).delete()
+                    # objects go before the lock is released: an upload of the same bytes
+                    # then finds neither row nor file and stores them again
+                    self.remove_objects(blob)
+            except ProtectedError:
+                self.stderr.write(f"{blob.sha256}: still referenced, refcount out of date")
+                continue
+            removed += 1
+            freed += blob.size
+        self.stdout.write(self.style.SUCCESS(f"Deleted {removed} blob(s), {freed} bytes."))
+
+    def remove_objects(self, blob):
+        paths = [blob.path] + [
+            thumbnail_path(blob.path, width, ext)
+            for width, variants in (blob.thumbnails or {}).items() for ext in variants
+        ]
+        try:
+            if blob.location == Blob.BUCKET:
+                if self.bucket is None:
+                    key = settings.SUPABASE_SERVICE_ROLE_KEY or settings.SUPABASE_ANON_KEY
+                    self.bucket = create_client(settings.SUPABASE_URL, key).storage.from_(settings.SUPABASE_BUCKET)
+                self.bucket.remove(paths)
+            else:
+                for path in paths:
+                    default_storage.delete(path)
+        except Exception as exc:
+            self.stderr.write(f"{blob.path}: row deleted but object not removed ({exc})")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from modules.session.models import Participant
+from modules.session.stats import rebuild_participant_stats
+
+
+class Command(BaseCommand):
+    help = "Recount per-participant strokes/uploads/messages from the source tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--session", dest="session_id", help="Only recount participants of this session id")
+
+    def handle(self, *args, **opts):
+        qs = Participant.objects.all()
+        if opts.get("session_id"):
+            qs = qs.filter(session_id=opts["session_id"])
+        updated = rebuild_participant_stats(qs)
+        self.stdout.write(self.style.SUCCESS(f"Recounted {updated} participant(s)."))
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from modules.session.relay import Member, relay_connection
+
+
+class _FakeSocket:
+    """Stands in for the ASGI server side of one WebSocket connection."""
+
+    def __init__(self, latencies):
+        self.inbox = asyncio.Queue()
+        self.latencies = latencies
+        self.received = 0
+
+    async def receive(self):
+        return await self.inbox.get()
+
+    async def send(self, event):
+        if event["type"] != "websocket.send":
+            return
+        self.received += 1
+        msg = json.loads(event["text"])
+        if msg.get("type") == "stroke" and "t0" in msg:
+            self.latencies.append((time.perf_counter() - msg["t0"]) * 1000.0)
+
+
+class Command(BaseCommand):
+    help = "Load-test the whiteboard WebSocket relay in-process (no server or network needed)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=30)
+        parser.add_argument("--drawers", type=int, default=30, help="How many clients send strokes")
+        parser.add_argument("--rate", type=float, default=60.0, help="Stroke messages per second per drawer")
+        parser.add_argument("--seconds", type=float, default=5.0)
+
+    def handle(self, *args, **opts):
+        asyncio.run(self._run(opts))
+
+    async def _run(self, opts):
+        session_id = str(uuid.uuid4())
+        latencies = []
+        sockets = [_FakeSocket(latencies) for _ in range(opts["clients"])]
+        members = [Member(i + 1, f"user{i + 1}", i < opts["drawers"]) for i in range(opts["clients"])]
+
+        conns = [
+            asyncio.create_task(relay_connection(session_id, m, s.receive, s.send))
+            for m, s in zip(members, sockets)
+        ]
+        await asyncio.sleep(0.05)
+
+        interval = 1.0 / opts["rate"]
+        deadline = time.perf_counter() + opts["seconds"]
+        sent = 0
+
+        async def drawer(sock):
+            nonlocal sent
+            while time.perf_counter() < deadline:
+                t0 = time.perf_counter()
+                text = json.dumps({"type": "stroke", "t": "draw", "x": 0.5, "y": 0.5, "t0": t0})
+                await sock.inbox.put({"type": "websocket.receive", "text": text})
+                await sock.inbox.put({"type": "websocket.receive", "text": '{"type":"cursor","x":0.5,"y":0.5}'})
+                sent += 1
+                await asyncio.sleep(interval)
+
+        await asyncio.gather(*(drawer(s) for s in sockets[:opts["drawers"]]))
+        await asyncio.sleep(0.2)
+        for s in sockets:
+            await s.inbox.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.gather(*conns)
+
+        delivered = sum(s.received for s in sockets)
+        self.stdout.write(f"clients={opts['clients']} drawers={opts['drawers']} strokes sent={sent} frames delivered={delivered}")
+        if latencies:
+            latencies.sort()
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            self.stdout.write(self.style.SUCCESS(
+                f"fan-out latency ms: p50={statistics.median(latencies):.2f} p99={p99:.2f} max={latencies[-1]:.2f}"
+            ))
@@ -0,0 +1,62 @@
+import hashlib
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from modules.session.blobs import acquire, register_blob
+from modules.session.models import Blob, SessionSnapshot
+from modules.session.snapshot_queue import get_snapshot_storage
+from modules.session.thumbnails import make_thumbnails
+
+
+class Command(BaseCommand):
+    help = "Backfill snapshot thumbnails (and blobs for snapshots indexed before content addressing)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=0, help="Stop after this many blobs (0 = all)")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        storage = get_snapshot_storage()
+
+        # 1) snapshots from before content addressing (e.g. index_snapshots rows) have no blob
+        legacy = SessionSnapshot.objects.filter(blob__isnull=True).order_by("created_at")
+        linked = 0
+        for snap in list(legacy):
+            if opts["dry_run"]:
+                linked += 1
+                continue
+            try:
+                with storage.open(snap.path) as f:
+                    sha = hashlib.sha256()
+                    for chunk in iter(lambda: f.read(256 * 1024), b""):
+                        sha.update(chunk)
+            except Exception as exc:
+                self.stderr.write(f"{snap.path}: cannot read ({exc})")
+                continue
+            blob = register_blob(storage.location, sha.hexdigest(), snap.size, "image/png", snap.path,
+                                 url=snap.url or storage.public_url(snap.path))
+            with transaction.atomic():
+                if SessionSnapshot.objects.filter(pk=snap.pk, blob__isnull=True).update(blob=blob):
+                    acquire(blob.pk)
+            linked += 1
+
+        # 2) snapshot blobs without previews
+        todo = (
+            Blob.objects.filter(location=storage.location, snapshots__isnull=False, thumbnails={})
+            .distinct().order_by("created_at")
+        )
+        if opts["limit"]:
+            todo = todo[:opts["limit"]]
+        if opts["dry_run"]:
+            self.stdout.write(f"Would link {linked} snapshot(s) to blobs and thumbnail {todo.count()} blob(s).")
+            return
+
+        made = 0
+        for blob in todo:
+            try:
+                with storage.open(blob.path) as f:
+                    make_thumbnails(blob, f, storage)
+            except Exception as exc:
+                self.stderr.write(f"{blob.path}: thumbnails failed ({exc})")
+                continue
+            made += 1
+        self.stdout.write(self.style.SUCCESS(f"Linked {linked} snapshot(s) to blobs, thumbnailed {made} blob(s)."))
@@ -0,0 +1,45 @@
+import os
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+from modules.session.models import SnapshotJob
+from modules.session.snapshot_queue import claim_next_job, process_job
+
+
+class Command(BaseCommand):
+    help = "Upload queued whiteboard snapshots from local staging to storage (runs until stopped)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Exit when no job is due instead of waiting")
+        parser.add_argument("--sleep", type=float, default=1.0, help="Seconds to wait when the queue is empty")
+        parser.add_argument("--retry-failed", action="store_true",
+                            help="Requeue failed jobs whose staged file still exists, then run")
+
+    def handle(self, *args, **opts):
+        if opts["retry_failed"]:
+            failed = [j for j in SnapshotJob.objects.filter(status=SnapshotJob.FAILED) if os.path.exists(j.staging_path)]
+            SnapshotJob.objects.filter(pk__in=[j.pk for j in failed]).update(
+                status=SnapshotJob.QUEUED, attempts=0, next_attempt_at=timezone.now(), finished_at=None,
+            )
+            self.stdout.write(f"Requeued {len(failed)} failed job(s).")
+
+        done = failed = 0
+        try:
+            while True:
+                close_old_connections()
+                job = claim_next_job()
+                if job is None:
+                    if opts["once"]:
+                        break
+                    time.sleep(opts["sleep"])
+                    continue
+                process_job(job)
+                if job.status == SnapshotJob.DONE:
+                    done += 1
+                elif job.status == SnapshotJob.FAILED:
+                    failed += 1
+                self.stdout.write(f"{job.id}: {job.status} (attempt {job.attempts})")
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Uploaded {done} snapshot(s), {failed} failed."))
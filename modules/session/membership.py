@@ -0,0 +1,151 @@
+"""
+Cached answers to "what is this user in this session?".
+
+The chat, whiteboard, upload, stroke and announcement views all need the
+same facts (owner? participant? can draw? chat on?). ``get_membership``
+resolves them once per request and keeps the result for
+SESSION_MEMBERSHIP_TTL seconds: in the shared cache when
+SESSION_MEMBERSHIP_CACHE names a cache alias, otherwise in process memory.
+Process memory is never consulted when a shared cache is set, so an
+invalidation is seen by every worker at once.
+
+Shared entries are keyed per (session, user), so filling one never rewrites
+another's. Each holds the session's stamp at the time it was stored and is
+read together with the current stamp in one ``get_many``; an entry whose
+stamp no longer matches is ignored. ``invalidate_membership`` deletes one
+user's entry, ``invalidate_session`` replaces the stamp.
+
+Entries are dropped when a Participant or Session row is saved or deleted
+(see signals.py); code that changes rows with QuerySet.update() must call
+``invalidate_session`` itself. Without a shared cache other workers only
+notice when their TTL runs out.
+"""
+import threading
+import time
+import uuid
+from collections import namedtuple
+from django.conf import settings
+from django.core.cache import caches
+from .models import Session, Participant
+
+SESSION_MEMBERSHIP_TTL = getattr(settings, "SESSION_MEMBERSHIP_TTL", 10)
+SESSION_MEMBERSHIP_CACHE = getattr(settings, "SESSION_MEMBERSHIP_CACHE", None)
+_LOCAL_MAX_SESSIONS = 5000
+# outlives any entry; if it is evicted early, entries stored under it just miss
+_STAMP_TTL = 24 * 60 * 60
+
+
+class Membership(namedtuple("Membership", "session_id owner_id is_owner is_participant can_draw chat_enabled")):
+    __slots__ = ()
+
+    @property
+    def is_member(self):
+        """Owner or joined participant."""
+        return self.is_owner or self.is_participant
+
+
+# session_id -> (expires_at, {user_id: Membership})
+_local = {}
+_lock = threading.Lock()
+
+
+def _shared():
+    return caches[SESSION_MEMBERSHIP_CACHE] if SESSION_MEMBERSHIP_CACHE else None
+
+
+def _key(session_id, user_id):
+    return f"session:membership:{session_id}:{user_id}"
+
+
+def _stamp_key(session_id):
+    return f"session:membership:{session_id}:stamp"
+
+
+def _load(session_id, user_id):
+    row = Session.objects.filter(pk=session_id).values("created_by_id", "chat_enabled").first()
+    if row is None:
+        return None
+    is_owner = row["created_by_id"] == user_id
+    p = Participant.objects.filter(session_id=session_id, user_id=user_id).values("can_draw").first()
+    return Membership(
+        session_id=str(session_id),
+        owner_id=row["created_by_id"],
+        is_owner=is_owner,
+        is_participant=p is not None,
+        can_draw=is_owner or bool(p and p["can_draw"]),
+        chat_enabled=row["chat_enabled"],
+    )
+
+
+def resolve_membership(user_id, session_id):
+    """Membership of ``user_id`` in ``session_id`` (None if the session doesn't exist)."""
+    sid = str(session_id)
+    shared = _shared()
+    if shared is not None:
+        return _resolve_shared(shared, sid, user_id)
+
+    now = time.monotonic()
+    with _lock:
+        entry = _local.get(sid)
+        if entry and entry[0] > now and user_id in entry[1]:
+            return entry[1][user_id]
+    m = _load(sid, user_id)
+    if m is not None:
+        _remember(sid, user_id, m, now)
+    return m
+
+
+def _resolve_shared(shared, sid, user_id):
+    key, stamp_key = _key(sid, user_id), _stamp_key(sid)
+    found = shared.get_many([key, stamp_key])
+    stamp = found.get(stamp_key)
+    if stamp is not None and key in found and found[key][0] == stamp:
+        return found[key][1]
+    if stamp is None:
+        shared.add(stamp_key, uuid.uuid4().hex, _STAMP_TTL)
+        stamp = shared.get(stamp_key)
+    m = _load(sid, user_id)
+    if m is not None and stamp is not None:
+        shared.set(key, (stamp, m), SESSION_MEMBERSHIP_TTL)
+    return m
+
+
+def _remember(sid, user_id, m, now):
+    with _lock:
+        entry = _local.get(sid)
+        if not entry or entry[0] <= now:
+            if len(_local) >= _LOCAL_MAX_SESSIONS:
+                _local.clear()
+            entry = _local[sid] = (now + SESSION_MEMBERSHIP_TTL, {})
+        entry[1][user_id] = m
+
+
+def get_membership(request, session_id):
+    """Per-request memoized ``resolve_membership`` for ``request.user``."""
+    memo = request.__dict__.setdefault("_session_memberships", {})
+    sid = str(session_id)
+    if sid not in memo:
+        memo[sid] = resolve_membership(request.user.pk, sid)
+    return memo[sid]
+
+
+def invalidate_membership(session_id, user_id):
+    """Forget one user's cached membership in a session."""
+    sid = str(session_id)
+    with _lock:
+        entry = _local.get(sid)
+        if entry:
+            entry[1].pop(user_id, None)
+    shared = _shared()
+    if shared is not None:
+        shared.delete(_key(sid, user_id))
+
+
+def invalidate_session(session_id):
+    """Forget every cached membership for a session."""
+    sid = str(session_id)
+    with _lock:
+        _local.pop(sid, None)
+    shared = _shared()
+    if shared is not None:
+        shared.set(_stamp_key(sid), uuid.uuid4().hex, _STAMP_TTL)
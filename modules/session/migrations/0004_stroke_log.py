@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session', '0003_session_is_archived_alter_session_title'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='is_archived',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='stroke_seq',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='StrokeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveBigIntegerField()),
+                ('stroke_id', models.CharField(max_length=32)),
+                ('tool', models.CharField(choices=[('pen', 'Pen'), ('eraser', 'Eraser'), ('clear', 'Clear board')], default='pen', max_length=8)),
+                ('color', models.CharField(blank=True, default='', max_length=16)),
+                ('width', models.PositiveSmallIntegerField(default=3)),
+                ('points', models.JSONField(blank=True, default=list)),
+                ('is_final', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stroke_events', to=settings.AUTH_USER_MODEL)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stroke_events', to='session.session')),
+            ],
+            options={
+                'ordering': ['seq'],
+                'unique_together': {('session', 'seq')},
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:24
+
+from django.db import migrations, models
+
+
+def encode_existing_points(apps, schema_editor):
+    from modules.session.stroke_codec import encode_points
+
+    StrokeEvent = apps.get_model("session", "StrokeEvent")
+    for ev in StrokeEvent.objects.only("id", "points").iterator(chunk_size=2000):
+        pts = ev.points or []
+        StrokeEvent.objects.filter(pk=ev.pk).update(data=encode_points(pts), point_count=len(pts))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session', '0004_stroke_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='strokeevent',
+            name='data',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.AddField(
+            model_name='strokeevent',
+            name='point_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(encode_existing_points, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='strokeevent',
+            name='points',
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session', '0005_stroke_binary_points'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BoardCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveBigIntegerField()),
+                ('data', models.BinaryField(default=b'')),
+                ('stroke_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='session.session')),
+            ],
+            options={
+                'ordering': ['-seq'],
+                'unique_together': {('session', 'seq')},
+            },
+        ),
+    ]
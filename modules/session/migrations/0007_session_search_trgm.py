@@ -0,0 +1,46 @@
+import logging
+from django.db import migrations, transaction
+
+logger = logging.getLogger(__name__)
+
+# session_list searches with icontains, which Postgres runs as
+# UPPER(col::text) LIKE UPPER('%q%'). A trigram GIN index on the same
+# expression lets that use an index scan instead of a full scan.
+INDEXES = (
+    ("session_session_title_trgm", "title"),
+    ("session_session_code_trgm", "code"),
+)
+
+
+def create_trgm_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for name, column in INDEXES:
+                schema_editor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {name} ON session_session '
+                    f'USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+                )
+    except Exception:
+        # pg_trgm needs extension privileges; search still works without the index
+        logger.warning("pg_trgm unavailable, skipping session search indexes", exc_info=True)
+
+
+def drop_trgm_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _ in INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session', '0006_board_checkpoint'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trgm_indexes, drop_trgm_indexes),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session', '0007_session_search_trgm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('path', models.CharField(max_length=255)),
+                ('url', models.URLField(blank=True, default='', max_length=500)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='session.session')),
+            ],
+            options={
+                'ordering': ['-version'],
+                'indexes': [models.Index(fields=['session', '-created_at'], name='session_snap_latest_idx')],
+                'unique_together': {('session', 'version')},
+            },
+        ),
+    ]
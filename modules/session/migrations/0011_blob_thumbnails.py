@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session', '0010_snapshot_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blob',
+            name='thumbnails',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:49
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Func, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(qs):
+    counted = qs.order_by().annotate(n=Func(F("pk"), function="COUNT")).values("n")
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def backfill_counters(apps, schema_editor):
+    """Recount strokes/uploads/messages per participant (mirrors stats.rebuild_participant_stats)."""
+    Participant = apps.get_model("session", "Participant")
+    StrokeEvent = apps.get_model("session", "StrokeEvent")
+    UploadedFile = apps.get_model("session", "UploadedFile")
+    Message = apps.get_model("chat", "Message")
+    session, user = OuterRef("session_id"), OuterRef("user_id")
+    Participant.objects.update(
+        strokes_count=_count(StrokeEvent.objects.filter(session_id=session, author_id=user, is_final=True).exclude(tool="clear")),
+        uploads_count=_count(UploadedFile.objects.filter(session_id=session, uploaded_by_id=user)),
+        messages_count=_count(Message.objects.filter(room__session_id=session, sender_id=user)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session', '0011_blob_thumbnails'),
+        ('chat', '0002_message_room_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participant',
+            name='messages_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['session', 'user'], name='session_part_sess_user_idx'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 23:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session', '0012_participant_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snapshotjob',
+            name='claim',
+            field=models.UUIDField(blank=True, null=True),
+        ),
+    ]
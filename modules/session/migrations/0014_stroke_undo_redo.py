@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 23:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session', '0013_snapshotjob_claim'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='strokeevent',
+            name='tool',
+            field=models.CharField(choices=[('pen', 'Pen'), ('eraser', 'Eraser'), ('clear', 'Clear board'), ('undo', 'Undo'), ('redo', 'Redo')], default='pen', max_length=8),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:12
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_checkpoint_seq(apps, schema_editor):
+    Session = apps.get_model("session", "Session")
+    BoardCheckpoint = apps.get_model("session", "BoardCheckpoint")
+    newest = (
+        BoardCheckpoint.objects.filter(session_id=OuterRef("pk")).order_by()
+        .values("session_id").annotate(seq=Max("seq")).values("seq")
+    )
+    Session.objects.update(checkpoint_seq=Coalesce(Subquery(newest, output_field=models.PositiveBigIntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('session', '0014_stroke_undo_redo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='checkpoint_seq',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_checkpoint_seq, migrations.RunPython.noop),
+    ]
@@ -21,6 +21,8 @@ class Session(models.Model):
     is_archived = models.BooleanField(default=False)
     is_saved = models.BooleanField(default=False)
     is_offline_available = models.BooleanField(default=False)
+    stroke_seq = models.PositiveBigIntegerField(default=0)  # last seq handed out to StrokeEvent
+    checkpoint_seq = models.PositiveBigIntegerField(default=0)  # seq of the newest BoardCheckpoint
 
     def __str__(self):
         return self.title
@@ -34,10 +36,17 @@ class Participant(models.Model):
     session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name='participants')
     can_draw = models.BooleanField(default=False)
     joined_at = models.DateTimeField(auto_now_add=True)
+    # Activity counters, bumped as strokes/uploads/messages arrive (see stats.py)
     strokes_count = models.PositiveIntegerField(default=0)
     uploads_count = models.PositiveIntegerField(default=0)
+    messages_count = models.PositiveIntegerField(default=0)
     last_active = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["session", "user"], name="session_part_sess_user_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user.username} in {self.session.title}"
 
@@ -65,7 +74,183 @@ class UploadedFile(models.Model):
     session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name="uploads")
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     file = models.FileField(upload_to='uploads/')
+    name = models.CharField(max_length=255, blank=True, default="")  # original file name
+    blob = models.ForeignKey("Blob", on_delete=models.PROTECT, null=True, blank=True, related_name="uploads")
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"File by {self.uploaded_by.username} in {self.session.title}"
\ No newline at end of file
+        return f"File by {self.uploaded_by.username} in {self.session.title}"
+
+# ==========================
+# ✏️ STROKE LOG (append-only)
+# ==========================
+class StrokeEvent(models.Model):
+    """One stroke delta (a run of points) in a session's append-only log.
+
+    ``seq`` is allocated per session from ``Session.stroke_seq`` so readers can
+    resume from the last sequence number they have seen. "undo" and "redo"
+    entries carry no points; they hide or restore the author's stroke with
+    the same ``stroke_id`` (see checkpoints.fold_strokes).
+    """
+    TOOL_CHOICES = [
+        ("pen", "Pen"),
+        ("eraser", "Eraser"),
+        ("clear", "Clear board"),
+        ("undo", "Undo"),
+        ("redo", "Redo"),
+    ]
+    HISTORY_OPS = ("undo", "redo")
+    # log entries that are operations on the board rather than strokes
+    OPS = ("clear",) + HISTORY_OPS
+
+    session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name="stroke_events")
+    seq = models.PositiveBigIntegerField()
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="stroke_events")
+    stroke_id = models.CharField(max_length=32)
+    tool = models.CharField(max_length=8, choices=TOOL_CHOICES, default="pen")
+    color = models.CharField(max_length=16, blank=True, default="")
+    width = models.PositiveSmallIntegerField(default=3)
+    data = models.BinaryField(default=b"")  # point run, see stroke_codec
+    point_count = models.PositiveIntegerField(default=0)
+    is_final = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["seq"]
+        unique_together = ("session", "seq")
+
+    def __str__(self):
+        return f"{self.session_id}#{self.seq} ({self.tool})"
+
+    @property
+    def points(self):
+        from .stroke_codec import decode_points
+        return decode_points(bytes(self.data)) if self.data else []
+
+
+# ==========================
+# 🧊 BOARD CHECKPOINTS
+# ==========================
+class BoardCheckpoint(models.Model):
+    """Compacted vector state of a board up to (and including) stroke ``seq``.
+
+    ``data`` uses the stroke_codec record format with one record per stroke,
+    so a checkpoint and the log tail after it can be concatenated as-is.
+    """
+    session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name="checkpoints")
+    seq = models.PositiveBigIntegerField()
+    data = models.BinaryField(default=b"")
+    stroke_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-seq"]
+        unique_together = ("session", "seq")
+
+    def __str__(self):
+        return f"Checkpoint {self.session_id}@{self.seq}"
+
+
+# ==========================
+# 📸 SNAPSHOT INDEX
+# ==========================
+class SessionSnapshot(models.Model):
+    """One saved PNG of a board in the storage bucket.
+
+    Lets the whiteboard find the latest snapshot with an indexed lookup
+    instead of listing the bucket.
+    """
+    session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name="snapshots")
+    version = models.PositiveIntegerField()
+    path = models.CharField(max_length=255)  # object name inside SUPABASE_BUCKET
+    url = models.URLField(max_length=500, blank=True, default="")
+    size = models.PositiveBigIntegerField(default=0)
+    blob = models.ForeignKey("Blob", on_delete=models.PROTECT, null=True, blank=True, related_name="snapshots")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-version"]
+        unique_together = ("session", "version")
+        indexes = [
+            models.Index(fields=["session", "-created_at"], name="session_snap_latest_idx"),
+        ]
+
+    def __str__(self):
+        return f"Snapshot {self.session_id} v{self.version}"
+
+
+# ==========================
+# 🧱 CONTENT-ADDRESSED BLOBS
+# ==========================
+class Blob(models.Model):
+    """Stored bytes keyed by SHA-256, shared by every row that points at them.
+
+    ``refcount`` counts UploadedFile and SessionSnapshot rows (kept up to date
+    in signals.py); blobs at zero are removed by ``manage.py prune_blobs``.
+    """
+    MEDIA = "media"
+    BUCKET = "bucket"
+    LOCATION_CHOICES = [
+        (MEDIA, "Media storage"),
+        (BUCKET, "Supabase bucket"),
+    ]
+
+    location = models.CharField(max_length=8, choices=LOCATION_CHOICES, default=MEDIA)
+    sha256 = models.CharField(max_length=64)
+    size = models.PositiveBigIntegerField(default=0)
+    content_type = models.CharField(max_length=100, blank=True, default="")
+    path = models.CharField(max_length=255)
+    url = models.URLField(max_length=500, blank=True, default="")  # public URL for bucket blobs
+    # image blobs: {"<width>": {"webp": url, "png": url}}, see thumbnails.py
+    thumbnails = models.JSONField(default=dict, blank=True)
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("location", "sha256")
+
+    def __str__(self):
+        return f"{self.location}:{self.sha256[:12]} (x{self.refcount})"
+
+
+# ==========================
+# 📤 SNAPSHOT UPLOAD QUEUE
+# ==========================
+class SnapshotJob(models.Model):
+    """A saved PNG waiting in local staging to be uploaded by ``manage.py snapshot_worker``."""
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name="snapshot_jobs")
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    staging_path = models.CharField(max_length=500)
+    sha256 = models.CharField(max_length=64)
+    size = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(auto_now_add=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    # lease token of the worker that claimed the job; only that worker may finish it
+    claim = models.UUIDField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+    snapshot = models.ForeignKey(SessionSnapshot, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="session_snapjob_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"SnapshotJob {self.id} ({self.status})"
@@ -0,0 +1,164 @@
+"""
+Last-seen tracking for session participants.
+
+Heartbeats (``touch``) only write to the PRESENCE_CACHE cache: one key per
+(session, user) holding an epoch timestamp, plus a per-session "pending"
+marker. ``Participant.last_active`` is brought up to date by
+``flush_session``: one SELECT of the session's participants, one
+``get_many`` and one bulk UPDATE of the rows that moved. A heartbeat or an
+attendance poll triggers a flush at most once per PRESENCE_FLUSH_SECONDS
+per session (``maybe_flush``); ``manage.py flush_presence`` writes out
+sessions whose heartbeats stopped before their next flush.
+
+The bulk UPDATE skips post_save, so a flush that moved rows sends
+``presence_flushed`` (dashboards listen to it).
+
+``last_seen`` reads live timestamps for attendance views.
+
+PRESENCE_CACHE is off unless set and must name a cache shared by all workers
+(see CACHE_BACKEND in settings); a per-process cache would only see its own
+worker's heartbeats and flush them late or never. Unset, ``touch`` writes
+``last_active`` directly (one UPDATE per heartbeat), ``last_seen`` reads it
+back, and flushing is a no-op.
+"""
+import logging
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import caches
+from django.dispatch import Signal
+from modules.core.versions import bump, session_scope
+from .models import Participant
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_CACHE = getattr(settings, "PRESENCE_CACHE", None)
+PRESENCE_FLUSH_SECONDS = getattr(settings, "PRESENCE_FLUSH_SECONDS", 60)
+# must outlive the gap between flushes, or heartbeats are lost
+PRESENCE_TTL = getattr(settings, "PRESENCE_TTL", 24 * 60 * 60)
+# seen this recently counts as online
+PRESENCE_ONLINE_SECONDS = getattr(settings, "PRESENCE_ONLINE_SECONDS", 90)
+PRESENCE_FLUSH_BATCH = 500
+
+# sent with session_id and user_ids after a flush moved their last_active
+presence_flushed = Signal()
+
+
+def enabled():
+    return PRESENCE_CACHE is not None
+
+
+def _cache():
+    return caches[PRESENCE_CACHE]
+
+
+def _key(session_id, user_id):
+    return f"presence:{session_id}:{user_id}"
+
+
+def _pending_key(session_id):
+    return f"presence:pending:{session_id}"
+
+
+def _gate_key(session_id):
+    return f"presence:flushed:{session_id}"
+
+
+def _as_datetime(ts):
+    return datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+
+
+def _write_through(session_id, user_ids, seen):
+    """No presence cache: the heartbeat goes straight to last_active."""
+    updated = Participant.objects.filter(session_id=session_id, user_id__in=user_ids).update(last_active=seen)
+    if updated:
+        bump(session_scope(session_id, "attendance"))
+        presence_flushed.send(sender=Participant, session_id=session_id, user_ids=list(user_ids))
+
+
+def touch(session_id, user_ids, when=None):
+    """Record a heartbeat for one user id or several in a session."""
+    if isinstance(user_ids, int):
+        user_ids = [user_ids]
+    ts = when.timestamp() if when is not None else time.time()
+    if not enabled():
+        if user_ids:
+            _write_through(session_id, user_ids, _as_datetime(ts))
+        return
+    values = {_key(session_id, uid): ts for uid in user_ids}
+    if not values:
+        return
+    values[_pending_key(session_id)] = ts
+    _cache().set_many(values, PRESENCE_TTL)
+
+
+def last_seen(session_id, user_ids):
+    """{user_id: datetime} of heartbeats not necessarily flushed yet."""
+    user_ids = list(user_ids)
+    if not enabled():
+        rows = Participant.objects.filter(
+            session_id=session_id, user_id__in=user_ids, last_active__isnull=False,
+        ).values_list("user_id", "last_active")
+        return dict(rows)
+    found = _cache().get_many([_key(session_id, uid) for uid in user_ids])
+    return {
+        uid: _as_datetime(found[_key(session_id, uid)])
+        for uid in user_ids if _key(session_id, uid) in found
+    }
+
+
+def is_online(seen, now=None):
+    now = now or datetime.now(dt_timezone.utc)
+    return seen is not None and (now - seen).total_seconds() <= PRESENCE_ONLINE_SECONDS
+
+
+def flush_session(session_id):
+    """Write cached heartbeats of one session to Participant.last_active. Returns rows updated."""
+    if not enabled():
+        return 0
+    cache = _cache()
+    # clear first: a heartbeat arriving mid-flush marks the session pending again
+    cache.delete(_pending_key(session_id))
+    rows = list(Participant.objects.filter(session_id=session_id).values_list("id", "user_id", "last_active"))
+    if not rows:
+        return 0
+    seen = last_seen(session_id, [uid for _, uid, _ in rows])
+    moved = {
+        uid: pid for pid, uid, stored in rows
+        if uid in seen and (stored is None or seen[uid] > stored)
+    }
+    if moved:
+        Participant.objects.bulk_update(
+            [Participant(id=pid, last_active=seen[uid]) for uid, pid in moved.items()],
+            ["last_active"], batch_size=PRESENCE_FLUSH_BATCH,
+        )
+        bump(session_scope(session_id, "attendance"))
+        presence_flushed.send(sender=Participant, session_id=session_id, user_ids=list(moved))
+    return len(moved)
+
+
+def maybe_flush(session_id):
+    """Flush this session if nobody has in the last PRESENCE_FLUSH_SECONDS."""
+    if not enabled():
+        return 0
+    if not _cache().add(_gate_key(session_id), 1, PRESENCE_FLUSH_SECONDS):
+        return 0
+    try:
+        return flush_session(session_id)
+    except Exception:
+        logger.exception("Presence flush failed for session %s", session_id)
+        return 0
+
+
+def pending_sessions(session_ids):
+    """The subset of ``session_ids`` with heartbeats waiting to be flushed."""
+    if not enabled():
+        return []
+    cache = _cache()
+    session_ids = [str(sid) for sid in session_ids]
+    pending = []
+    for i in range(0, len(session_ids), PRESENCE_FLUSH_BATCH):
+        chunk = session_ids[i:i + PRESENCE_FLUSH_BATCH]
+        found = cache.get_many([_pending_key(sid) for sid in chunk])
+        pending.extend(sid for sid in chunk if _pending_key(sid) in found)
+    return pending
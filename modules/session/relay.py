@@ -0,0 +1,449 @@
+"""
+Self-hosted WebSocket relay for whiteboard strokes, cursors and presence.
+
+Route: ws(s)://<host>/ws/session/<session uuid>/  (wired up in asgi.py)
+
+Client -> server frames (JSON text):
+    {"type": "stroke", ...}               relayed to everyone else; needs can_draw
+    {"type": "broadcast", "event", "payload"}
+                                          a whiteboard channel event (BROADCAST_EVENTS)
+    {"type": "cursor", "x": .., "y": ..}  clamped to 0..1, coalesced into one
+                                          "cursors" frame per tick
+    {"type": "ping"}                      answered with {"type": "pong"}
+
+Server -> client frames:
+    {"type": "hello", "uid", "can_draw", "present": [{"uid", "username"}, ...]}
+    {"type": "stroke", "uid", ...}
+    {"type": "broadcast", "uid", "event", "payload"}
+    {"type": "cursors", "cursors": {"<uid>": [x, y], ...}}
+    {"type": "presence", "event": "join" | "leave", "uid", "username"}
+    {"type": "perm", "uid", "can"}
+    {"type": "error", "error": "<code>"}
+
+The browser side is static/session/js/relay_channel.js, used instead of the
+Supabase channel when WHITEBOARD_RELAY is on.
+
+Fan-out goes through a broker (WHITEBOARD_BROKER). The default LocalBroker
+keeps everything in-process, which is enough for a single ASGI worker and
+for the offline load test (manage.py relay_loadtest). It only reaches
+sockets of the process that publishes, so with several workers
+``publish_permission`` and ``publish_revoke`` may miss a socket; the relay
+therefore re-reads a participant's row at most every WHITEBOARD_RELAY_RECHECK
+seconds while they draw, and closes the socket once they were removed.
+"""
+import asyncio
+import json
+import logging
+import math
+import re
+from collections import defaultdict
+from importlib import import_module
+from types import SimpleNamespace
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http.request import split_domain_port, validate_host
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+CURSOR_TICK = getattr(settings, "WHITEBOARD_CURSOR_TICK", 0.05)  # seconds
+QUEUE_MAX = getattr(settings, "WHITEBOARD_RELAY_QUEUE_MAX", 2000)
+FRAME_MAX = getattr(settings, "WHITEBOARD_RELAY_FRAME_MAX", 64 * 1024)
+# Browsers use the relay instead of the Supabase channel (needs asgi.py, like SSE_ENABLED)
+RELAY_ENABLED = getattr(settings, "WHITEBOARD_RELAY", False)
+# seconds between re-reads of a drawing participant's row (see module docstring)
+MEMBER_RECHECK = getattr(settings, "WHITEBOARD_RELAY_RECHECK", 30)
+
+# channel events clients may broadcast, and who may send them
+BROADCAST_EVENTS = {
+    "stroke": "draw", "history": "draw", "image": "draw", "anno": "draw",
+    "meta": "owner", "perm": "owner",
+}
+
+ROUTE = re.compile(r"^/ws/session/(?P<session_id>[0-9a-fA-F-]{36})/$")
+
+# Close codes
+CLOSE_FORBIDDEN = 4403
+CLOSE_NOT_FOUND = 4404
+CLOSE_TRY_AGAIN = 1013
+
+
+# ==========================
+# 📮 BROKER
+# ==========================
+class Envelope:
+    """A published message, JSON-encoded once no matter how many receivers."""
+    __slots__ = ("kind", "uid", "payload", "text")
+
+    def __init__(self, payload):
+        self.kind = payload.get("type")
+        self.uid = payload.get("uid")
+        self.payload = payload
+        self.text = json.dumps(payload, separators=(",", ":"))
+
+
+class Subscription:
+    __slots__ = ("queue", "overflowed")
+
+    def __init__(self, maxsize):
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+
+class LocalBroker:
+    """In-process fan-out for one event loop (one ASGI worker)."""
+
+    def __init__(self):
+        self._subs = defaultdict(set)
+        self._loop = None
+
+    def subscribe(self, channel):
+        self._loop = asyncio.get_running_loop()
+        sub = Subscription(QUEUE_MAX)
+        self._subs[channel].add(sub)
+        return sub
+
+    def unsubscribe(self, channel, sub):
+        subs = self._subs.get(channel)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._subs[channel]
+
+    def _deliver(self, channel, message):
+        for sub in tuple(self._subs.get(channel, ())):
+            try:
+                sub.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # slow consumer: its pump closes the socket, client reloads the board
+                sub.overflowed = True
+
+    async def publish(self, channel, message):
+        self._deliver(channel, message)
+
+    def publish_threadsafe(self, channel, message):
+        """Publish from sync code (e.g. a Django view running in a worker thread)."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._deliver, channel, message)
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        path = getattr(settings, "WHITEBOARD_BROKER", "modules.session.relay.LocalBroker")
+        _broker = import_string(path)()
+    return _broker
+
+
+def relay_available(request):
+    """True when whiteboard pages should connect to the relay (enabled, and served over ASGI)."""
+    return bool(RELAY_ENABLED) and isinstance(request, ASGIRequest)
+
+
+def channel_for(session_id):
+    return f"whiteboard.{session_id}"
+
+
+def _publish_threadsafe(session_id, payload):
+    try:
+        get_broker().publish_threadsafe(channel_for(session_id), Envelope(payload))
+    except Exception:
+        logger.exception("Failed to publish %s for session %s", payload.get("type"), session_id)
+
+
+def publish_permission(session_id, user_id, can_draw):
+    """Tell connected clients (and the relay) that a participant's can_draw changed."""
+    _publish_threadsafe(session_id, {"type": "perm", "uid": int(user_id), "can": bool(can_draw)})
+
+
+def publish_revoke(session_id, user_id):
+    """Close a removed participant's sockets (sent when their Participant row is deleted)."""
+    _publish_threadsafe(session_id, {"type": "revoke", "uid": int(user_id)})
+
+
+# ==========================
+# 🧍 MEMBERS & ROOMS
+# ==========================
+class Member:
+    __slots__ = ("uid", "username", "can_draw", "owner")
+
+    def __init__(self, uid, username, can_draw, owner=False):
+        self.uid = uid
+        self.username = username
+        self.can_draw = can_draw
+        self.owner = owner  # session owner or staff: never rechecked
+
+    def may_send(self, event):
+        need = BROADCAST_EVENTS.get(event)
+        if need == "owner":
+            return self.owner
+        return need == "draw" and self.can_draw
+
+
+class Room:
+    """Per-process state for one session: who is here and pending cursor moves."""
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.channel = channel_for(session_id)
+        self.members = {}        # uid -> [Member, open connection count]
+        self.cursors = {}        # uid -> [x, y], flushed every CURSOR_TICK
+        self.ticker = None
+
+    def join(self, member):
+        entry = self.members.get(member.uid)
+        if entry:
+            entry[1] += 1
+            return False
+        self.members[member.uid] = [member, 1]
+        if self.ticker is None:
+            self.ticker = asyncio.create_task(self._tick())
+        return True
+
+    def leave(self, member):
+        """Returns True when this was the member's last connection."""
+        entry = self.members.get(member.uid)
+        if not entry:
+            return False
+        entry[1] -= 1
+        if entry[1] > 0:
+            return False
+        del self.members[member.uid]
+        self.cursors.pop(member.uid, None)
+        return True
+
+    @property
+    def empty(self):
+        return not self.members
+
+    def present(self):
+        return [{"uid": m.uid, "username": m.username} for m, _ in self.members.values()]
+
+    async def _tick(self):
+        broker = get_broker()
+        try:
+            while self.members:
+                await asyncio.sleep(CURSOR_TICK)
+                if self.cursors:
+                    batch, self.cursors = self.cursors, {}
+                    await broker.publish(self.channel, Envelope({"type": "cursors", "cursors": batch}))
+        finally:
+            self.ticker = None
+
+
+_rooms = {}
+
+
+def _room(session_id):
+    room = _rooms.get(session_id)
+    if room is None:
+        room = _rooms[session_id] = Room(session_id)
+    return room
+
+
+def _release_room(room):
+    if room.empty:
+        if room.ticker is not None:
+            room.ticker.cancel()
+        _rooms.pop(room.session_id, None)
+
+
+# ==========================
+# 🔐 AUTH
+# ==========================
+def _cookies(scope):
+    for name, value in scope.get("headers") or []:
+        if name == b"cookie":
+            out = {}
+            for part in value.decode("latin-1").split(";"):
+                k, _, v = part.strip().partition("=")
+                if k:
+                    out[k] = v
+            return out
+    return {}
+
+
+def _origin_allowed(scope):
+    for name, value in scope.get("headers") or []:
+        if name == b"origin":
+            origin = value.decode("latin-1")
+            host, _ = split_domain_port(origin.split("://", 1)[-1])
+            return settings.DEBUG or validate_host(host, settings.ALLOWED_HOSTS)
+    return True  # non-browser clients don't send Origin
+
+
+def _resolve_member(session_key, session_id):
+    from django.contrib.auth import get_user
+    from .models import Session, Participant
+
+    store = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    user = get_user(SimpleNamespace(session=store))
+    if not user.is_authenticated:
+        return None
+
+    session = Session.objects.filter(id=session_id).only("id", "created_by_id").first()
+    if session is None:
+        return None
+    if user.id == session.created_by_id or user.is_staff:
+        return Member(user.id, user.username, True, owner=True)
+
+    p = Participant.objects.filter(session=session, user=user).only("can_draw").first()
+    if p is None:
+        return None
+    return Member(user.id, user.username, p.can_draw)
+
+
+def _participant_can_draw(session_id, user_id):
+    """can_draw of the participant's row, or None once it was deleted."""
+    from .models import Participant
+    return Participant.objects.filter(session_id=session_id, user_id=user_id).values_list("can_draw", flat=True).first()
+
+
+def _coordinate(value):
+    """A cursor coordinate clamped to the canvas (0..1) like stroke points; None if not a finite number."""
+    try:
+        v = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(v):
+        return None
+    return min(max(v, 0.0), 1.0)
+
+
+# ==========================
+# 🔌 CONNECTIONS
+# ==========================
+async def websocket_application(scope, receive, send):
+    """ASGI entry point for ``scope["type"] == "websocket"``."""
+    event = await receive()
+    if event["type"] != "websocket.connect":
+        return
+
+    m = ROUTE.match(scope.get("path", ""))
+    if not m:
+        await send({"type": "websocket.close", "code": CLOSE_NOT_FOUND})
+        return
+    if not _origin_allowed(scope):
+        await send({"type": "websocket.close", "code": CLOSE_FORBIDDEN})
+        return
+
+    session_id = m.group("session_id").lower()
+    session_key = _cookies(scope).get(settings.SESSION_COOKIE_NAME)
+    member = None
+    if session_key:
+        member = await sync_to_async(_resolve_member)(session_key, session_id)
+    if member is None:
+        await send({"type": "websocket.close", "code": CLOSE_FORBIDDEN})
+        return
+
+    await send({"type": "websocket.accept"})
+    await relay_connection(session_id, member, receive, send)
+
+
+async def relay_connection(session_id, member, receive, send):
+    """Run one accepted connection until the client disconnects."""
+    broker = get_broker()
+    room = _room(session_id)
+    sub = broker.subscribe(room.channel)
+    send_lock = asyncio.Lock()
+
+    async def send_json(payload):
+        async with send_lock:
+            await send({"type": "websocket.send", "text": json.dumps(payload)})
+
+    first = room.join(member)
+    await send_json({"type": "hello", "uid": member.uid, "can_draw": member.can_draw, "present": room.present()})
+    if first:
+        await broker.publish(room.channel, Envelope(
+            {"type": "presence", "event": "join", "uid": member.uid, "username": member.username}
+        ))
+
+    pump = asyncio.create_task(_pump(sub, member, send, send_lock))
+    loop = asyncio.get_running_loop()
+    checked = loop.time()
+    try:
+        while True:
+            event = await receive()
+            if event["type"] == "websocket.disconnect":
+                break
+            if event["type"] != "websocket.receive":
+                continue
+            raw = event.get("text")
+            if raw is None:
+                raw = (event.get("bytes") or b"").decode("utf-8", "replace")
+            if len(raw) > FRAME_MAX:
+                await send_json({"type": "error", "error": "frame_too_large"})
+                continue
+            try:
+                msg = json.loads(raw)
+            except json.JSONDecodeError:
+                await send_json({"type": "error", "error": "bad_json"})
+                continue
+            if not isinstance(msg, dict):
+                continue
+
+            kind = msg.get("type")
+            if kind in ("stroke", "broadcast") and not member.owner and loop.time() - checked >= MEMBER_RECHECK:
+                checked = loop.time()
+                can_draw = await sync_to_async(_participant_can_draw)(session_id, member.uid)
+                if can_draw is None:
+                    async with send_lock:
+                        await send({"type": "websocket.close", "code": CLOSE_FORBIDDEN})
+                    break
+                member.can_draw = can_draw
+            if kind == "stroke":
+                if not member.can_draw:
+                    await send_json({"type": "error", "error": "permission_denied"})
+                    continue
+                msg["uid"] = member.uid
+                await broker.publish(room.channel, Envelope(msg))
+            elif kind == "broadcast":
+                event = msg.get("event")
+                if not member.may_send(event):
+                    await send_json({"type": "error", "error": "permission_denied"})
+                    continue
+                await broker.publish(room.channel, Envelope(
+                    {"type": "broadcast", "uid": member.uid, "event": event, "payload": msg.get("payload")}
+                ))
+            elif kind == "cursor":
+                x, y = _coordinate(msg.get("x")), _coordinate(msg.get("y"))
+                if x is not None and y is not None:
+                    room.cursors[member.uid] = [x, y]
+            elif kind == "ping":
+                await send_json({"type": "pong"})
+    finally:
+        pump.cancel()
+        broker.unsubscribe(room.channel, sub)
+        if room.leave(member):
+            await broker.publish(room.channel, Envelope(
+                {"type": "presence", "event": "leave", "uid": member.uid, "username": member.username}
+            ))
+        _release_room(room)
+
+
+async def _pump(sub, member, send, send_lock):
+    """Forward broker messages to one socket."""
+    while True:
+        env = await sub.queue.get()
+        if sub.overflowed:
+            async with send_lock:
+                await send({"type": "websocket.close", "code": CLOSE_TRY_AGAIN})
+            return
+        if env.kind == "perm" and env.uid == member.uid:
+            member.can_draw = env.payload.get("can", False)
+        elif env.kind == "revoke":
+            if env.uid == member.uid and not member.owner:
+                async with send_lock:
+                    await send({"type": "websocket.close", "code": CLOSE_FORBIDDEN})
+                return
+            continue
+        elif env.kind in ("stroke", "broadcast") and env.uid == member.uid:
+            continue  # already drawn locally
+        async with send_lock:
+            await send({"type": "websocket.send", "text": env.text})
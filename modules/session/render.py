@@ -0,0 +1,182 @@
+"""
+Server-side rendering of a board's vector strokes to PNG (Pillow).
+
+The board is rebuilt from the latest checkpoint plus the log tail, drawn on
+a white RENDER_ASPECT canvas ``width`` pixels wide and, optionally, cut into
+RENDER_TILE_SIZE tiles. Whole-board renders are limited to
+RENDER_FULL_MAX_WIDTH; wider boards must be fetched tile by tile, and are
+drawn without supersampling, so one request never allocates more than a
+few tens of MB. Stroke widths were recorded in the author's canvas
+pixels and are scaled from RENDER_REFERENCE_WIDTH.
+
+Results are cached in default storage under
+``renders/<session>/<seq>-<width>[-<col>-<row>].png``: a render is reused
+until the stroke log moves past ``seq``.
+"""
+import io
+import logging
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from .checkpoints import board_state, fold_strokes
+from .models import Session
+from .stroke_codec import decode_stroke_log, encode_stroke_log
+
+try:
+    from PIL import Image, ImageColor, ImageDraw
+except ImportError:  # Pillow is in requirements.txt, but keep imports working without it
+    Image = ImageColor = ImageDraw = None
+
+logger = logging.getLogger(__name__)
+
+RENDER_ASPECT = getattr(settings, "RENDER_ASPECT", 9 / 16)  # height / width
+RENDER_REFERENCE_WIDTH = getattr(settings, "RENDER_REFERENCE_WIDTH", 1280)
+RENDER_DEFAULT_WIDTH = getattr(settings, "RENDER_DEFAULT_WIDTH", 1600)
+RENDER_MIN_WIDTH = 64
+RENDER_MAX_WIDTH = getattr(settings, "RENDER_MAX_WIDTH", 8192)
+RENDER_TILE_SIZE = getattr(settings, "RENDER_TILE_SIZE", 512)
+# Wider renders need ?tile= and are not supersampled
+RENDER_FULL_MAX_WIDTH = getattr(settings, "RENDER_FULL_MAX_WIDTH", 2048)
+# Draw at this multiple and downsample, since Pillow lines are not antialiased
+RENDER_SUPERSAMPLE = getattr(settings, "RENDER_SUPERSAMPLE", 2)
+RENDER_PREFIX = "renders"
+
+
+class RenderError(ValueError):
+    pass
+
+
+def clamp_width(width):
+    """Snap a requested width to a multiple of 64 within the allowed range (bounds the cache)."""
+    try:
+        width = int(width)
+    except (TypeError, ValueError):
+        return RENDER_DEFAULT_WIDTH
+    width = max(RENDER_MIN_WIDTH, min(RENDER_MAX_WIDTH, width))
+    return max(RENDER_MIN_WIDTH, width // 64 * 64)
+
+
+def board_size(width):
+    return width, max(1, round(width * RENDER_ASPECT))
+
+
+def tile_grid(width):
+    """(columns, rows) of RENDER_TILE_SIZE tiles covering a board ``width`` wide."""
+    w, h = board_size(width)
+    return -(-w // RENDER_TILE_SIZE), -(-h // RENDER_TILE_SIZE)
+
+
+def board_strokes(session):
+    """(last seq, compacted stroke dicts) for a Session or session id."""
+    cp, tail = board_state(session)
+    records = list(decode_stroke_log(bytes(cp.data))) if cp else []
+    seq = tail[-1].seq if tail else (cp.seq if cp else 0)
+    if tail:
+        records = fold_strokes(records, decode_stroke_log(encode_stroke_log(tail)))
+    return seq, records
+
+
+def _rgb(color):
+    try:
+        return ImageColor.getrgb(color or "#000000")[:3]
+    except ValueError:
+        return (0, 0, 0)
+
+
+def render_area(width, tile=None):
+    """(left, top, width, height) in board pixels of a render, or RenderError."""
+    bw, bh = board_size(width)
+    if tile is None:
+        if width > RENDER_FULL_MAX_WIDTH:
+            raise RenderError("tile_required")
+        return 0, 0, bw, bh
+    col, row = tile
+    cols, rows = tile_grid(width)
+    if not (0 <= col < cols and 0 <= row < rows):
+        raise RenderError("tile_out_of_range")
+    ox, oy = col * RENDER_TILE_SIZE, row * RENDER_TILE_SIZE
+    return ox, oy, min(RENDER_TILE_SIZE, bw - ox), min(RENDER_TILE_SIZE, bh - oy)
+
+
+def render_strokes(strokes, width, tile=None):
+    """
+    Draw strokes onto a new RGB image. ``tile`` is (col, row) to draw just
+    that RENDER_TILE_SIZE square of the ``width``-wide board.
+    """
+    if Image is None:
+        raise RuntimeError("Pillow is required to render boards")
+    bw, bh = board_size(width)
+    ox, oy, w, h = render_area(width, tile)
+
+    ss = max(1, int(RENDER_SUPERSAMPLE)) if width <= RENDER_FULL_MAX_WIDTH else 1
+    img = Image.new("RGB", (w * ss, h * ss), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    sx, sy = bw * ss, bh * ss
+    width_scale = bw * ss / RENDER_REFERENCE_WIDTH
+    left, top = ox * ss, oy * ss
+    right, bottom = left + w * ss, top + h * ss
+
+    for stroke in strokes:
+        pts = stroke.get("points") or []
+        if not pts or stroke.get("tool") == "clear" or stroke.get("undone"):
+            continue
+        lw = max(1, round((stroke.get("width") or 1) * width_scale))
+        r = lw / 2
+        xy = [(x * sx - left, y * sy - top) for x, y in pts]
+        xs = [p[0] for p in xy]
+        ys = [p[1] for p in xy]
+        # skip strokes entirely outside this image/tile
+        if max(xs) + r < 0 or min(xs) - r > right - left or max(ys) + r < 0 or min(ys) - r > bottom - top:
+            continue
+        fill = (255, 255, 255) if stroke.get("tool") == "eraser" else _rgb(stroke.get("color"))
+        if len(xy) > 1:
+            draw.line(xy, fill=fill, width=lw, joint="curve")
+        # round caps (and single-point dots)
+        for px, py in (xy[0], xy[-1]):
+            draw.ellipse((px - r, py - r, px + r, py + r), fill=fill)
+
+    if ss > 1:
+        img = img.resize((w, h), Image.LANCZOS)
+    return img
+
+
+def render_path(session_id, seq, width, tile=None):
+    suffix = f"-{tile[0]}-{tile[1]}" if tile is not None else ""
+    return f"{RENDER_PREFIX}/{session_id}/{seq}-{width}{suffix}.png"
+
+
+def render_png(session, width=RENDER_DEFAULT_WIDTH, tile=None):
+    """
+    Storage path of a PNG of the board at its current seq, rendering it on a
+    cache miss. ``session`` may be a Session or its id. Returns (path, seq).
+    """
+    session_id = getattr(session, "pk", session)
+    width = clamp_width(width)
+    render_area(width, tile)  # reject before touching storage or the stroke log
+    seq = Session.objects.filter(pk=session_id).values_list("stroke_seq", flat=True).first() or 0
+    path = render_path(session_id, seq, width, tile)
+    if default_storage.exists(path):
+        return path, seq
+
+    seq, strokes = board_strokes(session_id)
+    path = render_path(session_id, seq, width, tile)
+    img = render_strokes(strokes, width, tile)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", optimize=True)
+    if not default_storage.exists(path):
+        path = default_storage.save(path, ContentFile(buf.getvalue()))
+    _prune_renders(session_id, seq)
+    return path, seq
+
+
+def _prune_renders(session_id, seq):
+    """Best-effort removal of renders for older seqs of the same board."""
+    folder = f"{RENDER_PREFIX}/{session_id}"
+    try:
+        _, files = default_storage.listdir(folder)
+        for name in files:
+            head = name.split("-", 1)[0]
+            if head.isdigit() and int(head) < seq:
+                default_storage.delete(f"{folder}/{name}")
+    except Exception:
+        logger.debug("Could not prune old renders for %s", session_id, exc_info=True)
@@ -0,0 +1,64 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Session, Participant, UploadedFile, SessionSnapshot
+from .membership import invalidate_membership, invalidate_session
+from modules.core.versions import bump, session_scope
+from .blobs import acquire, release
+from .relay import publish_revoke
+from .stats import bump_messages, bump_uploads
+
+
+@receiver([post_save, post_delete], sender=Participant)
+def participant_changed(sender, instance, **kwargs):
+    invalidate_membership(instance.session_id, instance.user_id)
+    bump(session_scope(instance.session_id, "attendance"))
+
+
+@receiver(post_delete, sender=Participant)
+def participant_removed(sender, instance, **kwargs):
+    session_id, user_id = instance.session_id, instance.user_id
+    transaction.on_commit(lambda: publish_revoke(session_id, user_id))
+
+
+@receiver([post_save, post_delete], sender=Session)
+def session_changed(sender, instance, **kwargs):
+    invalidate_session(instance.pk)
+
+
+@receiver(post_save, sender=UploadedFile)
+@receiver(post_save, sender=SessionSnapshot)
+def blob_pointer_created(sender, instance, created, **kwargs):
+    if created and instance.blob_id:
+        acquire(instance.blob_id)
+
+
+@receiver(post_delete, sender=UploadedFile)
+@receiver(post_delete, sender=SessionSnapshot)
+def blob_pointer_deleted(sender, instance, **kwargs):
+    if instance.blob_id:
+        release(instance.blob_id)
+
+
+@receiver(post_save, sender=UploadedFile)
+def upload_counted(sender, instance, created, **kwargs):
+    if created and instance.uploaded_by_id:
+        bump_uploads(instance.session_id, instance.uploaded_by_id)
+
+
+@receiver(post_delete, sender=UploadedFile)
+def upload_uncounted(sender, instance, **kwargs):
+    if instance.uploaded_by_id:
+        bump_uploads(instance.session_id, instance.uploaded_by_id, -1)
+
+
+# chat depends on session, so refer to its model lazily instead of importing it
+@receiver(post_save, sender="chat.Message")
+def message_counted(sender, instance, created, **kwargs):
+    if created:
+        bump_messages(instance.room_id, instance.sender_id)
+
+
+@receiver(post_delete, sender="chat.Message")
+def message_uncounted(sender, instance, **kwargs):
+    bump_messages(instance.room_id, instance.sender_id, -1)
@@ -0,0 +1,266 @@
+"""
+Durable queue for snapshot uploads.
+
+``save_snapshot`` copies the PNG into SNAPSHOT_STAGING_DIR and adds a
+SnapshotJob. By default the job is processed right away in the request.
+With SNAPSHOT_ASYNC on, the view answers 202 and ``manage.py
+snapshot_worker`` uploads staged files through the SNAPSHOT_STORAGE
+backend, retrying with exponential backoff; the worker must run on a host
+that shares SNAPSHOT_STAGING_DIR with the web processes. Either way the
+result is recorded as the session's newest SessionSnapshot.
+
+Claiming a job stamps it with a lease token, and only the holder of the
+current token can finish or reschedule it: a worker whose lease expired
+and was reclaimed by another cannot record the snapshot a second time.
+
+Bytes that are already stored (same SHA-256) finish at enqueue time without
+touching the storage backend.
+
+Thumbnails are built by the worker, never in the saving request; with
+SNAPSHOT_ASYNC off, ``manage.py snapshot_thumbnails`` (cron) makes them.
+"""
+import io
+import logging
+import os
+import random
+import shutil
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .blobs import blob_path, find_blob, register_blob
+from .models import Blob, Session, SnapshotJob
+from .snapshots import record_snapshot
+from .thumbnails import make_thumbnails
+from .uploads import UPLOAD_CHUNK_SIZE, HashingReader, check_upload_size
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_STAGING_DIR = getattr(settings, "SNAPSHOT_STAGING_DIR", os.path.join(settings.BASE_DIR, "var", "snapshot_staging"))
+SNAPSHOT_STORAGE = getattr(settings, "SNAPSHOT_STORAGE", "modules.session.snapshot_queue.SupabaseSnapshotStorage")
+# On: uploads wait for `manage.py snapshot_worker` (needs shared staging storage)
+SNAPSHOT_ASYNC = getattr(settings, "SNAPSHOT_ASYNC", False)
+SNAPSHOT_JOB_MAX_ATTEMPTS = getattr(settings, "SNAPSHOT_JOB_MAX_ATTEMPTS", 6)
+SNAPSHOT_JOB_BACKOFF = getattr(settings, "SNAPSHOT_JOB_BACKOFF", 5)  # seconds, doubled per attempt
+SNAPSHOT_JOB_BACKOFF_MAX = getattr(settings, "SNAPSHOT_JOB_BACKOFF_MAX", 600)
+# A job left "running" longer than this (worker died) is picked up again
+SNAPSHOT_JOB_LEASE = getattr(settings, "SNAPSHOT_JOB_LEASE", 300)
+
+
+# ==========================
+# 🗄️ STORAGE BACKENDS
+# ==========================
+class SupabaseSnapshotStorage:
+    location = Blob.BUCKET
+
+    def __init__(self):
+        from supabase import create_client
+        key = settings.SUPABASE_SERVICE_ROLE_KEY or settings.SUPABASE_ANON_KEY
+        self.bucket = create_client(settings.SUPABASE_URL, key).storage.from_(settings.SUPABASE_BUCKET)
+
+    def upload(self, path, fileobj, content_type):
+        # content-addressed path: overwriting a concurrent upload writes the same bytes
+        self.bucket.upload(path, fileobj, {"content-type": content_type, "upsert": "true"})
+
+    def public_url(self, path):
+        return self.bucket.get_public_url(path)
+
+    def open(self, path):
+        return io.BytesIO(self.bucket.download(path))
+
+    def stream(self, path, chunk_size=UPLOAD_CHUNK_SIZE):
+        """Yield the object in chunks straight from the public URL (not buffered)."""
+        import httpx
+        with httpx.stream("GET", self.public_url(path), timeout=30, follow_redirects=True) as resp:
+            resp.raise_for_status()
+            yield from resp.iter_bytes(chunk_size)
+
+
+class LocalSnapshotStorage:
+    """Stand-in that keeps snapshots in MEDIA storage (development and tests)."""
+    location = Blob.MEDIA
+
+    def upload(self, path, fileobj, content_type):
+        if not default_storage.exists(path):
+            default_storage.save(path, ContentFile(fileobj) if isinstance(fileobj, bytes) else File(fileobj))
+
+    def public_url(self, path):
+        return default_storage.url(path)
+
+    def open(self, path):
+        return default_storage.open(path, "rb")
+
+    def stream(self, path, chunk_size=UPLOAD_CHUNK_SIZE):
+        with default_storage.open(path, "rb") as f:
+            yield from iter(lambda: f.read(chunk_size), b"")
+
+
+_storage = None
+
+
+def get_snapshot_storage():
+    global _storage
+    if _storage is None:
+        _storage = import_string(SNAPSHOT_STORAGE)()
+    return _storage
+
+
+# ==========================
+# 📥 ENQUEUE
+# ==========================
+def enqueue_snapshot(session, user, fileobj, max_bytes):
+    """
+    Stage an uploaded PNG and queue its upload. Returns the SnapshotJob, which
+    is already DONE when the same bytes were stored before (or when
+    SNAPSHOT_ASYNC is off).
+    """
+    check_upload_size(fileobj, max_bytes)
+    os.makedirs(SNAPSHOT_STAGING_DIR, exist_ok=True)
+    job = SnapshotJob(session=session, requested_by=user)
+    job.staging_path = os.path.join(SNAPSHOT_STAGING_DIR, f"{job.id}.png")
+
+    reader = HashingReader(fileobj, max_bytes)
+    reader.seek(0)
+    try:
+        with open(job.staging_path, "wb") as out:
+            shutil.copyfileobj(io.BufferedReader(reader, UPLOAD_CHUNK_SIZE), out, UPLOAD_CHUNK_SIZE)
+    except Exception:
+        _discard(job.staging_path)
+        raise
+    job.sha256, job.size = reader.hexdigest(), reader.size
+
+    blob = Blob.objects.filter(location=get_snapshot_storage().location, sha256=job.sha256).first()
+    if blob is not None:
+        job.attempts = 1
+        try:
+            _finish(job, blob)
+            return job
+        except Blob.DoesNotExist:
+            job.attempts = 0  # pruned meanwhile: upload it as new bytes
+
+    job.save()
+    if not SNAPSHOT_ASYNC and _claim(job.pk, timezone.now()):
+        job.refresh_from_db()
+        process_job(job, retry=False, thumbnails=False)  # no worker to retry it later
+    return job
+
+
+# ==========================
+# ⚙️ WORKER
+# ==========================
+def _claim(pk, now):
+    return SnapshotJob.objects.filter(pk=pk, status=SnapshotJob.QUEUED).update(
+        status=SnapshotJob.RUNNING, locked_at=now, claim=uuid.uuid4(), attempts=F("attempts") + 1,
+    )
+
+
+def claim_next_job():
+    """Mark the next due job as running and return it (None when idle)."""
+    now = timezone.now()
+    SnapshotJob.objects.filter(
+        status=SnapshotJob.RUNNING, locked_at__lt=now - timedelta(seconds=SNAPSHOT_JOB_LEASE),
+    ).update(status=SnapshotJob.QUEUED, claim=None)
+
+    due = (
+        SnapshotJob.objects.filter(status=SnapshotJob.QUEUED, next_attempt_at__lte=now)
+        .order_by("next_attempt_at")
+        .values_list("pk", flat=True)[:10]
+    )
+    for pk in due:
+        # conditional update: only one worker wins each job
+        if _claim(pk, now):
+            return SnapshotJob.objects.get(pk=pk)
+    return None
+
+
+def process_job(job, retry=True, thumbnails=True):
+    """
+    Upload a claimed job's staged file (unless its bytes are already stored).
+    Without ``retry`` a failed upload fails the job instead of rescheduling it;
+    without ``thumbnails`` the previews are left to snapshot_thumbnails.
+    """
+    storage = get_snapshot_storage()
+    try:
+        blob = Blob.objects.filter(location=storage.location, sha256=job.sha256).first()
+        if blob is None:
+            path = blob_path(job.sha256, "snapshot.png")
+            with open(job.staging_path, "rb") as f:
+                storage.upload(path, f, "image/png")
+            blob = register_blob(storage.location, job.sha256, job.size, "image/png", path, url=storage.public_url(path))
+        if thumbnails and not blob.thumbnails:
+            _thumbnails(blob, job.staging_path, storage)
+        _finish(job, blob)
+    except Exception as exc:
+        _retry_or_fail(job, exc, retry)
+    return job
+
+
+def _owned(job):
+    """The job row, if this worker's lease on it is still current."""
+    return SnapshotJob.objects.filter(pk=job.pk, status=SnapshotJob.RUNNING, claim=job.claim)
+
+
+def _finish(job, blob):
+    now = timezone.now()
+    with transaction.atomic():
+        if find_blob(blob.location, blob.sha256) is None:
+            raise Blob.DoesNotExist(f"blob {blob.sha256} was pruned")  # retried: uploads it again
+        # a job finished at enqueue is not saved yet, so nobody else can hold it
+        if not job._state.adding and not _owned(job).update(status=SnapshotJob.DONE, finished_at=now):
+            logger.warning("Snapshot job %s lost its lease; leaving it to the current holder", job.id)
+            job.refresh_from_db()
+            return
+        job.snapshot = record_snapshot(job.session_id, blob.path, url=blob.url, size=blob.size, blob=blob)
+        Session.objects.filter(pk=job.session_id).update(
+            snapshot_url=blob.url, is_saved=True, is_offline_available=True,
+        )
+        job.status = SnapshotJob.DONE
+        job.finished_at = now
+        job.last_error = ""
+        job.claim = job.locked_at = None
+        job.save()
+    _discard(job.staging_path)
+    logger.info("Snapshot job %s done: %s", job.id, blob.path)
+
+
+def _thumbnails(blob, src, storage):
+    # previews are nice to have; snapshot_thumbnails backfills any that fail here
+    try:
+        make_thumbnails(blob, src, storage)
+    except Exception:
+        logger.exception("Thumbnails failed for blob %s", blob.sha256)
+
+
+def _retry_or_fail(job, exc, retry=True):
+    job.last_error = f"{type(exc).__name__}: {exc}"[:2000]
+    job.locked_at = None
+    permanent = isinstance(exc, FileNotFoundError) or not retry
+    if permanent or job.attempts >= SNAPSHOT_JOB_MAX_ATTEMPTS:
+        job.status = SnapshotJob.FAILED
+        job.finished_at = timezone.now()
+        logger.error("Snapshot job %s failed after %s attempt(s): %s", job.id, job.attempts, job.last_error)
+    else:
+        delay = min(SNAPSHOT_JOB_BACKOFF * 2 ** (job.attempts - 1), SNAPSHOT_JOB_BACKOFF_MAX)
+        job.status = SnapshotJob.QUEUED
+        job.next_attempt_at = timezone.now() + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+        logger.warning("Snapshot job %s attempt %s failed, retrying in ~%ss: %s", job.id, job.attempts, delay, job.last_error)
+    fields = ["status", "last_error", "locked_at", "next_attempt_at", "finished_at"]
+    if not _owned(job).update(claim=None, **{f: getattr(job, f) for f in fields}):
+        logger.warning("Snapshot job %s lost its lease; not rescheduling it", job.id)
+        job.refresh_from_db()
+        return
+    job.claim = None
+    if job.status == SnapshotJob.FAILED:
+        _discard(job.staging_path)  # nothing will retry it
+
+
+def _discard(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,53 @@
+"""
+Index of board snapshots stored in the Supabase bucket.
+
+``save_snapshot`` records every upload with ``record_snapshot``; readers get
+the newest one with ``latest_snapshot`` (one query on (session, created_at)).
+Objects uploaded before the index existed are picked up once by
+``manage.py index_snapshots``.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Max, OuterRef, Subquery
+from .models import SessionSnapshot
+
+
+def record_snapshot(session_id, path, url="", size=0, blob=None):
+    """Add ``path`` as the next version of ``session_id``'s snapshot."""
+    for _ in range(3):
+        try:
+            with transaction.atomic():
+                last = SessionSnapshot.objects.filter(session_id=session_id).aggregate(v=Max("version"))["v"] or 0
+                snap = SessionSnapshot.objects.create(
+                    session_id=session_id, version=last + 1, path=path, url=url, size=size, blob=blob,
+                )
+        except IntegrityError:
+            # a concurrent save took the same version; read the max again
+            continue
+        return snap
+    raise IntegrityError(f"could not allocate snapshot version for session {session_id}")
+
+
+def latest_snapshot(session_id):
+    """Most recently saved snapshot (backfilled rows may have lower versions
+    than newer saves, so order by save time)."""
+    return SessionSnapshot.objects.filter(session_id=session_id).order_by("-created_at", "-version").first()
+
+
+def latest_snapshot_id():
+    """Subquery for annotating a Session queryset with its latest snapshot's id."""
+    return Subquery(
+        SessionSnapshot.objects.filter(session=OuterRef("pk")).order_by("-created_at", "-version").values("pk")[:1]
+    )
+
+
+def attach_latest_snapshots(sessions):
+    """
+    Set ``latest_snapshot`` (blob included) on Sessions annotated with
+    ``latest_snapshot_id=latest_snapshot_id()``, in one query for the lot.
+    """
+    snaps = SessionSnapshot.objects.select_related("blob").in_bulk(
+        [s.latest_snapshot_id for s in sessions if s.latest_snapshot_id]
+    )
+    for s in sessions:
+        s.latest_snapshot = snaps.get(s.latest_snapshot_id)
+    return sessions
@@ -0,0 +1,103 @@
+// Whiteboard channel over the self-hosted WebSocket relay (modules/session/relay.py).
+// Exposes the subset of the Supabase RealtimeChannel API the whiteboard scripts use
+// (send / on / subscribe / track / presenceState), so they run unchanged on either.
+(function () {
+  const RECONNECT_MS = 2000;
+
+  function relayChannel(sessionId) {
+    const handlers = { broadcast: {}, presence: {} };
+    const present = {};
+    let ws = null;
+    let onStatus = null;
+    let closed = false;
+
+    function emit(kind, event, arg) {
+      (handlers[kind][event] || []).forEach((fn) => {
+        try { fn(arg); } catch (e) { console.error("relay handler failed", e); }
+      });
+    }
+
+    function syncPresence() {
+      emit("presence", "sync", {});
+    }
+
+    function handle(msg) {
+      switch (msg.type) {
+        case "hello":
+          Object.keys(present).forEach((k) => delete present[k]);
+          (msg.present || []).forEach((p) => { present[String(p.uid)] = [{ uid: String(p.uid), username: p.username }]; });
+          onStatus && onStatus("SUBSCRIBED");
+          syncPresence();
+          break;
+        case "presence":
+          if (msg.event === "join") present[String(msg.uid)] = [{ uid: String(msg.uid), username: msg.username }];
+          else delete present[String(msg.uid)];
+          syncPresence();
+          break;
+        case "broadcast":
+          emit("broadcast", msg.event, { payload: msg.payload });
+          break;
+        case "stroke":
+          emit("broadcast", "stroke", { payload: msg });
+          break;
+        case "perm":
+          // sent by the server when the teacher changed someone's permission
+          emit("broadcast", "perm", { payload: { uid: msg.uid, can: msg.can } });
+          break;
+        case "cursors":
+          emit("broadcast", "cursors", { payload: msg.cursors });
+          break;
+        case "error":
+          console.warn("relay error:", msg.error);
+          break;
+      }
+    }
+
+    function connect() {
+      const scheme = location.protocol === "https:" ? "wss" : "ws";
+      ws = new WebSocket(`${scheme}://${location.host}/ws/session/${sessionId}/`);
+      ws.onmessage = (e) => {
+        let msg;
+        try { msg = JSON.parse(e.data); } catch (_) { return; }
+        handle(msg);
+      };
+      ws.onclose = (e) => {
+        onStatus && onStatus("CLOSED");
+        // 4403: not (or no longer) a member of the session; don't retry
+        if (!closed && e.code !== 4403) setTimeout(connect, RECONNECT_MS);
+      };
+    }
+
+    return {
+      subscribe(callback) {
+        onStatus = callback || null;
+        if (!ws) connect();
+        return this;
+      },
+      on(kind, filter, callback) {
+        const event = (filter && filter.event) || "";
+        if (!handlers[kind]) return this;
+        (handlers[kind][event] = handlers[kind][event] || []).push(callback);
+        return this;
+      },
+      send({ event, payload }) {
+        if (!ws || ws.readyState !== WebSocket.OPEN) return Promise.resolve("error");
+        ws.send(JSON.stringify({ type: "broadcast", event, payload }));
+        return Promise.resolve("ok");
+      },
+      track() {
+        // the relay announces presence itself when the socket joins
+        return Promise.resolve("ok");
+      },
+      presenceState() {
+        return { ...present };
+      },
+      unsubscribe() {
+        closed = true;
+        ws && ws.close();
+      },
+    };
+  }
+
+  window.WhiteboardRelay = { channel: relayChannel };
+})();
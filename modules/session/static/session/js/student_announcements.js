@@ -143,5 +143,15 @@ document.addEventListener("DOMContentLoaded", () => {
       });
   }
 
-  startRealtime();
-});
\ No newline at end of file
+  const streamOn = window.EventSource && document.querySelector('meta[name="sse-enabled"]')?.content === "1";
+  if (streamOn) {
+    // new items arrive over the bell's notification stream; load the list once
+    loadInitial();
+    document.addEventListener("notifications:new", e => {
+      const n = e.detail || {};
+      if (String(n.session_id) === String(sessionId)) prependOne(n);
+    });
+  } else {
+    startRealtime();
+  }
+});
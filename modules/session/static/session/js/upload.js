@@ -65,7 +65,16 @@
           img.className = "upload-preview";
           img.src = data.file_url || "";
           img.alt = file.name || "";
-          li.appendChild(img);
+          if (data.download_url) {
+            // served under the original file name
+            const link = document.createElement("a");
+            link.href = data.download_url;
+            link.title = file.name || "";
+            link.appendChild(img);
+            li.appendChild(link);
+          } else {
+            li.appendChild(img);
+          }
           uploadedFiles.appendChild(li);
         }
         // Add to board + broadcast
@@ -136,7 +136,8 @@
   function getSelfLayer() {
     return getRemoteCtx(String(window.CURRENT_USER_ID));
   }
-  function snapshotState(reason = "") {
+  // strokeId: the logged stroke this entry ends with, so undo/redo can be sent to the stroke log
+  function snapshotState(reason = "", strokeId = null) {
     try {
       // capture current user's stroke layer pixels
       const self = getSelfLayer();
@@ -163,7 +164,8 @@
         strokeData,
         images: imagesCopy,
         activeId: activeImage ? activeImage.id : null,
-        annotations: annotationsState
+        annotations: annotationsState,
+        strokeId
       };
       history.push(snap);
       while (history.length > MAX_HISTORY) history.shift();
@@ -213,6 +215,7 @@
     redoStack.push(current);
     const previous = history[history.length - 1];
     restoreSnapshot(previous);
+    if (broadcast && current.strokeId) logHistoryOp("undo", current.strokeId);
     // broadcast to other clients unless explicitly disabled
     if (broadcast && typeof channel !== 'undefined' && channel) {
       try { channel.send({ type: 'broadcast', event: 'history', payload: { t: 'undo', sid: String(window.CURRENT_USER_ID) } }); } catch (e) { console.warn('undo broadcast failed', e); }
@@ -224,23 +227,10 @@
       return;
     }
     const next = redoStack.pop();
-    // push current into history
-    try {
-      const self = getSelfLayer();
-      const strokeData = self.getImageData(0, 0, self.canvas.width, self.canvas.height);
-      const imagesCopy = images.map(i => ({
-        id: i.id, img: i.img, x: i.x, y: i.y, width: i.width, height: i.height, rotation: i.rotation || 0
-      }));
-      history.push({
-        strokeWidth: self.canvas.width,
-        strokeHeight: self.canvas.height,
-        strokeData,
-        images: imagesCopy,
-        activeId: activeImage ? activeImage.id : null,
-        annotations: (window.AnnotationAPI && typeof window.AnnotationAPI.getState === 'function') ? window.AnnotationAPI.getState() : { highlights: [], pins: [] }
-      });
-    } catch {}
+    // the redone state becomes the current one again, so a later undo reverts it
+    history.push(next);
     restoreSnapshot(next);
+    if (broadcast && next.strokeId) logHistoryOp("redo", next.strokeId);
     // broadcast redo
     if (broadcast && typeof channel !== 'undefined' && channel) {
       try { channel.send({ type: 'broadcast', event: 'history', payload: { t: 'redo', sid: String(window.CURRENT_USER_ID) } }); } catch (e) { console.warn('redo broadcast failed', e); }
@@ -378,6 +368,63 @@
     });
   }
 
+  // ========================================
+  // STROKE LOG (batched POSTs to the server)
+  // ========================================
+  const STROKE_FLUSH_MS = 1000;
+  const STROKE_FLUSH_POINTS = 400;
+  const STROKE_DELTA_POINTS = 64;
+  let strokeQueue = [];
+  let queuedPoints = 0;
+  let currentStroke = null;
+  let strokeCounter = 0;
+
+  function logStrokeDelta(delta) {
+    strokeQueue.push(delta);
+    queuedPoints += delta.points.length;
+    if (queuedPoints >= STROKE_FLUSH_POINTS) flushStrokes();
+  }
+  function beginStrokeLog(e, tool, color, width) {
+    strokeCounter += 1;
+    currentStroke = {
+      stroke_id: `${window.CURRENT_USER_ID}-${Date.now().toString(36)}-${strokeCounter}`,
+      tool, color, width, points: [[nx(e), ny(e)]],
+    };
+  }
+  function extendStrokeLog(e) {
+    if (!currentStroke) return;
+    currentStroke.points.push([nx(e), ny(e)]);
+    if (currentStroke.points.length >= STROKE_DELTA_POINTS) {
+      logStrokeDelta({ ...currentStroke, end: false });
+      // keep the last point so the next delta joins up
+      currentStroke = { ...currentStroke, points: currentStroke.points.slice(-1) };
+    }
+  }
+  // undo/redo of one of our strokes; the server hides or restores it when folding the log
+  function logHistoryOp(tool, strokeId) {
+    logStrokeDelta({ stroke_id: strokeId, tool, points: [], end: true });
+  }
+  function endStrokeLog(e) {
+    if (!currentStroke) return;
+    if (e) currentStroke.points.push([nx(e), ny(e)]);
+    logStrokeDelta({ ...currentStroke, end: true });
+    currentStroke = null;
+  }
+  function flushStrokes() {
+    if (!strokeQueue.length || !window.CURRENT_SESSION_ID) return;
+    const batch = strokeQueue;
+    strokeQueue = [];
+    queuedPoints = 0;
+    fetch(`/session/${window.CURRENT_SESSION_ID}/strokes/`, {
+      method: "POST",
+      keepalive: true,
+      headers: { "Content-Type": "application/json", "X-CSRFToken": getCookie("csrftoken") },
+      body: JSON.stringify({ strokes: batch }),
+    }).catch(() => {});
+  }
+  setInterval(flushStrokes, STROKE_FLUSH_MS);
+  window.addEventListener("pagehide", flushStrokes);
+
   // draw handlers (single binding point)
   function startDraw(e) {
     if (!canDraw) return;
@@ -407,6 +454,7 @@
     selfCtx.moveTo(lastX, lastY);
     scheduleRedraw();
     send("begin", e, { c: erasing ? "eraser" : selfCtx.strokeStyle, w: selfCtx.lineWidth });
+    beginStrokeLog(e, erasing ? "eraser" : "pen", erasing ? "" : currentColor, lineWidth);
   }
 
   function draw(e) {
@@ -431,6 +479,7 @@
     lastX = p.x; lastY = p.y;
     // broadcast intermediate point
     send("draw", e);
+    extendStrokeLog(e);
     // update visible canvas for the drawer
     scheduleRedraw();
   }
@@ -440,18 +489,12 @@
     drawing = false;
     const selfCtx = getRemoteCtx(String(window.CURRENT_USER_ID));
     selfCtx.globalAlpha = 1;
-    snapshotState("stroke");
+    snapshotState("stroke", currentStroke && currentStroke.stroke_id);
     scheduleRedraw();
     send("end", e);
+    endStrokeLog(e);
     // Ensure eraser effects are reflected remotely
     if (erasing) broadcastLayerSync();
-    // Removed unused POST ping that caused 403 (Forbidden)
-    // if (window.CURRENT_SESSION_ID) {
-    //   fetch(`/session/${window.CURRENT_SESSION_ID}/stroke/`, {
-    //     method: "POST",
-    //     headers: { "X-CSRFToken": getCookie("csrftoken") }
-    //   }).catch(()=>{});
-    // }
   }
 
   // bind/unbind so permission can toggle live
@@ -714,6 +757,9 @@
     scheduleRedraw();
     showToast("Board cleared.", "success");
 
+    logStrokeDelta({ stroke_id: "", tool: "clear", points: [], end: true });
+    flushStrokes();
+
     // Broadcast a clear_all so every client resets local + remote layers
     channel?.send({ type: "broadcast", event: "stroke", payload: { t: "clear_all", sid: String(window.CURRENT_USER_ID) } });
     channel?.send({ type: "broadcast", event: "image", payload: { t: "clear_all" } });
@@ -738,6 +784,19 @@
   // ========================================
   // SAVE
   // ========================================
+  // save_snapshot answers 202 while the upload is queued; poll until the worker finishes
+  function waitForSnapshotJob(statusUrl, tries = 0) {
+    return new Promise(resolve => setTimeout(resolve, Math.min(500 * 2 ** tries, 4000)))
+      .then(() => fetch(statusUrl, { credentials: "same-origin" }))
+      .then(r => r.ok ? r.json() : Promise.reject(new Error(`HTTP ${r.status}`)))
+      .then(d => {
+        if (d.status === "done") return d;
+        if (d.status === "failed") throw new Error(d.error || "upload_failed");
+        if (tries >= 20) throw new Error("Snapshot upload is taking too long");
+        return waitForSnapshotJob(statusUrl, tries + 1);
+      });
+  }
+
   saveBtn?.addEventListener("click", () => {
     if (!canDraw) return showToast("You don't have permission to save.", "error");
     const saveUrl = saveBtn.dataset.saveUrl;
@@ -763,6 +822,7 @@
         headers: { "X-CSRFToken": getCookie("csrftoken") }
       })
       .then(r => r.ok ? r.json() : Promise.reject(new Error(`HTTP ${r.status}`)))
+      .then(d => (d.ok && d.status !== "done" && d.status_url) ? waitForSnapshotJob(d.status_url) : d)
       .then(d => {
         if (d.ok) {
           saveBtn.textContent = "✅ Saved!";
@@ -907,8 +967,8 @@
   }
   // Call after any history mutation
   const _snapshotState = snapshotState;
-  snapshotState = function(reason = "") {
-    _snapshotState(reason);
+  snapshotState = function(reason = "", strokeId = null) {
+    _snapshotState(reason, strokeId);
     updateUndoRedoButtons();
   };
   const _restoreSnapshot = restoreSnapshot;
@@ -938,15 +998,18 @@
   // After initial setup
   updateUndoRedoButtons();
 
-  // Supabase Realtime
-  const supa = (window.SUPABASE_URL && window.SUPABASE_ANON_KEY)
+  // Realtime: the self-hosted relay when enabled (relay_channel.js), else Supabase
+  const useRelay = window.WHITEBOARD_RELAY && window.WhiteboardRelay;
+  const supa = (!useRelay && window.SUPABASE_URL && window.SUPABASE_ANON_KEY)
     ? window.supabase.createClient(window.SUPABASE_URL, window.SUPABASE_ANON_KEY)
     : null;
 
   const channelName = `wb:${window.CURRENT_SESSION_ID}`;
-  const channel = supa?.channel(channelName, {
-    config: { broadcast: { ack: false }, presence: { key: String(window.CURRENT_USER_ID || "anon") } }
-  });
+  const channel = useRelay
+    ? window.WhiteboardRelay.channel(window.CURRENT_SESSION_ID)
+    : supa?.channel(channelName, {
+      config: { broadcast: { ack: false }, presence: { key: String(window.CURRENT_USER_ID || "anon") } }
+    });
   window.WhiteboardChannel = channel;
 
   // subscribe so events flow (delayed to allow other scripts to attach listeners)
@@ -963,6 +1026,21 @@
     });
   });
 
+  // Presence heartbeat (students): cheap cache write server-side, shown on the attendance page
+  const HEARTBEAT_MS = 30000;
+  function sendHeartbeat() {
+    if (!window.CURRENT_SESSION_ID || document.visibilityState === "hidden") return;
+    fetch(`/session/${window.CURRENT_SESSION_ID}/presence/heartbeat/`, {
+      method: "POST",
+      headers: { "X-CSRFToken": getCookie("csrftoken") },
+    }).catch(() => {});
+  }
+  if (!window.IS_TEACHER) {
+    sendHeartbeat();
+    setInterval(sendHeartbeat, HEARTBEAT_MS);
+    document.addEventListener("visibilitychange", sendHeartbeat);
+  }
+
   // Realtime meta events (chat toggle)
   channel?.on("broadcast", { event: "meta" }, ({ payload }) => {
     if (!payload || payload.t !== "chat") return;
@@ -0,0 +1,71 @@
+"""
+Per-participant activity counters kept on Participant.
+
+strokes_count is bumped by append_strokes/record_stroke; uploads_count and
+messages_count by the post_save and post_delete receivers in signals.py
+(deletes only decrement). Every increment also
+moves last_active, so dashboards read plain columns instead of
+aggregating over uploads and chat. Stroke bumps are plain UPDATEs, so they
+announce themselves with the ``strokes_counted`` signal.
+
+``rebuild_participant_stats`` recounts from the source tables (backfill, or
+repair after bulk deletes that bypass signals).
+"""
+from django.db.models import F, Func, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
+from django.utils import timezone
+from .models import Participant, StrokeEvent, UploadedFile
+
+# sent with session_id and user_id after a participant's strokes_count moved
+strokes_counted = Signal()
+
+
+def bump_strokes(session_id, user_id, count=1):
+    Participant.objects.filter(session_id=session_id, user_id=user_id).update(
+        strokes_count=F("strokes_count") + count,
+        last_active=timezone.now(),
+    )
+    strokes_counted.send(sender=Participant, session_id=session_id, user_id=user_id)
+
+
+def bump_uploads(session_id, user_id, delta=1):
+    qs = Participant.objects.filter(session_id=session_id, user_id=user_id)
+    if delta > 0:
+        qs.update(uploads_count=F("uploads_count") + delta, last_active=timezone.now())
+    else:
+        qs.filter(uploads_count__gte=-delta).update(uploads_count=F("uploads_count") + delta)
+
+
+def bump_messages(room_id, user_id, delta=1):
+    qs = Participant.objects.filter(session__chat_room__id=room_id, user_id=user_id)
+    if delta > 0:
+        qs.update(messages_count=F("messages_count") + delta, last_active=timezone.now())
+    else:
+        qs.filter(messages_count__gte=-delta).update(messages_count=F("messages_count") + delta)
+
+
+def _count(qs):
+    """Scalar ``(SELECT COUNT(*) ...)`` subquery; plain COUNT, so no GROUP BY is added."""
+    counted = qs.order_by().annotate(n=Func(F("pk"), function="COUNT")).values("n")
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def stat_subqueries():
+    """Subquery expressions recounting each counter for the outer Participant."""
+    from modules.chat.models import Message
+
+    session, user = OuterRef("session_id"), OuterRef("user_id")
+    return {
+        "strokes_count": _count(
+            StrokeEvent.objects.filter(session_id=session, author_id=user, is_final=True).exclude(tool__in=StrokeEvent.OPS)
+        ),
+        "uploads_count": _count(UploadedFile.objects.filter(session_id=session, uploaded_by_id=user)),
+        "messages_count": _count(Message.objects.filter(room__session_id=session, sender_id=user)),
+    }
+
+
+def rebuild_participant_stats(participants=None):
+    """Recount the counters of ``participants`` (default: all) in one UPDATE. Returns rows updated."""
+    qs = Participant.objects.all() if participants is None else participants
+    return qs.update(**stat_subqueries())
@@ -0,0 +1,225 @@
+"""
+Compact binary encoding for whiteboard strokes.
+
+Points arrive normalized to the canvas (0..1). They are quantized onto a
+STROKE_GRID x STROKE_GRID lattice, delta-encoded against the previous point,
+zigzag-mapped to unsigned ints and written as LEB128 varints. A typical
+pen stroke costs 2-3 bytes per point instead of ~30 as a JSON list.
+
+Point blob layout:   varint(n) x0 y0 dx1 dy1 ... dx(n-1) dy(n-1)
+Stroke record layout (see encode_stroke_record):
+    varint(seq) varint(author_id) u8(tool) u8(flags) varint(width)
+    str(color) str(stroke_id) point-blob
+where str() is varint(len) + utf-8 bytes. Tools include the "undo"/"redo"
+log entries; FLAG_UNDONE only appears in folded (checkpoint) records.
+
+Decoders raise ValueError on truncated input.
+"""
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; only decode_points_array needs it
+    np = None
+
+STROKE_GRID = 16383  # 14 bits per axis: sub-pixel on a 4K canvas
+
+TOOL_CODES = {"pen": 0, "eraser": 1, "clear": 2, "undo": 3, "redo": 4}
+TOOL_NAMES = {v: k for k, v in TOOL_CODES.items()}
+FLAG_FINAL = 0x01
+FLAG_UNDONE = 0x02  # folded records only: the stroke is undone but can be redone
+
+
+# ---------- varints ----------
+def _put_varint(out, value):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _get_varint(buf, pos):
+    result = shift = 0
+    while True:
+        try:
+            b = buf[pos]
+        except IndexError:
+            raise ValueError("truncated stroke data") from None
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _zigzag(n):
+    return (n << 1) if n >= 0 else ((-n << 1) - 1)
+
+
+def _unzigzag(z):
+    return (z >> 1) if not z & 1 else -((z + 1) >> 1)
+
+
+def _put_str(out, text):
+    raw = (text or "").encode("utf-8")
+    _put_varint(out, len(raw))
+    out.extend(raw)
+
+
+def _get_str(buf, pos):
+    n, pos = _get_varint(buf, pos)
+    if pos + n > len(buf):
+        raise ValueError("truncated stroke data")
+    return bytes(buf[pos:pos + n]).decode("utf-8"), pos + n
+
+
+# ---------- point runs ----------
+def quantize(v):
+    v = 0.0 if v < 0 else 1.0 if v > 1 else v
+    return int(round(v * STROKE_GRID))
+
+
+def _write_points(out, points):
+    _put_varint(out, len(points))
+    px = py = 0
+    for i, (x, y) in enumerate(points):
+        qx, qy = quantize(x), quantize(y)
+        if i == 0:
+            _put_varint(out, qx)
+            _put_varint(out, qy)
+        else:
+            _put_varint(out, _zigzag(qx - px))
+            _put_varint(out, _zigzag(qy - py))
+        px, py = qx, qy
+
+
+def _read_quantized(buf, pos):
+    """Return (array('l') of interleaved absolute grid coords, new pos)."""
+    n, pos = _get_varint(buf, pos)
+    coords = array("l")
+    if not n:
+        return coords, pos
+    qx, pos = _get_varint(buf, pos)
+    qy, pos = _get_varint(buf, pos)
+    coords.append(qx)
+    coords.append(qy)
+    for _ in range(n - 1):
+        dx, pos = _get_varint(buf, pos)
+        dy, pos = _get_varint(buf, pos)
+        qx += _unzigzag(dx)
+        qy += _unzigzag(dy)
+        coords.append(qx)
+        coords.append(qy)
+    return coords, pos
+
+
+def encode_points(points):
+    """Encode [[x, y], ...] (normalized floats) into a point blob."""
+    out = bytearray()
+    _write_points(out, points)
+    return bytes(out)
+
+
+def decode_points(blob):
+    """Decode a point blob back to a list of [x, y] normalized floats."""
+    if not blob:
+        return []
+    coords, _ = _read_quantized(memoryview(blob), 0)
+    scale = 1.0 / STROKE_GRID
+    return [[coords[i] * scale, coords[i + 1] * scale] for i in range(0, len(coords), 2)]
+
+
+def decode_points_array(blob):
+    """Decode a point blob into an (n, 2) float32 NumPy array of normalized coords."""
+    if np is None:
+        raise RuntimeError("numpy is required for decode_points_array()")
+    coords, _ = _read_quantized(memoryview(blob or b"\x00"), 0)
+    arr = np.frombuffer(coords, dtype=np.dtype("l")).reshape(-1, 2)
+    return arr.astype(np.float32) / np.float32(STROKE_GRID)
+
+
+def point_count(blob):
+    """Number of points in a blob without decoding it."""
+    if not blob:
+        return 0
+    n, _ = _get_varint(memoryview(blob), 0)
+    return n
+
+
+# ---------- stroke records ----------
+def encode_stroke_record(out, *, seq, author_id, tool, is_final, width, color, stroke_id, data, undone=False):
+    """Append one stroke record to ``out`` (a bytearray). ``data`` is a point blob."""
+    _put_varint(out, seq)
+    _put_varint(out, author_id or 0)
+    out.append(TOOL_CODES.get(tool, 0))
+    out.append((FLAG_FINAL if is_final else 0) | (FLAG_UNDONE if undone else 0))
+    _put_varint(out, width or 0)
+    _put_str(out, color)
+    _put_str(out, stroke_id)
+    out.extend(data or b"\x00")
+
+
+def encode_stroke_dicts(records):
+    """Encode stroke dicts (as yielded by decode_stroke_log) back into a log."""
+    out = bytearray()
+    for r in records:
+        encode_stroke_record(
+            out,
+            seq=r["seq"],
+            author_id=r["author_id"],
+            tool=r["tool"],
+            is_final=r["is_final"],
+            width=r["width"],
+            color=r["color"],
+            stroke_id=r["stroke_id"],
+            data=encode_points(r["points"]),
+            undone=r.get("undone", False),
+        )
+    return bytes(out)
+
+
+def encode_stroke_log(events):
+    """Encode an iterable of StrokeEvent-like objects into one byte string."""
+    out = bytearray()
+    for ev in events:
+        encode_stroke_record(
+            out,
+            seq=ev.seq,
+            author_id=ev.author_id,
+            tool=ev.tool,
+            is_final=ev.is_final,
+            width=ev.width,
+            color=ev.color,
+            stroke_id=ev.stroke_id,
+            data=ev.data,
+        )
+    return bytes(out)
+
+
+def decode_stroke_log(buf):
+    """Yield stroke records (dicts with decoded points) from an encoded log."""
+    buf = memoryview(buf)
+    pos, end = 0, len(buf)
+    scale = 1.0 / STROKE_GRID
+    while pos < end:
+        seq, pos = _get_varint(buf, pos)
+        author_id, pos = _get_varint(buf, pos)
+        if pos + 2 > end:
+            raise ValueError("truncated stroke data")
+        tool, flags = buf[pos], buf[pos + 1]
+        pos += 2
+        width, pos = _get_varint(buf, pos)
+        color, pos = _get_str(buf, pos)
+        stroke_id, pos = _get_str(buf, pos)
+        coords, pos = _read_quantized(buf, pos)
+        yield {
+            "seq": seq,
+            "author_id": author_id,
+            "tool": TOOL_NAMES.get(tool, "pen"),
+            "is_final": bool(flags & FLAG_FINAL),
+            "undone": bool(flags & FLAG_UNDONE),
+            "width": width,
+            "color": color,
+            "stroke_id": stroke_id,
+            "points": [[coords[i] * scale, coords[i + 1] * scale] for i in range(0, len(coords), 2)],
+        }
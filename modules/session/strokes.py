@@ -0,0 +1,102 @@
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from .models import Session, StrokeEvent
+from .stroke_codec import encode_points
+from .checkpoints import maybe_checkpoint
+from .stats import bump_strokes
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds for one ingest POST; the client flushes well below these.
+STROKE_BATCH_MAX = getattr(settings, "STROKE_BATCH_MAX", 500)
+STROKE_POINTS_MAX = getattr(settings, "STROKE_POINTS_MAX", 2000)
+
+TOOLS = {choice for choice, _ in StrokeEvent.TOOL_CHOICES}
+
+
+def clean_stroke_deltas(raw):
+    """
+    Validate a list of stroke deltas posted by the whiteboard.
+
+    Each delta looks like:
+        {"stroke_id": "12-7", "tool": "pen", "color": "#000", "width": 3,
+         "points": [[x, y], ...], "end": true}
+    Coordinates are normalized to the canvas (0..1). "undo"/"redo" entries
+    only need the ``stroke_id`` of the author's stroke they apply to.
+    Raises ValueError with a short error code on bad input.
+    """
+    if not isinstance(raw, list) or not raw:
+        raise ValueError("no_strokes")
+    if len(raw) > STROKE_BATCH_MAX:
+        raise ValueError("batch_too_large")
+
+    cleaned = []
+    for item in raw:
+        if not isinstance(item, dict):
+            raise ValueError("bad_stroke")
+        tool = item.get("tool") or "pen"
+        if tool not in TOOLS:
+            raise ValueError("bad_tool")
+        if tool in StrokeEvent.HISTORY_OPS:
+            if not item.get("stroke_id"):
+                raise ValueError("bad_stroke")
+            item = {"stroke_id": item["stroke_id"], "tool": tool}
+
+        pts = item.get("points") or []
+        if not isinstance(pts, list) or len(pts) > STROKE_POINTS_MAX:
+            raise ValueError("bad_points")
+        points = []
+        for pt in pts:
+            try:
+                x, y = float(pt[0]), float(pt[1])
+            except (TypeError, ValueError, IndexError):
+                raise ValueError("bad_points")
+            points.append([min(max(x, 0.0), 1.0), min(max(y, 0.0), 1.0)])
+
+        try:
+            width = max(1, min(int(item.get("width") or 3), 200))
+        except (TypeError, ValueError):
+            raise ValueError("bad_width")
+
+        cleaned.append({
+            "stroke_id": str(item.get("stroke_id") or "")[:32],
+            "tool": tool,
+            "color": str(item.get("color") or "")[:16],
+            "width": width,
+            "data": encode_points(points),
+            "point_count": len(points),
+            "is_final": bool(item.get("end")) or tool in StrokeEvent.OPS,
+        })
+    return cleaned
+
+
+def append_strokes(session_id, user, deltas, is_participant=False):
+    """
+    Append cleaned deltas to the session's stroke log in one transaction.
+
+    Sequence numbers are reserved with a single UPDATE on the session row,
+    rows go in with one bulk_create, and (for participants) the counters on
+    the Participant row are bumped once per batch. Returns (first_seq, last_seq).
+    """
+    n = len(deltas)
+    finished = sum(1 for d in deltas if d["is_final"] and d["tool"] not in StrokeEvent.OPS)
+
+    with transaction.atomic():
+        Session.objects.filter(pk=session_id).update(stroke_seq=F("stroke_seq") + n)
+        last_seq, checkpoint_seq = Session.objects.filter(pk=session_id).values_list("stroke_seq", "checkpoint_seq").get()
+        first_seq = last_seq - n + 1
+
+        StrokeEvent.objects.bulk_create([
+            StrokeEvent(session_id=session_id, seq=first_seq + i, author=user, **d)
+            for i, d in enumerate(deltas)
+        ])
+
+        if is_participant:
+            bump_strokes(session_id, user.pk, finished)
+
+        transaction.on_commit(lambda: maybe_checkpoint(session_id, last_seq, checkpoint_seq))
+
+    logger.debug("append_strokes(): session=%s seq=%s..%s", session_id, first_seq, last_seq)
+    return first_seq, last_seq
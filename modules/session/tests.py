@@ -1,3 +1,976 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipIf, skipUnless
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from . import stroke_codec as codec
+from . import checkpoints
+from .checkpoints import build_checkpoint, fold_strokes
+from .export import iter_strokes
+from . import membership, presence, relay, render
+from .render import board_strokes
+from .strokes import append_strokes, clean_stroke_deltas
+from . import snapshot_queue
+from .management.commands import index_snapshots
+from .snapshots import latest_snapshot, latest_snapshot_id, record_snapshot
+from .models import Blob, Participant, Session, SessionSnapshot, SnapshotJob, StrokeEvent, UploadedFile
+from .uploads import UploadTooLarge, stream_to_storage
 
-# Create your tests here.
+User = get_user_model()
+
+
+class SessionExportAccessTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(username="teacher", password="pw", role="teacher")
+        self.student = User.objects.create_user(username="student", password="pw")
+        self.outsider = User.objects.create_user(username="outsider", password="pw")
+        self.session = Session.objects.create(title="Export", created_by=self.teacher, code="EXP001", stroke_seq=1)
+        Participant.objects.create(session=self.session, user=self.student)
+
+    def test_pdf_export_rejects_non_members(self):
+        self.client.force_login(self.outsider)
+        r = self.client.get(reverse("export_session_pdf", args=[self.session.id]))
+        self.assertEqual(r.status_code, 403)
+        self.assertEqual(r.json()["error"], "not_participant")
+
+    def test_pdf_export_streams_for_members(self):
+        for user in (self.teacher, self.student):
+            self.client.force_login(user)
+            r = self.client.get(reverse("export_session_pdf", args=[self.session.id]))
+            self.assertEqual(r.status_code, 200)
+            self.assertTrue(b"".join(r.streaming_content).startswith(b"%PDF"))
+
+
+@override_settings(STORAGES={
+    **settings.STORAGES,
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+})
+class SessionListQueryTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(username="teacher", password="pw", role="teacher")
+        self.client.force_login(self.teacher)
+
+    def make_sessions(self, n, start=0):
+        Session.objects.bulk_create(
+            Session(title=f"Lesson {i}", created_by=self.teacher, code=f"LST{i:03d}") for i in range(start, start + n)
+        )
+
+    def test_page_is_a_fixed_number_of_queries(self):
+        self.make_sessions(45)
+        # auth session + user, COUNT, page SELECT, the unread-notification badge
+        with self.assertNumQueries(5):
+            r = self.client.get(reverse("session_list"), {"page": 2})
+        self.assertEqual(len(r.context["sessions"]), 20)
+
+    def test_search_filters_in_the_database(self):
+        self.make_sessions(30)
+        with self.assertNumQueries(5):
+            r = self.client.get(reverse("session_list"), {"q": "lst02"})
+        self.assertEqual(sorted(s.code for s in r.context["sessions"]), [f"LST{i:03d}" for i in range(20, 30)])
+
+
+class StrokeCodecTests(SimpleTestCase):
+    STEP = 1.0 / codec.STROKE_GRID
+
+    def assertPointsClose(self, got, expected):
+        self.assertEqual(len(got), len(expected))
+        for (gx, gy), (ex, ey) in zip(got, expected):
+            self.assertAlmostEqual(gx, ex, delta=self.STEP)
+            self.assertAlmostEqual(gy, ey, delta=self.STEP)
+
+    def record(self, **overrides):
+        r = {
+            "seq": 1, "author_id": 7, "tool": "pen", "is_final": True, "width": 3,
+            "color": "#ff0000", "stroke_id": "s-1", "points": [[0.25, 0.5], [0.3, 0.55]], "undone": False,
+        }
+        r.update(overrides)
+        return r
+
+    def test_points_round_trip(self):
+        points = [[0.1, 0.2], [0.15, 0.25], [0.5, 0.5], [0.999, 0.001]]
+        self.assertPointsClose(codec.decode_points(codec.encode_points(points)), points)
+
+    def test_negative_deltas(self):
+        points = [[0.9, 0.9], [0.5, 0.8], [0.1, 0.2], [0.1, 0.0]]
+        blob = codec.encode_points(points)
+        self.assertPointsClose(codec.decode_points(blob), points)
+        self.assertEqual(codec.point_count(blob), 4)
+
+    def test_empty_stroke(self):
+        blob = codec.encode_points([])
+        self.assertEqual(codec.decode_points(blob), [])
+        self.assertEqual(codec.decode_points(b""), [])
+        self.assertEqual(codec.point_count(blob), 0)
+        log = codec.encode_stroke_dicts([self.record(points=[], tool="clear")])
+        self.assertEqual(list(codec.decode_stroke_log(log)), [self.record(points=[], tool="clear")])
+
+    def test_large_values_and_full_canvas_jumps(self):
+        points = [[0.0, 1.0], [1.0, 0.0], [0.0, 1.0]]
+        rec = self.record(seq=2 ** 40, author_id=2 ** 31, width=70000, color="värme", stroke_id="ü" * 300, points=points)
+        [out] = codec.decode_stroke_log(codec.encode_stroke_dicts([rec]))
+        self.assertEqual({k: v for k, v in out.items() if k != "points"}, {k: v for k, v in rec.items() if k != "points"})
+        self.assertEqual(out["points"], points)
+
+    def test_out_of_range_points_are_clamped(self):
+        self.assertEqual(codec.decode_points(codec.encode_points([[-0.5, 1.5], [2.0, -1.0]])), [[0.0, 1.0], [1.0, 0.0]])
+
+    def test_stroke_log_round_trip(self):
+        records = [
+            self.record(),
+            self.record(seq=2, tool="eraser", is_final=False, stroke_id="s-2", points=[[0.4, 0.4]]),
+            self.record(seq=3, author_id=0, tool="clear", width=0, color="", stroke_id="", points=[]),
+        ]
+        decoded = list(codec.decode_stroke_log(codec.encode_stroke_dicts(records)))
+        self.assertEqual([{k: v for k, v in r.items() if k != "points"} for r in decoded],
+                         [{k: v for k, v in r.items() if k != "points"} for r in records])
+        for got, expected in zip(decoded, records):
+            self.assertPointsClose(got["points"], expected["points"])
+
+    def test_truncated_input_raises_value_error(self):
+        log = codec.encode_stroke_dicts([self.record(points=[[0.1, 0.1], [0.9, 0.9], [0.2, 0.7]])])
+        for end in range(1, len(log)):
+            with self.subTest(end=end), self.assertRaises(ValueError):
+                list(codec.decode_stroke_log(log[:end]))
+        blob = codec.encode_points([[0.1, 0.1], [0.9, 0.9]])
+        for end in range(1, len(blob)):
+            with self.subTest(blob_end=end), self.assertRaises(ValueError):
+                codec.decode_points(blob[:end])
+
+    @skipIf(codec.np is None, "numpy is not installed")
+    def test_numpy_decode_matches_lists(self):
+        points = [[0.1, 0.2], [0.05, 0.9], [0.7, 0.3]]
+        blob = codec.encode_points(points)
+        arr = codec.decode_points_array(blob)
+        self.assertEqual(arr.shape, (3, 2))
+        self.assertPointsClose(arr.tolist(), codec.decode_points(blob))
+        self.assertEqual(codec.decode_points_array(b"").shape, (0, 2))
+
+
+def _rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+@skipUnless(os.path.exists("/proc/self/statm"), "needs /proc to sample RSS")
+class UploadStreamingTests(SimpleTestCase):
+    SIZE = 200 * 1024 * 1024
+    RSS_CEILING = 32 * 1024 * 1024  # growth allowed while streaming SIZE bytes
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.storage = FileSystemStorage(location=os.path.join(self.tmp.name, "media"))
+        self.src = os.path.join(self.tmp.name, "upload.bin")
+        with open(self.src, "wb") as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(self.SIZE // len(block)):
+                f.write(block)
+
+    def expected_digest(self):
+        sha = hashlib.sha256()
+        with open(self.src, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def test_200mb_upload_streams_within_rss_ceiling(self):
+        peak, done = [_rss_bytes()], threading.Event()
+
+        def sample():
+            while not done.is_set():
+                peak.append(_rss_bytes())
+                time.sleep(0.005)
+
+        baseline = _rss_bytes()
+        sampler = threading.Thread(target=sample)
+        sampler.start()
+        try:
+            with open(self.src, "rb") as f:
+                path, digest, size = stream_to_storage(File(f, name="upload.bin"), "blobs/upload.bin",
+                                                       storage=self.storage, max_bytes=0)
+        finally:
+            done.set()
+            sampler.join()
+        self.assertEqual(size, self.SIZE)
+        self.assertEqual(os.path.getsize(self.storage.path(path)), self.SIZE)
+        self.assertEqual(digest, self.expected_digest())
+        self.assertLess(max(peak) - baseline, self.RSS_CEILING)
+
+    def test_oversized_upload_is_rejected(self):
+        with open(self.src, "rb") as f, self.assertRaises(UploadTooLarge):
+            stream_to_storage(File(f, name="upload.bin"), "blobs/big.bin", storage=self.storage, max_bytes=self.SIZE - 1)
+
+
+def _png(color, size=(64, 48)):
+    from PIL import Image
+    out = tempfile.SpooledTemporaryFile()
+    Image.new("RGB", size, color).save(out, "PNG")
+    out.seek(0)
+    return SimpleUploadedFile("board.png", out.read(), content_type="image/png")
+
+
+class TempMediaMixin:
+    """Point default storage at a temporary directory for the test."""
+
+    def use_temp_media(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        media = {"BACKEND": "django.core.files.storage.FileSystemStorage", "OPTIONS": {"location": os.path.join(tmp.name, "media")}}
+        media_override = override_settings(STORAGES={**settings.STORAGES, "default": media})
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        return tmp.name
+
+
+class SnapshotQueueTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        self.staging = os.path.join(self.use_temp_media(), "staging")
+        for patcher in (
+            mock.patch.object(snapshot_queue, "SNAPSHOT_STAGING_DIR", self.staging),
+            mock.patch.object(snapshot_queue, "_storage", snapshot_queue.LocalSnapshotStorage()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.teacher = User.objects.create_user(username="teacher", password="pw", role="teacher")
+        self.session = Session.objects.create(title="Snap", created_by=self.teacher, code="SNP001")
+
+    def enqueue(self, color="red"):
+        return snapshot_queue.enqueue_snapshot(self.session, self.teacher, _png(color), 10 * 1024 * 1024)
+
+    def test_saves_synchronously_by_default(self):
+        job = self.enqueue()
+        self.assertEqual(job.status, SnapshotJob.DONE)
+        self.assertEqual(SessionSnapshot.objects.filter(session=self.session).count(), 1)
+        blob = Blob.objects.get(sha256=job.sha256)
+        self.assertEqual(blob.location, Blob.MEDIA)
+        self.assertFalse(os.listdir(self.staging))
+
+    def test_same_bytes_finish_without_another_upload(self):
+        self.enqueue()
+        with mock.patch.object(snapshot_queue.LocalSnapshotStorage, "upload") as upload:
+            job = self.enqueue()
+        upload.assert_not_called()
+        self.assertEqual(job.status, SnapshotJob.DONE)
+        self.assertEqual(Blob.objects.count(), 1)
+
+    def test_sync_upload_failure_fails_the_job(self):
+        with mock.patch.object(snapshot_queue.LocalSnapshotStorage, "upload", side_effect=OSError("disk full")), \
+                self.assertLogs(snapshot_queue.logger, "ERROR"):
+            job = self.enqueue()
+        self.assertEqual(SnapshotJob.objects.get(pk=job.pk).status, SnapshotJob.FAILED)
+        self.assertFalse(os.listdir(self.staging))
+
+    @mock.patch.object(snapshot_queue, "SNAPSHOT_ASYNC", True)
+    def test_retried_job_keeps_its_staged_file(self):
+        self.enqueue()
+        with mock.patch.object(snapshot_queue.LocalSnapshotStorage, "upload", side_effect=OSError("disk full")), \
+                self.assertLogs(snapshot_queue.logger, "WARNING"):
+            job = snapshot_queue.process_job(snapshot_queue.claim_next_job())
+        self.assertEqual(job.status, SnapshotJob.QUEUED)
+        self.assertTrue(os.path.exists(job.staging_path))
+
+    @mock.patch.object(snapshot_queue, "SNAPSHOT_ASYNC", True)
+    def test_worker_processes_queued_job(self):
+        job = self.enqueue()
+        self.assertEqual(job.status, SnapshotJob.QUEUED)
+        claimed = snapshot_queue.claim_next_job()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertIsNotNone(claimed.claim)
+        snapshot_queue.process_job(claimed)
+        job.refresh_from_db()
+        self.assertEqual(job.status, SnapshotJob.DONE)
+        self.assertIsNone(job.claim)
+        self.assertEqual(job.snapshot.session_id, self.session.pk)
+
+    @mock.patch.object(snapshot_queue, "SNAPSHOT_ASYNC", True)
+    def test_worker_that_lost_its_lease_does_not_finish(self):
+        self.enqueue()
+        stale = snapshot_queue.claim_next_job()
+        SnapshotJob.objects.filter(pk=stale.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        current = snapshot_queue.claim_next_job()
+        self.assertNotEqual(stale.claim, current.claim)
+
+        with self.assertLogs(snapshot_queue.logger, "WARNING"):
+            snapshot_queue.process_job(stale)
+        self.assertEqual(SessionSnapshot.objects.count(), 0)
+        self.assertEqual(SnapshotJob.objects.get(pk=stale.pk).status, SnapshotJob.RUNNING)
+
+        snapshot_queue.process_job(current)
+        with self.assertLogs(snapshot_queue.logger, "WARNING"):
+            snapshot_queue.process_job(current)  # replayed finish
+        self.assertEqual(SnapshotJob.objects.get(pk=stale.pk).status, SnapshotJob.DONE)
+        self.assertEqual(SessionSnapshot.objects.count(), 1)
+
+    def test_sync_save_leaves_thumbnails_to_the_backfill(self):
+        job = self.enqueue()
+        blob = Blob.objects.get(sha256=job.sha256)
+        self.assertEqual(blob.thumbnails, {})
+        out = StringIO()
+        call_command("snapshot_thumbnails", stdout=out)
+        blob.refresh_from_db()
+        self.assertEqual(list(blob.thumbnails), ["64"])
+        call_command("snapshot_thumbnails", stdout=out)
+        self.assertIn("thumbnailed 0 blob(s)", out.getvalue())
+
+    @mock.patch.object(snapshot_queue, "SNAPSHOT_ASYNC", True)
+    def test_worker_builds_thumbnails(self):
+        self.enqueue()
+        job = snapshot_queue.process_job(snapshot_queue.claim_next_job())
+        self.assertEqual(list(Blob.objects.get(sha256=job.sha256).thumbnails), ["64"])
+
+    def test_thumbnails_skip_widths_at_or_above_the_original(self):
+        from .thumbnails import make_thumbnails
+        storage = snapshot_queue.get_snapshot_storage()
+        for width, expected in ((800, ["160", "320", "640"]), (320, ["160"]), (100, ["100"])):
+            blob = Blob.objects.create(location=Blob.MEDIA, sha256=f"{width:064d}", size=1,
+                                       content_type="image/png", path=f"blobs/t/{width}.png")
+            variants = make_thumbnails(blob, _png("green", (width, width // 2)), storage)
+            self.assertEqual(list(variants), expected)
+            self.assertEqual(Blob.objects.get(pk=blob.pk).thumbnails, variants)
+            for key in ("webp", "png"):
+                self.assertTrue(default_storage.exists(f"blobs/t/{width}.w{expected[-1]}.{key}"))
+
+    def test_save_snapshot_view_returns_the_url(self):
+        self.client.force_login(self.teacher)
+        r = self.client.post(reverse("save_snapshot", args=[self.session.id]), {"image": _png("blue")})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()["status"], SnapshotJob.DONE)
+        self.assertTrue(r.json()["url"])
+
+
+class StrokeUndoTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(username="teacher", password="pw", role="teacher")
+        self.student = User.objects.create_user(username="student", password="pw")
+        self.session = Session.objects.create(title="Undo", created_by=self.teacher, code="UND001")
+
+    def log(self, user, *deltas):
+        append_strokes(self.session.pk, user, clean_stroke_deltas(list(deltas)))
+
+    def stroke(self, user, stroke_id):
+        self.log(user, {"stroke_id": stroke_id, "tool": "pen", "points": [[0.1, 0.1], [0.2, 0.2]], "end": True})
+
+    def shown(self):
+        return sorted(s["stroke_id"] for s in board_strokes(self.session)[1] if not s["undone"])
+
+    def test_undo_and_redo_apply_to_the_authors_stroke(self):
+        self.stroke(self.teacher, "a")
+        self.stroke(self.student, "a")
+        self.log(self.teacher, {"stroke_id": "a", "tool": "undo"})
+        self.assertEqual([(s["author_id"], s["undone"]) for s in board_strokes(self.session)[1]],
+                         [(self.teacher.pk, True), (self.student.pk, False)])
+        self.log(self.teacher, {"stroke_id": "a", "tool": "redo"})
+        self.assertEqual(self.shown(), ["a", "a"])
+
+    def test_redo_survives_a_checkpoint(self):
+        self.stroke(self.teacher, "a")
+        self.stroke(self.teacher, "b")
+        self.log(self.teacher, {"stroke_id": "b", "tool": "undo"})
+        build_checkpoint(self.session)
+        self.assertEqual(self.shown(), ["a"])
+        self.assertEqual([s["stroke_id"] for s in iter_strokes(self.session)], ["a"])
+        self.log(self.teacher, {"stroke_id": "b", "tool": "redo"})
+        self.assertEqual(self.shown(), ["a", "b"])
+        self.assertEqual([s["stroke_id"] for s in iter_strokes(self.session)], ["a", "b"])
+
+    def test_new_stroke_drops_undone_strokes(self):
+        self.stroke(self.teacher, "a")
+        self.log(self.teacher, {"stroke_id": "a", "tool": "undo"})
+        self.stroke(self.teacher, "b")
+        self.log(self.teacher, {"stroke_id": "a", "tool": "redo"})
+        self.assertEqual([s["stroke_id"] for s in board_strokes(self.session)[1]], ["b"])
+
+    def test_history_ops_need_a_stroke_id_and_are_not_counted(self):
+        with self.assertRaisesMessage(ValueError, "bad_stroke"):
+            clean_stroke_deltas([{"tool": "undo"}])
+        [op] = clean_stroke_deltas([{"stroke_id": "a", "tool": "redo", "points": [[0.5, 0.5]]}])
+        self.assertEqual((op["point_count"], op["is_final"]), (0, True))
+        Participant.objects.create(session=self.session, user=self.student)
+        append_strokes(self.session.pk, self.student, clean_stroke_deltas([
+            {"stroke_id": "a", "tool": "pen", "points": [[0.1, 0.1]], "end": True},
+            {"stroke_id": "a", "tool": "undo"},
+        ]), is_participant=True)
+        self.assertEqual(Participant.objects.get(session=self.session, user=self.student).strokes_count, 1)
+
+
+class RenderTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        self.use_temp_media()
+        self.teacher = User.objects.create_user(username="teacher", password="pw", role="teacher")
+        self.session = Session.objects.create(title="Render", created_by=self.teacher, code="RND001")
+        self.draw("a")
+
+    def draw(self, stroke_id):
+        append_strokes(self.session.pk, self.teacher, clean_stroke_deltas([
+            {"stroke_id": stroke_id, "tool": "pen", "color": "#000", "points": [[0.1, 0.1], [0.9, 0.9]], "end": True},
+        ]))
+
+    def test_render_is_cached_per_seq(self):
+        with mock.patch.object(render, "render_strokes", wraps=render.render_strokes) as drawn:
+            path, seq = render.render_png(self.session, 640)
+            self.assertEqual(render.render_png(self.session, 640), (path, seq))
+        self.assertEqual(drawn.call_count, 1)
+        self.assertEqual(path, render.render_path(self.session.pk, 1, 640))
+
+    def test_new_strokes_prune_older_renders(self):
+        old, _ = render.render_png(self.session, 640)
+        self.draw("b")
+        new, seq = render.render_png(self.session, 640)
+        self.assertEqual(seq, 2)
+        self.assertTrue(default_storage.exists(new))
+        self.assertFalse(default_storage.exists(old))
+
+    def test_tile_bounds(self):
+        cols, rows = render.tile_grid(1024)
+        img = render.render_strokes([], 1024, (cols - 1, rows - 1))
+        self.assertEqual(img.size, (1024 - (cols - 1) * render.RENDER_TILE_SIZE, 576 - (rows - 1) * render.RENDER_TILE_SIZE))
+        for tile in ((cols, 0), (0, rows), (-1, 0)):
+            with self.subTest(tile=tile), self.assertRaisesMessage(render.RenderError, "tile_out_of_range"):
+                render.render_png(self.session, 1024, tile)
+
+    def test_wide_boards_are_served_as_tiles_without_supersampling(self):
+        with self.assertRaisesMessage(render.RenderError, "tile_required"):
+            render.render_png(self.session, 8192)
+        with mock.patch.object(render.Image, "new", wraps=render.Image.new) as new:
+            render.render_png(self.session, 8192, (0, 0))
+        self.assertEqual(new.call_args.args[1], (render.RENDER_TILE_SIZE, render.RENDER_TILE_SIZE))
+
+    def test_view_rejects_wide_whole_board(self):
+        self.client.force_login(self.teacher)
+        r = self.client.get(reverse("render_board", args=[self.session.id]), {"w": 8192})
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(r.json()["error"], "tile_required")
+
+
+class PresenceTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(username="teacher", password="pw", role="teacher")
+        self.student = User.objects.create_user(username="student", password="pw")
+        self.session = Session.objects.create(title="Presence", created_by=self.teacher, code="PRE001")
+        self.participant = Participant.objects.create(session=self.session, user=self.student)
+
+    def last_active(self):
+        self.participant.refresh_from_db()
+        return self.participant.last_active
+
+    def test_without_a_cache_heartbeats_write_the_row(self):
+        when = timezone.now() - timedelta(seconds=5)
+        presence.touch(self.session.id, self.student.pk, when=when)
+        self.assertAlmostEqual(self.last_active().timestamp(), when.timestamp(), places=3)
+        self.assertEqual(list(presence.last_seen(self.session.id, [self.student.pk])), [self.student.pk])
+        self.assertEqual(presence.flush_session(self.session.id), 0)
+        self.assertEqual(presence.pending_sessions([self.session.id]), [])
+
+    @mock.patch.object(presence, "PRESENCE_CACHE", "default")
+    def test_with_a_cache_heartbeats_wait_for_the_flush(self):
+        from django.core.cache import cache
+        cache.clear()
+        presence.touch(self.session.id, self.student.pk)
+        self.assertIsNone(self.last_active())
+        self.assertEqual(presence.pending_sessions([self.session.id]), [str(self.session.id)])
+        self.assertEqual(presence.flush_session(self.session.id), 1)
+        self.assertIsNotNone(self.last_active())
+
+    def test_heartbeat_requires_the_csrf_token(self):
+        from django.test import Client
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.student)
+        url = reverse("presence_heartbeat", args=[self.session.id])
+        self.assertEqual(client.post(url).status_code, 403)
+        token = "x" * 32
+        client.cookies["csrftoken"] = token
+        r = client.post(url, HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(r.json(), {"ok": True, "tracked": True})
+        self.assertIsNotNone(self.last_active())
+
+
+class BlobTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        self.use_temp_media()
+        self.teacher = User.objects.create_user(username="teacher", password="pw", role="teacher")
+        self.outsider = User.objects.create_user(username="outsider", password="pw")
+        self.session = Session.objects.create(title="Blobs", created_by=self.teacher, code="BLB001")
+        self.client.force_login(self.teacher)
+
+    def upload(self, name, data=b"same bytes"):
+        r = self.client.post(reverse("upload_attachment", args=[self.session.id]),
+                             {"file": SimpleUploadedFile(name, data, content_type="text/plain")})
+        self.assertEqual(r.status_code, 200)
+        return r.json()
+
+    def prune(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command("prune_blobs", *args, stdout=out, stderr=err)
+        return out.getvalue() + err.getvalue()
+
+    def test_same_bytes_are_stored_once_and_served_under_each_name(self):
+        first, second = self.upload("notes.txt"), self.upload("copy of notes.txt")
+        self.assertEqual(first["sha256"], second["sha256"])
+        blob = Blob.objects.get()
+        self.assertEqual(blob.refcount, 2)
+        self.assertEqual(len(default_storage.listdir(os.path.dirname(blob.path))[1]), 1)
+
+        for body, name in ((first, "notes.txt"), (second, "copy of notes.txt")):
+            r = self.client.get(body["download_url"])
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r["Content-Disposition"], f'attachment; filename="{name}"')
+            self.assertEqual(b"".join(r.streaming_content), b"same bytes")
+
+        self.client.force_login(self.outsider)
+        self.assertEqual(self.client.get(first["download_url"]).status_code, 403)
+
+    def test_refcount_follows_pointer_rows(self):
+        from .snapshots import record_snapshot
+        self.upload("a.txt")
+        blob = Blob.objects.get()
+        snap = record_snapshot(self.session.id, blob.path, size=blob.size, blob=blob)
+        blob.refresh_from_db()
+        self.assertEqual(blob.refcount, 2)
+        snap.delete()
+        self.session.uploads.get().delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.refcount, 0)
+
+    def test_prune_removes_unreferenced_blobs_past_the_grace_period(self):
+        self.upload("kept.txt", b"kept")
+        self.upload("dropped.txt", b"dropped")
+        dropped = Blob.objects.get(sha256=hashlib.sha256(b"dropped").hexdigest())
+        self.session.uploads.get(name="dropped.txt").delete()
+
+        self.prune()  # still inside the grace period
+        self.assertTrue(Blob.objects.filter(pk=dropped.pk).exists())
+
+        Blob.objects.update(created_at=timezone.now() - timedelta(hours=2))
+        self.assertIn("Deleted 1 blob(s)", self.prune())
+        self.assertEqual(list(Blob.objects.values_list("sha256", flat=True)), [hashlib.sha256(b"kept").hexdigest()])
+        self.assertFalse(default_storage.exists(dropped.path))
+
+    def test_prune_keeps_a_blob_whose_refcount_is_stale(self):
+        self.upload("a.txt")
+        Blob.objects.update(refcount=0, created_at=timezone.now() - timedelta(hours=2))
+        self.assertIn("still referenced", self.prune())
+        blob = Blob.objects.get()
+        self.assertTrue(default_storage.exists(blob.path))
+
+    def test_duplicate_shares_the_blobs_under_a_new_title(self):
+        self.upload("a.txt")
+        r = self.client.get(reverse("duplicate_session", args=[self.session.id]))
+        self.assertEqual(r.status_code, 302)
+        copy = Session.objects.exclude(pk=self.session.pk).get()
+        self.assertEqual(copy.title, f"Blobs (copy {copy.code})")
+        self.assertEqual(copy.uploads.get().blob, Blob.objects.get())
+        self.assertEqual(Blob.objects.get().refcount, 2)
+
+
+class _RelaySocket:
+    """The ASGI server side of one relay connection."""
+
+    def __init__(self):
+        self.inbox = asyncio.Queue()
+        self.sent = []
+
+    async def receive(self):
+        return await self.inbox.get()
+
+    async def send(self, event):
+        self.sent.append(event)
+
+    def put(self, frame):
+        text = frame if isinstance(frame, str) else json.dumps(frame)
+        self.inbox.put_nowait({"type": "websocket.receive", "text": text})
+
+    def frames(self, kind):
+        out = (json.loads(e["text"]) for e in self.sent if e["type"] == "websocket.send")
+        return [f for f in out if f["type"] == kind]
+
+    def closed_with(self):
+        return next((e["code"] for e in self.sent if e["type"] == "websocket.close"), None)
+
+
+@mock.patch.object(relay, "CURSOR_TICK", 0.01)
+class RelayTests(TestCase):
+    def setUp(self):
+        for patcher in (
+            mock.patch.object(relay, "_broker", relay.LocalBroker()),
+            mock.patch.object(relay, "_rooms", {}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.teacher = User.objects.create_user(username="teacher", password="pw", role="teacher")
+        self.student = User.objects.create_user(username="student", password="pw")
+        self.session = Session.objects.create(title="Relay", created_by=self.teacher, code="RLY001")
+        Participant.objects.create(session=self.session, user=self.student, can_draw=True)
+
+    async def connect(self, member):
+        sock = _RelaySocket()
+        task = asyncio.create_task(relay.relay_connection(str(self.session.id), member, sock.receive, sock.send))
+        await asyncio.sleep(0.02)
+        return sock, task
+
+    async def disconnect(self, *conns):
+        for sock, task in conns:
+            sock.inbox.put_nowait({"type": "websocket.disconnect", "code": 1000})
+            await asyncio.wait_for(task, 1)
+
+    def owner(self):
+        return relay.Member(self.teacher.pk, "teacher", True, owner=True)
+
+    def drawer(self):
+        return relay.Member(self.student.pk, "student", True)
+
+    async def test_events_fan_out_to_others_by_permission(self):
+        teacher, student = await self.connect(self.owner()), await self.connect(self.drawer())
+        student[0].put({"type": "broadcast", "event": "stroke", "payload": {"t": "draw"}})
+        student[0].put({"type": "broadcast", "event": "meta", "payload": {"t": "chat"}})
+        teacher[0].put({"type": "broadcast", "event": "meta", "payload": {"t": "chat"}})
+        await asyncio.sleep(0.02)
+        self.assertEqual(
+            [(f["uid"], f["event"]) for f in teacher[0].frames("broadcast")], [(self.student.pk, "stroke")],
+        )
+        self.assertEqual([f["event"] for f in student[0].frames("broadcast")], ["meta"])
+        self.assertEqual(student[0].frames("error"), [{"type": "error", "error": "permission_denied"}])
+        await self.disconnect(teacher, student)
+
+    async def test_cursor_coordinates_are_clamped_and_finite(self):
+        teacher, student = await self.connect(self.owner()), await self.connect(self.drawer())
+        student[0].put('{"type": "cursor", "x": NaN, "y": 0.5}')
+        student[0].put('{"type": "cursor", "x": 0.5, "y": 1e999}')
+        await asyncio.sleep(0.03)
+        self.assertEqual(teacher[0].frames("cursors"), [])
+        student[0].put({"type": "cursor", "x": -3, "y": 7})
+        await asyncio.sleep(0.03)
+        self.assertEqual(teacher[0].frames("cursors")[-1]["cursors"], {str(self.student.pk): [0.0, 1.0]})
+        await self.disconnect(teacher, student)
+
+    async def test_revoke_closes_only_that_participants_socket(self):
+        teacher, student = await self.connect(self.owner()), await self.connect(self.drawer())
+        await relay.get_broker().publish(relay.channel_for(str(self.session.id)),
+                                         relay.Envelope({"type": "revoke", "uid": self.student.pk}))
+        await asyncio.sleep(0.02)
+        self.assertEqual(student[0].closed_with(), relay.CLOSE_FORBIDDEN)
+        self.assertIsNone(teacher[0].closed_with())
+        await self.disconnect(student)  # the server reports the close as a disconnect
+        await asyncio.sleep(0.02)
+        self.assertEqual(teacher[0].frames("presence")[-1]["event"], "leave")
+        await self.disconnect(teacher)
+
+    @mock.patch.object(relay, "MEMBER_RECHECK", 0)
+    async def test_removed_participant_is_closed_on_the_next_stroke(self):
+        student = await self.connect(self.drawer())
+        await sync_to_async(Participant.objects.filter(user=self.student).delete)()
+        student[0].put({"type": "broadcast", "event": "stroke", "payload": {}})
+        await asyncio.wait_for(student[1], 1)
+        self.assertEqual(student[0].closed_with(), relay.CLOSE_FORBIDDEN)
+
+    def test_deleting_a_participant_publishes_a_revoke(self):
+        from . import signals
+        with mock.patch.object(signals, "publish_revoke") as revoke, self.captureOnCommitCallbacks(execute=True):
+            Participant.objects.filter(user=self.student).delete()
+        revoke.assert_called_once_with(self.session.id, self.student.pk)
+
+
+class ParticipantStatsTests(TestCase):
+    def setUp(self):
+        from modules.chat.models import ChatRoom
+        self.teacher = User.objects.create_user(username="teacher", password="pw", role="teacher")
+        self.student = User.objects.create_user(username="student", password="pw")
+        self.session = Session.objects.create(title="Stats", created_by=self.teacher, code="STA001")
+        self.participant = Participant.objects.create(session=self.session, user=self.student)
+        self.room = ChatRoom.objects.create(session=self.session, name="Stats")
+
+    def counts(self):
+        self.participant.refresh_from_db()
+        p = self.participant
+        return p.strokes_count, p.uploads_count, p.messages_count
+
+    def act(self):
+        from modules.chat.models import Message
+        append_strokes(self.session.pk, self.student, clean_stroke_deltas([
+            {"stroke_id": "a", "tool": "pen", "points": [[0.1, 0.1]], "end": True},
+            {"stroke_id": "b", "tool": "pen", "points": [[0.2, 0.2]], "end": True},
+        ]), is_participant=True)
+        upload = UploadedFile.objects.create(session=self.session, uploaded_by=self.student, file="blobs/x", name="x")
+        messages = [Message.objects.create(room=self.room, sender=self.student, content=t) for t in ("hi", "there")]
+        return upload, messages
+
+    def test_counters_follow_creates_and_deletes(self):
+        upload, messages = self.act()
+        self.assertEqual(self.counts(), (2, 1, 2))
+        self.assertIsNotNone(self.participant.last_active)
+        upload.delete()
+        messages[0].delete()
+        self.assertEqual(self.counts(), (2, 0, 1))
+        messages[1].delete()
+        from .stats import bump_messages
+        bump_messages(self.room.pk, self.student.pk, -1)  # never goes below zero
+        self.assertEqual(self.counts(), (2, 0, 0))
+
+    def test_rebuild_recounts_from_the_source_tables(self):
+        from .stats import rebuild_participant_stats
+        self.act()
+        Participant.objects.update(strokes_count=99, uploads_count=0, messages_count=7)
+        self.assertEqual(rebuild_participant_stats(), 1)
+        self.assertEqual(self.counts(), (2, 1, 2))
+
+
+class CheckpointTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(username="teacher", password="pw", role="teacher")
+        self.session = Session.objects.create(title="Checkpoints", created_by=self.teacher, code="CKP001")
+
+    def ev(self, seq, stroke_id, tool="pen", points=(), author=1, final=True):
+        return {"seq": seq, "author_id": author, "stroke_id": stroke_id, "tool": tool,
+                "points": [list(p) for p in points], "is_final": final}
+
+    def draw(self, n):
+        start = StrokeEvent.objects.filter(session=self.session).count()
+        append_strokes(self.session.pk, self.teacher, clean_stroke_deltas([
+            {"stroke_id": f"s{i}", "tool": "pen", "points": [[0.1, 0.1]], "end": True} for i in range(start, start + n)
+        ]))
+
+    def test_fold_merges_deltas_and_applies_clear_and_history(self):
+        folded = fold_strokes([], [
+            self.ev(1, "a", points=[(0, 0), (1, 1)], final=False),
+            self.ev(2, "a", points=[(1, 1), (2, 2)]),
+            self.ev(3, "b", points=[(5, 5)]),
+            self.ev(4, "b", tool="undo"),
+        ])
+        self.assertEqual([(s["stroke_id"], s["points"], s["undone"]) for s in folded],
+                         [("a", [[0, 0], [1, 1], [2, 2]], False), ("b", [[5, 5]], True)])
+        self.assertTrue(folded[0]["is_final"])
+        self.assertEqual(fold_strokes(folded, [self.ev(5, "", tool="clear"), self.ev(6, "c")])[0]["stroke_id"], "c")
+
+    @mock.patch.object(checkpoints, "CHECKPOINT_EVERY_STROKES", 5)
+    def test_batch_crossing_the_threshold_builds_a_checkpoint(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.draw(4)
+        self.assertFalse(self.session.checkpoints.exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.draw(2)
+        cp = self.session.checkpoints.get()
+        self.assertEqual((cp.seq, cp.stroke_count), (6, 6))
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.checkpoint_seq, 6)
+
+    @mock.patch.object(checkpoints, "CHECKPOINT_EVERY_STROKES", 5)
+    def test_deciding_costs_no_query(self):
+        with self.assertNumQueries(0):
+            checkpoints.maybe_checkpoint(self.session.pk, 4, 0)
+            checkpoints.maybe_checkpoint(self.session.pk, 9, 5)
+
+    @mock.patch.object(checkpoints, "CHECKPOINT_ASYNC", True)
+    @mock.patch.object(checkpoints, "CHECKPOINT_EVERY_STROKES", 5)
+    def test_async_leaves_builds_to_the_cron_command(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.draw(7)
+        self.assertFalse(self.session.checkpoints.exists())
+        out = StringIO()
+        call_command("checkpoint_sessions", stdout=out)
+        self.assertEqual(self.session.checkpoints.get().seq, 7)
+        call_command("checkpoint_sessions", stdout=out)
+        self.assertIn("Built 0 checkpoint(s).", out.getvalue())
+
+
+class MembershipCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        membership._local.clear()
+        self.addCleanup(membership._local.clear)
+        self.teacher = User.objects.create_user(username="teacher", password="pw", role="teacher")
+        self.student = User.objects.create_user(username="student", password="pw")
+        self.other = User.objects.create_user(username="other", password="pw")
+        self.session = Session.objects.create(title="Members", created_by=self.teacher, code="MEM001")
+        self.participant = Participant.objects.create(session=self.session, user=self.student)
+        Participant.objects.create(session=self.session, user=self.other)
+
+    def resolve(self, user):
+        return membership.resolve_membership(user.pk, self.session.id)
+
+    def test_local_cache_is_dropped_by_row_changes(self):
+        self.assertFalse(self.resolve(self.student).can_draw)
+        with self.assertNumQueries(0):
+            self.resolve(self.student)
+        self.participant.can_draw = True
+        self.participant.save()
+        self.assertTrue(self.resolve(self.student).can_draw)
+
+    @mock.patch.object(membership, "SESSION_MEMBERSHIP_CACHE", "default")
+    def test_shared_entries_are_per_user(self):
+        self.resolve(self.student)
+        self.resolve(self.other)
+        with self.assertNumQueries(0):
+            self.resolve(self.student)
+        self.participant.can_draw = True
+        self.participant.save()
+        with self.assertNumQueries(0):
+            self.assertFalse(self.resolve(self.other).can_draw)
+        self.assertTrue(self.resolve(self.student).can_draw)
+
+    @mock.patch.object(membership, "SESSION_MEMBERSHIP_CACHE", "default")
+    def test_session_invalidation_drops_every_shared_entry(self):
+        self.assertTrue(self.resolve(self.student).chat_enabled)
+        self.resolve(self.other)
+        Session.objects.filter(pk=self.session.pk).update(chat_enabled=False)
+        membership.invalidate_session(self.session.id)
+        self.assertFalse(self.resolve(self.student).chat_enabled)
+        self.assertFalse(self.resolve(self.other).chat_enabled)
+
+    @mock.patch.object(membership, "SESSION_MEMBERSHIP_CACHE", "default")
+    def test_shared_cache_is_read_before_process_memory(self):
+        stale = self.resolve(self.student)._replace(is_participant=False)
+        membership._local[str(self.session.id)] = (time.monotonic() + 60, {self.student.pk: stale})
+        self.assertTrue(self.resolve(self.student).is_participant)
+
+
+class _Bucket:
+    """Just enough of supabase's storage bucket for index_snapshots."""
+
+    def __init__(self, names):
+        self.names = sorted(names)
+        self.pages = 0
+
+    def list(self, prefix, opts):
+        self.pages += 1
+        page = self.names[opts["offset"]:opts["offset"] + opts["limit"]]
+        return [{"name": n, "metadata": {"size": 10}} for n in page]
+
+    def get_public_url(self, path):
+        return f"https://bucket.test/{path}"
+
+
+class SnapshotIndexTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(username="teacher", password="pw", role="teacher")
+        self.session = Session.objects.create(title="Index", created_by=self.teacher, code="IDX001")
+
+    def index(self, names, *args):
+        bucket = _Bucket(names)
+        client = mock.Mock()
+        client.storage.from_.return_value = bucket
+        out = StringIO()
+        with mock.patch.object(index_snapshots, "create_client", return_value=client):
+            call_command("index_snapshots", "--page-size", "2", *args, stdout=out)
+        return bucket, out.getvalue()
+
+    def test_file_name_pattern(self):
+        sid = "0f8fad5b-d9cb-469f-a165-70867728950e"
+        match = index_snapshots.SNAPSHOT_NAME.match(f"{sid}_1700000000.png")
+        self.assertEqual((match.group("sid"), match.group("ts")), (sid, "1700000000"))
+        self.assertTrue(index_snapshots.SNAPSHOT_NAME.match(f"{sid.upper()}_1.png"))
+        for name in (f"{sid}.png", f"{sid}_17x.png", f"{sid}_1.png.tmp", f"thumb_{sid}_1.png", f"{sid}_1.jpg", "notes.png"):
+            self.assertIsNone(index_snapshots.SNAPSHOT_NAME.match(name), name)
+
+    def test_numbers_after_existing_versions_and_skips_indexed_paths(self):
+        sid = str(self.session.id)
+        record_snapshot(sid, f"{sid}_100.png")
+        record_snapshot(sid, f"{sid}_200.png")
+        names = [
+            f"{sid}_200.png", f"{sid}_300.png", f"{sid}_50.png",
+            "0f8fad5b-d9cb-469f-a165-70867728950e_1.png",  # no such session
+            "readme.txt",
+        ]
+        bucket, out = self.index(names)
+        self.assertEqual(bucket.pages, 3)
+        self.assertIn("Indexed 2 snapshot(s).", out)
+        # new rows follow the existing versions, oldest file first, stamped with the time in the name
+        new = list(self.session.snapshots.filter(version__gt=2).order_by("version"))
+        self.assertEqual([(s.version, s.path) for s in new], [(3, f"{sid}_50.png"), (4, f"{sid}_300.png")])
+        self.assertEqual(int(new[1].created_at.timestamp()), 300)
+        self.assertEqual(new[1].url, f"https://bucket.test/{sid}_300.png")
+        # a second pass finds everything indexed
+        _, out = self.index(names)
+        self.assertIn("Indexed 0 snapshot(s).", out)
+        self.assertEqual(self.session.snapshots.count(), 4)
+
+    def test_dry_run_indexes_nothing(self):
+        sid = str(self.session.id)
+        _, out = self.index([f"{sid}_100.png"], "--dry-run")
+        self.assertIn("Would index 1 snapshot(s).", out)
+        self.assertFalse(self.session.snapshots.exists())
+
+    def test_latest_snapshot_is_the_newest_save_not_the_highest_version(self):
+        sid = str(self.session.id)
+        saved = record_snapshot(sid, f"{sid}_saved.png")
+        self.index([f"{sid}_100.png", f"{sid}_200.png"])
+        self.assertEqual(self.session.snapshots.order_by("-version").first().version, 3)
+        self.assertEqual(latest_snapshot(sid), saved)
+        annotated = Session.objects.annotate(latest_snapshot_id=latest_snapshot_id()).get(pk=self.session.pk)
+        self.assertEqual(annotated.latest_snapshot_id, saved.pk)
+        self.assertIsNone(latest_snapshot(Session.objects.create(title="Empty", created_by=self.teacher, code="IDX002").id))
+
+
+class ArchiveExportTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        from modules.chat.models import ChatRoom, Message
+        self.use_temp_media()
+        patcher = mock.patch.object(snapshot_queue, "_storage", snapshot_queue.LocalSnapshotStorage())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.teacher = User.objects.create_user(username="teacher", password="pw", role="teacher")
+        self.student = User.objects.create_user(username="student", password="pw")
+
+        self.snapped = Session.objects.create(title="Snapped", created_by=self.teacher, code="ARC001")
+        # incompressible and larger than one export chunk, so the member spans several
+        self.png = os.urandom(3 * 64 * 1024)
+        snapshot_queue.get_snapshot_storage().upload("snaps/arc001.png", self.png, "image/png")
+        record_snapshot(self.snapped.pk, "snaps/arc001.png")
+
+        self.drawn = Session.objects.create(title="Drawn", created_by=self.teacher, code="ARC002")
+        Participant.objects.create(session=self.drawn, user=self.student)
+        append_strokes(self.drawn.pk, self.teacher, clean_stroke_deltas([
+            {"stroke_id": "a", "tool": "pen", "color": "#000", "points": [[0.1, 0.1], [0.9, 0.9]], "end": True},
+        ]))
+        room = ChatRoom.objects.create(session=self.drawn, name="Drawn")
+        Message.objects.create(room=room, sender=self.student, content="hello")
+
+    def download(self, *params):
+        self.client.force_login(self.teacher)
+        r = self.client.get(reverse("session_archive"), [("session", str(s.pk)) for s in params])
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r["Content-Type"], "application/zip")
+        chunks = list(r.streaming_content)
+        return chunks, zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+
+    def test_streamed_archive_reopens_with_valid_entries(self):
+        chunks, zf = self.download()
+        self.assertGreater(len(chunks), 3)
+        self.assertIsNone(zf.testzip())  # every member's CRC checks out
+        self.assertEqual(zf.namelist(), [
+            "snapped-ARC001/snapshot.png", "snapped-ARC001/attendance.csv", "snapped-ARC001/chat.txt",
+            "drawn-ARC002/board.svg", "drawn-ARC002/attendance.csv", "drawn-ARC002/chat.txt",
+        ])
+        png = zf.getinfo("snapped-ARC001/snapshot.png")
+        self.assertEqual((png.compress_type, png.CRC), (zipfile.ZIP_STORED, zlib.crc32(self.png)))
+        self.assertEqual(zf.read(png), self.png)
+        self.assertEqual(zf.getinfo("drawn-ARC002/board.svg").compress_type, zipfile.ZIP_DEFLATED)
+        self.assertTrue(zf.read("drawn-ARC002/board.svg").lstrip().startswith(b"<"))
+        self.assertIn(b"student", zf.read("drawn-ARC002/attendance.csv"))
+        self.assertIn(b"student: hello", zf.read("drawn-ARC002/chat.txt"))
+
+    def test_missing_snapshot_object_leaves_a_valid_archive(self):
+        from django.core.files.storage import default_storage
+        default_storage.delete("snaps/arc001.png")
+        with self.assertLogs("modules.session.export", "ERROR"):
+            _, zf = self.download(self.snapped)
+        self.assertIsNone(zf.testzip())
+        self.assertEqual(zf.read("snapped-ARC001/snapshot.png"), b"")
+        self.assertEqual(zf.namelist()[1:], ["snapped-ARC001/attendance.csv", "snapped-ARC001/chat.txt"])
@@ -0,0 +1,78 @@
+"""
+Fixed-width previews of snapshot images.
+
+Each snapshot blob gets one WebP and one PNG per THUMBNAIL_WIDTHS entry,
+stored next to the original (``blobs/aa/<sha>.w320.webp``) and listed in
+``Blob.thumbnails``. List pages show these instead of the full-size PNG.
+Widths at or above the original's are skipped; an image narrower than every
+width gets a single variant at its own width.
+"""
+import io
+from django.conf import settings
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+THUMBNAIL_WIDTHS = tuple(getattr(settings, "THUMBNAIL_WIDTHS", (160, 320, 640)))
+THUMBNAIL_WEBP_QUALITY = getattr(settings, "THUMBNAIL_WEBP_QUALITY", 80)
+# (key in Blob.thumbnails, Pillow format, content type, save options)
+THUMBNAIL_FORMATS = (
+    ("webp", "WEBP", "image/webp", {"quality": THUMBNAIL_WEBP_QUALITY, "method": 4}),
+    ("png", "PNG", "image/png", {"optimize": True}),
+)
+
+
+def thumbnail_path(path, width, ext):
+    folder, _, name = path.rpartition("/")
+    stem = name.rsplit(".", 1)[0] if "." in name else name
+    return f"{folder}/{stem}.w{width}.{ext}" if folder else f"{stem}.w{width}.{ext}"
+
+
+def make_thumbnails(blob, src, storage):
+    """
+    Build, upload and record the previews of ``blob``. ``src`` is a file path
+    or binary file holding the original image; ``storage`` is a snapshot
+    storage backend (see snapshot_queue). Returns the new ``Blob.thumbnails``.
+    """
+    if Image is None:
+        raise RuntimeError("Pillow is required for thumbnails")
+    variants = {}
+    with Image.open(src) as original:
+        original.load()
+        img = original if original.mode in ("RGB", "RGBA") else original.convert("RGBA")
+        widths = [w for w in sorted(THUMBNAIL_WIDTHS) if w < img.width] or [img.width]
+        for width in widths:
+            h = max(1, round(img.height * width / img.width))
+            thumb = img.resize((width, h), Image.LANCZOS, reducing_gap=3.0) if width != img.width else img
+            urls = {}
+            for key, fmt, content_type, options in THUMBNAIL_FORMATS:
+                buf = io.BytesIO()
+                thumb.save(buf, format=fmt, **options)
+                path = thumbnail_path(blob.path, width, key)
+                storage.upload(path, buf.getvalue(), content_type)
+                urls[key] = storage.public_url(path)
+            variants[str(width)] = urls
+
+    type(blob).objects.filter(pk=blob.pk).update(thumbnails=variants)
+    blob.thumbnails = variants
+    return variants
+
+
+def thumbnail_set(blob, width=320):
+    """
+    Preview URLs for a template ``<picture>``: {"src", "srcset", "png", "width"}
+    picking the smallest variant at least ``width`` wide. None without previews.
+    """
+    thumbs = getattr(blob, "thumbnails", None)
+    if not thumbs:
+        return None
+    widths = sorted(int(w) for w in thumbs)
+    pick = next((w for w in widths if w >= width), widths[-1])
+    return {
+        "src": thumbs[str(pick)]["webp"],
+        "srcset": ", ".join(f"{thumbs[str(w)]['webp']} {w}w" for w in widths),
+        "png": thumbs[str(pick)]["png"],
+        "width": pick,
+    }
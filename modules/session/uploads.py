@@ -0,0 +1,135 @@
+"""
+Streaming upload pipeline.
+
+Uploaded files are never read into memory as a whole: Django spools anything
+over FILE_UPLOAD_MAX_MEMORY_SIZE to a temp file, ``UploadSizeLimitHandler``
+drops a file as soon as it passes UPLOAD_MAX_BYTES, and ``HashingReader``
+passes the data on to the storage backend in chunks while it computes the
+SHA-256 and size.
+"""
+import hashlib
+import io
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+UPLOAD_MAX_BYTES = getattr(settings, "UPLOAD_MAX_BYTES", 250 * 1024 * 1024)
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class UploadSizeLimitHandler(FileUploadHandler):
+    """First upload handler in FILE_UPLOAD_HANDLERS: skips a file once it
+    passes UPLOAD_MAX_BYTES so the rest is never spooled. Views check
+    ``request.upload_too_large``."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > UPLOAD_MAX_BYTES:
+            self.request.upload_too_large = True
+            raise SkipFile()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+class HashingReader(io.RawIOBase):
+    """
+    Read-only stream over an uploaded file that hashes and counts the bytes
+    as they are read. Seeking back to 0 starts the hash over, so consumers
+    that rewind before reading (File.chunks(), httpx) still get the right
+    digest.
+    """
+
+    def __init__(self, fileobj, max_bytes=None):
+        self._f = fileobj
+        self.max_bytes = max_bytes
+        self._restart()
+
+    def _restart(self):
+        self._sha = hashlib.sha256()
+        self.size = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        pos = self._f.seek(offset, whence)
+        if pos == 0:
+            self._restart()
+        return pos
+
+    def tell(self):
+        return self._f.tell()
+
+    def readinto(self, buf):
+        data = self._f.read(len(buf))
+        n = len(data)
+        if n:
+            self.size += n
+            if self.max_bytes and self.size > self.max_bytes:
+                raise UploadTooLarge(f"upload exceeds {self.max_bytes} bytes")
+            self._sha.update(data)
+            buf[:n] = data
+        return n
+
+    def hexdigest(self):
+        return self._sha.hexdigest()
+
+
+def check_upload_size(fileobj, max_bytes):
+    """Reject before any storage I/O when the declared size is already too big."""
+    if max_bytes and (fileobj.size or 0) > max_bytes:
+        raise UploadTooLarge(f"upload exceeds {max_bytes} bytes")
+
+
+def stream_to_storage(fileobj, path, storage=None, max_bytes=UPLOAD_MAX_BYTES):
+    """
+    Save an uploaded file to a Django storage chunk by chunk.
+    Returns (saved path, sha256 hex digest, size in bytes).
+    """
+    storage = storage or default_storage
+    check_upload_size(fileobj, max_bytes)
+    reader = HashingReader(fileobj, max_bytes)
+    stream = File(io.BufferedReader(reader, UPLOAD_CHUNK_SIZE), name=path)
+    stream.DEFAULT_CHUNK_SIZE = UPLOAD_CHUNK_SIZE
+    saved = storage.save(path, stream)
+    return saved, reader.hexdigest(), reader.size
+
+
+def stream_to_bucket(bucket, fileobj, path, content_type, max_bytes=UPLOAD_MAX_BYTES, upsert=False):
+    """
+    Upload to a Supabase storage bucket (``client.storage.from_(name)``).
+    storage3 hands a BufferedReader to httpx, which sends it in chunks.
+    Returns (sha256 hex digest, size in bytes).
+    """
+    check_upload_size(fileobj, max_bytes)
+    reader = HashingReader(fileobj, max_bytes)
+    options = {"content-type": content_type}
+    if upsert:
+        options["upsert"] = "true"
+    bucket.upload(path, io.BufferedReader(reader, UPLOAD_CHUNK_SIZE), options)
+    return reader.hexdigest(), reader.size
+
+
+def hash_upload(fileobj, max_bytes=UPLOAD_MAX_BYTES):
+    """SHA-256 and size of an upload, read in chunks; rewinds it afterwards."""
+    check_upload_size(fileobj, max_bytes)
+    reader = HashingReader(fileobj, max_bytes)
+    reader.seek(0)
+    while reader.read(UPLOAD_CHUNK_SIZE):
+        pass
+    fileobj.seek(0)
+    return reader.hexdigest(), reader.size
@@ -8,6 +8,7 @@ from .views import (
     export_session,
     delete_session,
     save_snapshot,
+    snapshot_job_status,
     session_qr,
     export_session_pdf,
     duplicate_session,
@@ -15,6 +16,10 @@ from .views import (
     upload_views,
     saved_sessions,
     record_stroke,
+    stroke_batch,
+    stroke_log,
+    board_state,
+    render_board,
     toggle_chat,
     manage_views,
     whiteboard_views
@@ -36,8 +41,10 @@ urlpatterns = [
     path('export/<uuid:session_id>/', export_session, name='export_session'),
     path('delete/<uuid:session_id>/', delete_session, name='delete_session'),
     path('save_snapshot/<uuid:session_id>/', save_snapshot, name='save_snapshot'),
+    path('snapshot_jobs/<uuid:job_id>/', snapshot_job_status, name='snapshot_job_status'),
     path('qr/<uuid:session_id>/', session_qr, name='session_qr'),
     path('export_pdf/<uuid:session_id>/', export_session_pdf, name='export_session_pdf'),
+    path('archive.zip', manage_views.session_archive, name='session_archive'),
     path('duplicate/<uuid:session_id>/', duplicate_session, name='duplicate_session'),
 
     # Teacher permission toggle (remove invalid path)
@@ -45,8 +52,13 @@ urlpatterns = [
 
     # ✅ Upload
     path('<uuid:session_id>/upload/', upload_views.upload_attachment, name='upload_attachment'),
+    path('<uuid:session_id>/uploads/<int:file_id>/', upload_views.download_attachment, name='download_attachment'),
     path('sessions/saved/', saved_sessions, name='saved_sessions'),
     path("<uuid:session_id>/stroke/", record_stroke, name="record_stroke"),
+    path("<uuid:session_id>/strokes/", stroke_batch, name="stroke_batch"),
+    path("<uuid:session_id>/strokes/log/", stroke_log, name="stroke_log"),
+    path("<uuid:session_id>/board/", board_state, name="board_state"),
+    path("<uuid:session_id>/render.png", render_board, name="render_board"),
 
     # Attendance / participation logs
     path('<uuid:session_id>/attendance/', manage_views.attendance_view, name='attendance'),
@@ -57,6 +69,7 @@ urlpatterns = [
     path("<uuid:session_id>/toggle-chat/", manage_views.toggle_chat, name="toggle_chat"),
     # Presence sync (teacher)
     path("<uuid:session_id>/presence/sync/", manage_views.presence_sync, name="presence_sync"),
+    path("<uuid:session_id>/presence/heartbeat/", manage_views.presence_heartbeat, name="presence_heartbeat"),
     # whiteboard page (if not already routed elsewhere)
     # path("<uuid:session_id>/", whiteboard_views.whiteboard, name="whiteboard"),
 ]
@@ -1,19 +1,168 @@
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+import json
+from django.http import JsonResponse, HttpResponse, FileResponse
+from django.views.decorators.http import require_POST, require_GET
 from django.contrib.auth.decorators import login_required
-from django.utils import timezone
-from django.shortcuts import get_object_or_404
-from ..models import Session, Participant
+from django.http import Http404
+from ..models import StrokeEvent
+from ..membership import get_membership
+from ..strokes import clean_stroke_deltas, append_strokes
+from ..stats import bump_strokes
+from ..stroke_codec import encode_stroke_log, decode_stroke_log
+from ..checkpoints import board_state as load_board_state
+from django.core.files.storage import default_storage
+from ..render import RenderError, render_png, tile_grid, clamp_width
+
+def _membership_or_404(request, session_id):
+    m = get_membership(request, session_id)
+    if m is None:
+        raise Http404("Session not found")
+    return m
+
 
 @login_required
 @require_POST
 def record_stroke(request, session_id):
-    session = get_object_or_404(Session, id=session_id)
+    m = _membership_or_404(request, session_id)
     # Ensure user is participant
-    participant = Participant.objects.filter(session=session, user=request.user).first()
-    if not participant:
+    if not m.is_participant:
+        return JsonResponse({"ok": False, "error": "not_participant"}, status=403)
+    bump_strokes(session_id, request.user.pk)
+    return JsonResponse({"ok": True})
+
+
+@login_required
+@require_POST
+def stroke_batch(request, session_id):
+    """
+    Batched stroke ingest: the whiteboard buffers stroke deltas and POSTs them
+    here as {"strokes": [...]}. Everything is appended to the session's
+    stroke log in one transaction.
+    """
+    m = _membership_or_404(request, session_id)
+    if not m.is_owner and not request.user.is_staff:
+        if not m.is_participant:
+            return JsonResponse({"ok": False, "error": "not_participant"}, status=403)
+        if not m.can_draw:
+            return JsonResponse({"ok": False, "error": "permission_denied"}, status=403)
+
+    try:
+        data = json.loads(request.body or "{}")
+    except json.JSONDecodeError:
+        return JsonResponse({"ok": False, "error": "bad_json"}, status=400)
+
+    try:
+        deltas = clean_stroke_deltas(data.get("strokes") if isinstance(data, dict) else None)
+    except ValueError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+
+    first_seq, last_seq = append_strokes(session_id, request.user, deltas, is_participant=m.is_participant)
+    return JsonResponse({"ok": True, "accepted": len(deltas), "first_seq": first_seq, "last_seq": last_seq})
+
+
+
+@login_required
+@require_GET
+def stroke_log(request, session_id):
+    """
+    Serve the stroke log after ``?after=<seq>`` (default 0).
+
+    The body is the compact binary encoding from stroke_codec
+    (application/octet-stream); pass ``?format=json`` for decoded points.
+    The last sequence number served is returned in ``X-Stroke-Seq``.
+    """
+    m = _membership_or_404(request, session_id)
+    if not m.is_member and not request.user.is_staff:
         return JsonResponse({"ok": False, "error": "not_participant"}, status=403)
-    participant.strokes_count = (participant.strokes_count or 0) + 1
-    participant.last_active = timezone.now()
-    participant.save(update_fields=["strokes_count", "last_active"])
-    return JsonResponse({"ok": True, "strokes": participant.strokes_count})
\ No newline at end of file
+
+    try:
+        after = max(int(request.GET.get("after") or 0), 0)
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "bad_after"}, status=400)
+
+    events = list(
+        StrokeEvent.objects.filter(session_id=session_id, seq__gt=after)
+        .only("seq", "author_id", "tool", "is_final", "width", "color", "stroke_id", "data")
+        .order_by("seq")
+    )
+    last_seq = events[-1].seq if events else after
+    blob = encode_stroke_log(events)
+
+    if request.GET.get("format") == "json":
+        response = JsonResponse({"ok": True, "seq": last_seq, "strokes": list(decode_stroke_log(blob))})
+    else:
+        response = HttpResponse(blob, content_type="application/octet-stream")
+    response["X-Stroke-Seq"] = str(last_seq)
+    return response
+
+
+@login_required
+@require_GET
+def board_state(request, session_id):
+    """
+    Join path for the whiteboard: the latest checkpoint followed by the log
+    tail after it, in one response. Both parts use the same record format,
+    so the body is simply their concatenation. Checkpoint records may be
+    flagged undone, and the tail may hold undo/redo entries to apply.
+    Headers: X-Checkpoint-Seq (0 if none yet) and X-Stroke-Seq (last seq).
+    """
+    m = _membership_or_404(request, session_id)
+    if not m.is_member and not request.user.is_staff:
+        return JsonResponse({"ok": False, "error": "not_participant"}, status=403)
+
+    cp, tail = load_board_state(session_id)
+    cp_seq = cp.seq if cp else 0
+    last_seq = tail[-1].seq if tail else cp_seq
+    blob = (bytes(cp.data) if cp else b"") + encode_stroke_log(tail)
+
+    if request.GET.get("format") == "json":
+        response = JsonResponse({
+            "ok": True,
+            "checkpoint_seq": cp_seq,
+            "seq": last_seq,
+            "strokes": list(decode_stroke_log(blob)),
+        })
+    else:
+        response = HttpResponse(blob, content_type="application/octet-stream")
+    response["X-Checkpoint-Seq"] = str(cp_seq)
+    response["X-Stroke-Seq"] = str(last_seq)
+    return response
+
+
+@login_required
+@require_GET
+def render_board(request, session_id):
+    """
+    PNG of the board rendered on the server from the stroke log.
+    ?w=<px> picks the width (snapped to a multiple of 64); ?tile=<col>,<row>
+    returns one RENDER_TILE_SIZE tile of that width (X-Tile-Grid: cols,rows).
+    Widths above RENDER_FULL_MAX_WIDTH are only served as tiles.
+    Cached per (session, seq, size), so unchanged boards are not re-rendered.
+    """
+    m = _membership_or_404(request, session_id)
+    if not m.is_member and not request.user.is_staff:
+        return JsonResponse({"ok": False, "error": "not_participant"}, status=403)
+
+    width = clamp_width(request.GET.get("w"))
+    tile = None
+    if request.GET.get("tile"):
+        try:
+            col, row = (int(v) for v in request.GET["tile"].split(","))
+            tile = (col, row)
+        except ValueError:
+            return JsonResponse({"ok": False, "error": "bad_tile"}, status=400)
+
+    try:
+        path, seq = render_png(session_id, width, tile)
+    except RenderError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+
+    etag = '"%s"' % path.rsplit("/", 1)[-1]
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponse(status=304)
+    else:
+        response = FileResponse(default_storage.open(path, "rb"), content_type="image/png")
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    response["X-Stroke-Seq"] = str(seq)
+    response["X-Tile-Grid"] = "%d,%d" % tile_grid(width)
+    return response
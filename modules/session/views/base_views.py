@@ -5,12 +5,19 @@ from django.contrib import messages
 from django.utils.crypto import get_random_string
 from django.urls import reverse
 from ..models import Session, Participant
+from ..snapshots import attach_latest_snapshots, latest_snapshot_id
+from ..presence import touch
+from ..thumbnails import thumbnail_set
 from django.utils import timezone
 from django.http import JsonResponse, HttpResponseBadRequest, HttpResponse, StreamingHttpResponse, FileResponse
 from django.db.models import Q
+from django.core.paginator import Paginator
+from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
+SESSION_LIST_PAGE_SIZE = getattr(settings, "SESSION_LIST_PAGE_SIZE", 20)
+
 def safe_view(func):
     """Decorator to log exceptions and handle client disconnects (BrokenPipeError)."""
     def wrapper(request, *args, **kwargs):
@@ -30,23 +37,30 @@ def safe_view(func):
 @safe_view
 def session_list(request):
     """
-    List sessions created by the current user.
-    Includes offline availability and live refresh of session states.
+    List sessions created by the current user, newest first.
+    ``?q=`` searches title and code in the database; ``?page=`` pages the result
+    (one COUNT, one SELECT per page, one for the page's snapshot previews).
     """
-    sessions = list(Session.objects.filter(created_by=request.user).order_by("-created_at"))
-
-    # 🔁 Force refresh from DB to ensure new snapshot + offline flags are visible
-    for s in sessions:
-        s.refresh_from_db()
+    sessions = (
+        Session.objects.filter(created_by=request.user)
+        .annotate(latest_snapshot_id=latest_snapshot_id())
+        .order_by("-created_at", "-id")
+    )
 
     # ✅ Optional search support
-    query = request.GET.get("q")
+    query = (request.GET.get("q") or "").strip()
     if query:
-        sessions = [s for s in sessions if query.lower() in s.title.lower() or query.lower() in s.code.lower()]
+        sessions = sessions.filter(Q(title__icontains=query) | Q(code__icontains=query))
+
+    page = Paginator(sessions, SESSION_LIST_PAGE_SIZE).get_page(request.GET.get("page"))
+    page_sessions = attach_latest_snapshots(list(page.object_list))
+    for s in page_sessions:
+        s.thumb = thumbnail_set(s.latest_snapshot.blob if s.latest_snapshot else None, 160)
 
     return render(request, "session/session_list.html", {
-        "sessions": sessions,
-        "query": query or "",
+        "sessions": page_sessions,
+        "page_obj": page,
+        "query": query,
     })
 
 
@@ -80,11 +94,12 @@ def join_session(request):
         code = (request.POST.get("code") or "").strip().upper()
         session = Session.objects.filter(code__iexact=code).first()
         if session:
-            p, created = Participant.objects.get_or_create(user=request.user, session=session)
-            # Mark the participant as active now (joined or re-joined)
-            p.last_active = timezone.now()
-            # ensure joined_at is set on create (auto_now_add handles it)
-            p.save(update_fields=["last_active"]) 
+            p, created = Participant.objects.get_or_create(
+                user=request.user, session=session, defaults={"last_active": timezone.now()},
+            )
+            if not created:
+                # re-join: a heartbeat, written out by the next presence flush
+                touch(session.id, request.user.pk)
             return redirect(reverse("student_whiteboard", kwargs={"session_id": session.id}))
         return render(request, "session/join_session.html", {"error": "Invalid session code"})
     return render(request, "session/join_session.html")
@@ -93,10 +108,19 @@ def join_session(request):
 @login_required
 @safe_view
 def saved_sessions(request):
-    qs = Session.objects.filter(created_by=request.user).order_by("-id")
+    qs = (
+        Session.objects.filter(created_by=request.user)
+        .annotate(latest_snapshot_id=latest_snapshot_id())
+        .order_by("-id")
+    )
     items = []
-    for s in qs:
-        snap = getattr(s, "snapshot", None)
-        snapshot_url = snap.url if snap else getattr(s, "snapshot_url", None)
-        items.append({"id": s.id, "title": getattr(s, "title", f"Session {s.id}"), "snapshot_url": snapshot_url})
+    for s in attach_latest_snapshots(list(qs)):
+        snap = s.latest_snapshot
+        snapshot_url = (snap.url if snap else None) or s.snapshot_url
+        items.append({
+            "id": s.id,
+            "title": getattr(s, "title", f"Session {s.id}"),
+            "snapshot_url": snapshot_url,
+            "thumb": thumbnail_set(snap.blob if snap else None),
+        })
     return render(request, "session/saved_sessions.html", {"items": items})
\ No newline at end of file
@@ -1,10 +1,17 @@
-import io, time as systime, json, logging
+import io, time as systime, json, logging, uuid
 from django.shortcuts import render, get_object_or_404
 from django.http import JsonResponse, HttpResponseBadRequest, HttpResponse, StreamingHttpResponse, FileResponse
 from django.contrib.auth.decorators import login_required
 from django.conf import settings
 from supabase import create_client
-from ..models import Session, Participant
+from ..models import Session, Participant, SnapshotJob
+from ..relay import publish_permission
+from ..membership import get_membership, invalidate_session
+from ..presence import is_online, last_seen, maybe_flush, touch
+from modules.core.versions import conditional, bump, session_scope
+from ..export import ATTENDANCE_HEADER, EXPORTERS, EXPORT_FORMATS, archive_export, iter_attendance
+from ..uploads import UploadTooLarge
+from ..snapshot_queue import enqueue_snapshot
 from django.urls import reverse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
@@ -15,6 +22,10 @@ from django.views.decorators.csrf import csrf_exempt
 supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
 logger = logging.getLogger(__name__)
 
+SNAPSHOT_MAX_BYTES = getattr(settings, "SNAPSHOT_MAX_BYTES", 20 * 1024 * 1024)
+# attendance.json ETags also roll this often, so live heartbeats show up without a bump per heartbeat
+ATTENDANCE_REFRESH = getattr(settings, "ATTENDANCE_REFRESH", 30)
+
 def safe_view(func):
     """Decorator to log exceptions and handle client disconnects (BrokenPipeError)."""
     def wrapper(request, *args, **kwargs):
@@ -86,6 +97,7 @@ def toggle_draw_permission(request, session_id, user_id):
 
         p.can_draw = can
         p.save(update_fields=["can_draw"])
+        publish_permission(session.id, user_id, can)
         return JsonResponse({"ok": True, "user_id": user_id, "can_draw": p.can_draw})
     except Exception as e:
         # Ensure JSON is always returned (avoid HTML error page)
@@ -96,8 +108,10 @@ def toggle_draw_permission(request, session_id, user_id):
 @safe_view
 def save_snapshot(request, session_id):
     """
-    Uploads a uniquely named snapshot each time (avoids duplicate errors entirely)
-    and marks the session as offline-available.
+    Stages the PNG locally and uploads it as a content-addressed blob, records
+    it as the session's newest snapshot version and marks the session as
+    offline-available. With SNAPSHOT_ASYNC the upload is queued for the
+    worker instead (202 + job id).
     """
     if request.method != "POST":
         return HttpResponseBadRequest("POST required")
@@ -109,59 +123,104 @@ def save_snapshot(request, session_id):
         return JsonResponse({"ok": False, "error": "permission"}, status=403)
 
     img_file = request.FILES.get("image")
+    if getattr(request, "upload_too_large", False):
+        return JsonResponse({"ok": False, "error": "file_too_large"}, status=413)
     if not img_file:
         return JsonResponse({"ok": False, "error": "no_image"}, status=400)
 
     try:
-        file_bytes = img_file.read()
-        bucket = settings.SUPABASE_BUCKET
-        storage = supabase.storage.from_(bucket)
-
-        # ✅ Use unique filename each save
-        timestamp = int(systime.time())
-        file_path = f"{session_id}_{timestamp}.png"
-
-        # Upload to Supabase
-        storage.upload(file_path, file_bytes, {"content-type": "image/png"})
+        # Stage locally, then upload now (or queue for snapshot_worker when SNAPSHOT_ASYNC)
+        job = enqueue_snapshot(session, request.user, img_file, SNAPSHOT_MAX_BYTES)
+    except UploadTooLarge:
+        return JsonResponse({"ok": False, "error": "file_too_large"}, status=413)
+    except Exception as e:
+        logger.exception(f"❌ Failed to queue snapshot for session {session_id}: {e}")
+        return JsonResponse({"ok": False, "error": str(e)}, status=500)
 
-        public_url = storage.get_public_url(file_path)
+    payload = {
+        "ok": True,
+        "job_id": str(job.id),
+        "status": job.status,
+        "status_url": reverse("snapshot_job_status", kwargs={"job_id": job.id}),
+    }
+    if job.status == SnapshotJob.DONE:
+        payload["url"] = job.snapshot.url
+        return JsonResponse(payload)
+    return JsonResponse(payload, status=202)
 
-        # ✅ Update session to point to the latest snapshot and enable offline
-        session.snapshot_url = public_url
-        session.is_saved = True
-        session.is_offline_available = True
-        session.save(update_fields=["snapshot_url", "is_saved", "is_offline_available"])
 
-        logger.info(f"✅ Snapshot saved and marked offline: {file_path}")
-        return JsonResponse({"ok": True, "url": public_url})
+@login_required
+@safe_view
+def snapshot_job_status(request, job_id):
+    """Progress of a queued snapshot upload (polled by the Save button)."""
+    job = SnapshotJob.objects.filter(id=job_id).select_related("session", "snapshot").first()
+    if job is None:
+        return JsonResponse({"ok": False, "error": "not_found"}, status=404)
+    if request.user.id not in (job.requested_by_id, job.session.created_by_id) and not request.user.is_staff:
+        return JsonResponse({"ok": False, "error": "permission"}, status=403)
 
-    except Exception as e:
-        logger.exception(f"❌ Failed to upload snapshot for session {session_id}: {e}")
-        return JsonResponse({"ok": False, "error": str(e)}, status=500)
+    data = {"ok": True, "job_id": str(job.id), "status": job.status, "attempts": job.attempts}
+    if job.status == SnapshotJob.DONE and job.snapshot:
+        data["url"] = job.snapshot.url
+    elif job.status == SnapshotJob.FAILED:
+        data["error"] = "upload_failed"
+    return JsonResponse(data)
 
 @login_required
 @safe_view
 def export_session(request, session_id):
     """
-    Example export endpoint. If you produce large binary data, stream it to avoid memory spikes.
-    This implementation returns a small placeholder file if no real export exists.
-    Replace `payload_bytes` with your actual export generation logic.
+    Stream the whole session (strokes, uploads, chat) as ?format=ndjson
+    (default), svg or pdf. Built row by row, so memory stays flat however
+    long the board's history is.
     """
     session = get_object_or_404(Session, id=session_id)
+    m = get_membership(request, session_id)
+    if (m is None or not m.is_member) and not request.user.is_staff:
+        return JsonResponse({"ok": False, "error": "not_participant"}, status=403)
 
-    # Placeholder export content (replace with real PNG bytes or other export)
-    payload_bytes = (f"Session export for {getattr(session, 'title', session.id)}\n").encode("utf-8")
+    fmt = request.GET.get("format", "ndjson").lower()
+    if fmt not in EXPORTERS:
+        return JsonResponse({"ok": False, "error": "bad_format", "formats": sorted(EXPORTERS)}, status=400)
+    content_type, ext = EXPORT_FORMATS[fmt]
 
-    def chunker(data, chunk_size=64 * 1024):
+    def guarded(chunks):
         try:
-            for i in range(0, len(data), chunk_size):
-                yield data[i : i + chunk_size]
+            yield from chunks
         except BrokenPipeError:
             logger.info("Client disconnected while streaming export for session %s", session_id)
-            return
 
-    response = StreamingHttpResponse(chunker(payload_bytes), content_type="application/octet-stream")
-    response["Content-Disposition"] = f'attachment; filename="session_{session_id}_export.txt"'
+    response = StreamingHttpResponse(guarded(EXPORTERS[fmt](session)), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="session_{session_id}.{ext}"'
+    return response
+
+@login_required
+@safe_view
+def session_archive(request):
+    """
+    End-of-term download: one streamed ZIP of every session the teacher
+    created (or just ?session=<id>&session=<id>...), each with its latest
+    snapshot, attendance CSV and chat transcript.
+    """
+    sessions = Session.objects.filter(created_by=request.user).order_by("created_at")
+    wanted = request.GET.getlist("session")
+    if wanted:
+        try:
+            sessions = sessions.filter(id__in=[uuid.UUID(v) for v in wanted])
+        except ValueError:
+            return JsonResponse({"ok": False, "error": "bad_session_id"}, status=400)
+    if not sessions.exists():
+        return JsonResponse({"ok": False, "error": "no_sessions"}, status=404)
+
+    def guarded(chunks):
+        try:
+            yield from chunks
+        except BrokenPipeError:
+            logger.info("Client disconnected while streaming archive for user %s", request.user.pk)
+
+    stamp = systime.strftime("%Y%m%d")
+    response = StreamingHttpResponse(guarded(archive_export(sessions.iterator())), content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="sessions_{stamp}.zip"'
     return response
 
 @login_required
@@ -208,19 +267,20 @@ def presence_sync(request, session_id):
         except Exception:
             continue
 
-    # Find participants who are absent and currently can_draw=True
-        from django.utils import timezone
-        now = timezone.now()
-        qs = Participant.objects.filter(session=session)
-        # Mark present users last_active = now
-        if present_ids:
-            qs.filter(user_id__in=present_ids).update(last_active=now)
-        # For absent users, revoke drawing and stamp last_active to now (time they were seen offline)
-        absent = qs.exclude(user_id__in=present_ids).filter(can_draw=True)
-        updated = absent.update(can_draw=False, last_active=now)
+    # Present users only get a heartbeat; last_active is written by the periodic presence flush
+    qs = Participant.objects.filter(session=session)
+    all_ids = set(qs.values_list("user_id", flat=True))
+    touch(session.id, sorted(all_ids & present_ids))
+    # For absent users, revoke drawing and stamp last_active to now (time they were seen offline)
+    from django.utils import timezone
+    absent = qs.exclude(user_id__in=present_ids).filter(can_draw=True)
+    updated = absent.update(can_draw=False, last_active=timezone.now())
+    if updated:
+        invalidate_session(session.id)
+        bump(session_scope(session.id, "attendance"))
+    maybe_flush(session.id)
 
     # Prepare simple present/absent lists for UI hints
-    all_ids = set(qs.values_list("user_id", flat=True))
     absent_ids = sorted(list(all_ids - present_ids))
     present_ids_list = sorted(list(all_ids & present_ids))
 
@@ -232,26 +292,54 @@ def presence_sync(request, session_id):
     })
 
 
+@login_required
+@require_POST
+@safe_view
+def presence_heartbeat(request, session_id):
+    """Participant heartbeat: records last-seen (in the presence cache when one is set)."""
+    m = get_membership(request, session_id)
+    if m is None:
+        return JsonResponse({"ok": False, "error": "not_found"}, status=404)
+    if not m.is_participant:
+        return JsonResponse({"ok": True, "tracked": False})
+    touch(session_id, request.user.pk)
+    maybe_flush(session_id)
+    return JsonResponse({"ok": True, "tracked": True})
+
+def _attendance_scopes(request, session_id):
+    m = get_membership(request, session_id)
+    if m is None or not (m.is_owner or request.user.is_staff):
+        return None  # let the view answer 404/403
+    return [session_scope(session_id, "attendance")]
+
+
 @login_required
 @safe_view
+@conditional(_attendance_scopes, refresh=ATTENDANCE_REFRESH)
 def attendance_json(request, session_id):
     """Return attendance data as JSON for live updates on the attendance page."""
     session = get_object_or_404(Session, id=session_id)
     if request.user != session.created_by and not request.user.is_staff:
         return JsonResponse({"ok": False, "error": "forbidden"}, status=403)
     from django.utils import timezone
-    parts = Participant.objects.filter(session=session).select_related('user').order_by('joined_at')
+    maybe_flush(session.id)
+    parts = list(Participant.objects.filter(session=session).select_related('user').order_by('joined_at'))
+    # live heartbeats; the Participant column lags by up to PRESENCE_FLUSH_SECONDS
+    seen = last_seen(session.id, [p.user_id for p in parts])
+    now = timezone.now()
     data = []
     for p in parts:
+        last = max(filter(None, (p.last_active, seen.get(p.user_id))), default=None)
         data.append({
             "user_id": p.user_id,
             "username": getattr(p.user, 'username', ''),
             "email": getattr(p.user, 'email', ''),
             "can_draw": p.can_draw,
             "joined_at": p.joined_at.isoformat() if p.joined_at else None,
-            "last_active": p.last_active.isoformat() if p.last_active else None,
+            "last_active": last.isoformat() if last else None,
+            "online": is_online(seen.get(p.user_id), now),
         })
-    return JsonResponse({"ok": True, "participants": data, "now": timezone.now().isoformat()})
+    return JsonResponse({"ok": True, "participants": data, "now": now.isoformat()})
 
 # Optional helper views (useful if you later add routes / templates)
 @login_required
@@ -293,14 +381,8 @@ def attendance_view(request, session_id):
         response = HttpResponse(content_type='text/csv')
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
         writer = csv.writer(response)
-        writer.writerow(['Student', 'Email', 'Joined', 'Last Active'])
-        for p in participants:
-            writer.writerow([
-                getattr(p.user, 'username', ''),
-                getattr(p.user, 'email', ''),
-                (p.joined_at.isoformat() if p.joined_at else ''),
-                (p.last_active.isoformat() if p.last_active else ''),
-            ])
+        writer.writerow(ATTENDANCE_HEADER)
+        writer.writerows(iter_attendance(session))
         return response
 
     # Render HTML - include current time for small header display
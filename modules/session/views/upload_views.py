@@ -5,12 +5,18 @@ from django.shortcuts import get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
-from django.http import JsonResponse, HttpResponse, FileResponse
+from django.http import JsonResponse, HttpResponse, FileResponse, StreamingHttpResponse
 from django.urls import reverse
 from django.utils.text import slugify
 from django.utils.crypto import get_random_string
 from django.contrib import messages
-from ..models import Session, Participant
+from django.db import transaction
+from ..models import Session, Participant, UploadedFile
+from ..membership import get_membership
+from ..uploads import UploadTooLarge
+from ..blobs import store_media_blob
+from ..snapshots import latest_snapshot, record_snapshot
+from ..export import pdf_export
 from django.conf import settings
 from supabase import create_client
 supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
@@ -55,42 +61,72 @@ def _is_owner_or_staff(request, session):
 @safe_view
 def upload_attachment(request, session_id):
     """
-    Accept attachments via POST (field 'file'). Saves under /media/session_files/<session_id>/
+    Accept attachments via POST (field 'file'). Bytes are stored once per content
+    hash under /media/blobs/ and recorded as an UploadedFile of the session.
     Teachers can always upload.
     Students can upload only if they have drawing permission.
     """
     if request.method != "POST":
         return JsonResponse({"ok": False, "error": "POST required"}, status=400)
 
-    session = get_object_or_404(Session, id=session_id)
+    m = get_membership(request, session_id)
+    if m is None:
+        return JsonResponse({"ok": False, "error": "not_found"}, status=404)
 
     # ✅ Permission check
-    if request.user != session.created_by and not request.user.is_staff:
-        participant = session.participants.filter(user=request.user).first()
-        if not participant or not participant.can_draw:
+    if not m.is_owner and not request.user.is_staff:
+        if not m.is_participant or not m.can_draw:
             return JsonResponse({"ok": False, "error": "permission_denied"}, status=403)
 
     fileobj = request.FILES.get("file")
+    if getattr(request, "upload_too_large", False):
+        return JsonResponse({"ok": False, "error": "file_too_large"}, status=413)
     if not fileobj:
         return JsonResponse({"ok": False, "error": "no_file"}, status=400)
 
     try:
-        # ✅ Ensure folder exists
-        upload_dir = os.path.join(settings.MEDIA_ROOT, "session_files", str(session_id))
-        os.makedirs(upload_dir, exist_ok=True)
-
-        # ✅ Save file
-        file_path = os.path.join("session_files", str(session_id), fileobj.name)
-        saved_path = default_storage.save(file_path, ContentFile(fileobj.read()))
-        file_url = default_storage.url(saved_path)
-
-        return JsonResponse({"ok": True, "file_url": file_url})
+        # ✅ Save file once per content hash; the record just points at the blob
+        with transaction.atomic():
+            blob = store_media_blob(fileobj)
+            upload = UploadedFile.objects.create(
+                session_id=m.session_id, uploaded_by=request.user,
+                file=blob.path, name=fileobj.name, blob=blob,
+            )
+        file_url = default_storage.url(blob.path)
+        download_url = reverse("download_attachment", args=[m.session_id, upload.pk])
+
+        return JsonResponse({
+            "ok": True, "file_url": file_url, "download_url": download_url, "sha256": blob.sha256, "size": blob.size,
+        })
+    except UploadTooLarge:
+        return JsonResponse({"ok": False, "error": "file_too_large"}, status=413)
     except Exception as e:
         import traceback
         traceback.print_exc()
         return JsonResponse({"ok": False, "error": str(e)}, status=500)
 
 
+@login_required
+@safe_view
+def download_attachment(request, session_id, file_id):
+    """
+    Serve an attachment under the name it was uploaded with. Blob paths are
+    hashes, and identical files uploaded under different names share one.
+    """
+    m = get_membership(request, session_id)
+    if m is None:
+        return JsonResponse({"ok": False, "error": "not_found"}, status=404)
+    if not (m.is_member or request.user.is_staff):
+        return JsonResponse({"ok": False, "error": "not_participant"}, status=403)
+    upload = get_object_or_404(UploadedFile.objects.select_related("blob"), pk=file_id, session_id=m.session_id)
+    path = upload.file.name
+    content_type = upload.blob.content_type if upload.blob else ""
+    return FileResponse(
+        default_storage.open(path, "rb"), as_attachment=True,
+        filename=upload.name or os.path.basename(path), content_type=content_type or None,
+    )
+
+
 # ==========================
 # 🧾 QR GENERATOR
 # ==========================
@@ -123,10 +159,20 @@ def session_qr(request, session_id):
 @login_required
 @safe_view
 def export_session_pdf(request, session_id):
-    """Export the saved snapshot to PDF (if available)."""
+    """
+    Export the board to PDF. Boards with a stroke log are streamed as vector
+    pages (board, attachments, chat); older boards fall back to the saved PNG.
+    """
     session = get_object_or_404(Session, id=session_id)
-    path = f"session_snapshots/{session_id}.png"
+    m = get_membership(request, session_id)
+    if (m is None or not m.is_member) and not request.user.is_staff:
+        return JsonResponse({"ok": False, "error": "not_participant"}, status=403)
+    if session.stroke_seq:
+        response = StreamingHttpResponse(pdf_export(session), content_type="application/pdf")
+        response["Content-Disposition"] = f'attachment; filename="session_{session_id}.pdf"'
+        return response
 
+    path = f"session_snapshots/{session_id}.png"
     if not default_storage.exists(path):
         return HttpResponse("No snapshot available", status=404)
 
@@ -167,19 +213,20 @@ def duplicate_session(request, session_id):
             data[f] = getattr(session, f)
     data["created_by"] = request.user
     data["code"] = get_random_string(6).upper()
+    data["title"] = f"{session.title} (copy {data['code']})"[:100]  # titles are unique
     new = Session.objects.create(**data)
 
-    # Copy snapshot if exists
-    src = f"session_snapshots/{session_id}.png"
-    dst = f"session_snapshots/{new.id}.png"
+    # Copy the latest snapshot and the attachments as pointers to the same blobs (no storage I/O)
     try:
-        if default_storage.exists(src):
-            with default_storage.open(src, "rb") as sf:
-                if default_storage.exists(dst):
-                    default_storage.delete(dst)
-                default_storage.save(dst, ContentFile(sf.read()))
+        snap = latest_snapshot(session.id)
+        if snap:
+            record_snapshot(new.id, snap.path, url=snap.url, size=snap.size, blob=snap.blob)
+        for f in UploadedFile.objects.filter(session=session).only("file", "name", "blob_id"):
+            UploadedFile.objects.create(
+                session=new, uploaded_by=request.user, file=f.file.name, name=f.name, blob_id=f.blob_id,
+            )
     except Exception:
-        logger.exception("Failed copying snapshot for duplicate session %s", session_id)
+        logger.exception("Failed copying snapshot/attachments for duplicate session %s", session_id)
 
     messages.success(request, "Session duplicated.")
     return redirect(reverse("session_list"))
@@ -5,6 +5,9 @@ from django.contrib.auth.decorators import login_required
 from django.conf import settings
 from supabase import create_client
 from ..models import Session, Participant
+from ..membership import get_membership
+from ..relay import relay_available
+from ..snapshots import latest_snapshot
 from django.urls import reverse
 from django.contrib import messages
 from django.shortcuts import get_object_or_404, redirect
@@ -48,24 +51,15 @@ def whiteboard_view(request, session_id):
     )
 
     # Determine if user can draw
-    participant = session.participants.filter(user=request.user).first()
-    can_draw = participant.can_draw if participant else (session.created_by == request.user)
+    m = get_membership(request, session_id)
+    can_draw = bool(m and m.can_draw)
 
-    # --- Get snapshot from Supabase Storage or session record ---
+    # --- Get snapshot from session record or the snapshot index ---
     snapshot_url = getattr(session, "snapshot_url", None)
     if not snapshot_url:
-        try:
-            sb = _server_supabase()
-            bucket = settings.SUPABASE_BUCKET
-            objs = sb.storage.from_(bucket).list(path="") or []
-            # look for any file starting with the session id (handles timestamped filenames)
-            candidates = [o.get("name") for o in objs if o.get("name") and str(session_id) in o.get("name") and o.get("name").endswith('.png')]
-            if candidates:
-                # pick the lexicographically last (timestamp suffix) as a simple heuristic
-                fname = sorted(candidates)[-1]
-                snapshot_url = sb.storage.from_(bucket).get_public_url(fname)
-        except Exception:
-            snapshot_url = None
+        snap = latest_snapshot(session.id)
+        if snap:
+            snapshot_url = snap.url or supabase.storage.from_(settings.SUPABASE_BUCKET).get_public_url(snap.path)
 
     # Determine Back URL
     back_url = (
@@ -85,6 +79,7 @@ def whiteboard_view(request, session_id):
             "back_url": back_url,
             "SUPABASE_URL": getattr(settings, "SUPABASE_URL", ""),
             "SUPABASE_ANON_KEY": getattr(settings, "SUPABASE_ANON_KEY", ""),
+            "WHITEBOARD_RELAY": relay_available(request),
         },
     )
 
@@ -108,6 +103,7 @@ def student_whiteboard_view(request, session_id):
         "session": session,
         "session_title": f"{session.title} (Student View)",
         "can_draw": participant.can_draw,
+        "WHITEBOARD_RELAY": relay_available(request),
     })
 
 